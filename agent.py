@@ -1,74 +1,201 @@
 import json
 import os
 import asyncio
+import contextvars
 import re
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import HumanMessage
-from mem0 import Memory
-from memory import add_message, get_recent_history
+import time
+from langchain_core.messages import HumanMessage, AIMessage
+from memory import add_message, count_messages, get_messages, search_history, DEFAULT_SESSION, HISTORY_EMBEDDINGS
+from session_store import new_state, load_session, save_session
+from vision import image_cache
+from research import create_research_backend
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_ENABLED, history_digest
+from kb_manifest import get_collection_version
+from vectordb import get_client, mem0_vector_store
+from backend_pool import PooledChatOllama, PooledOllamaEmbeddings, primary_url
+from retrieval import Retriever, infer_scope, parse_scope
+from tracing import start_trace, current_trace, span
+from streaming import ReasoningFilter, reasoning_log, REASONING_MODE, THINK_OPEN, THINK_CLOSE
+from prompts import build, model_options, history_window, prefix_tracker, History, PROMPT_VERSION, HISTORY_WINDOW
 from dotenv import load_dotenv
 load_dotenv()
 
-# --- NEW IMPORT ---
-try:
-    from linkup import LinkupClient
-except ImportError:
-    LinkupClient = None
-    print("⚠️ Warning: 'linkup-sdk' not found. Research mode will be disabled.")
-
 # --- CONFIGURATION ---
-QDRANT_URL = "http://localhost:6333" 
 EMBED_MODEL = "nomic-embed-text:v1.5"
 LLM_MODEL = "deepseek-r1:7b"
-LINKUP_API_KEY = os.getenv("LINKUP_API_KEY")  # <--- PASTE KEY HERE or use os.getenv("LINKUP_API_KEY")
+
+# Subsystems built concurrently by WebAgent.start(); "tutor" is the core path /chat needs
+SUBSYSTEMS = ("tutor", "rag", "memory", "research")
+INIT_WAIT_TIMEOUT = 60  # Seconds a request waits for a subsystem that is still starting
+INIT_RETRY_INTERVAL = 10  # Seconds before a failed subsystem (e.g. Qdrant not up yet) is retried
+
+# Heavy subsystems are imported by their init stage (in a worker thread), not with the server:
+# langchain_qdrant (+ qdrant_client, ~1.5s) for RAG, mem0 for long-term memory.
+# benchmarks/fakes.py may set them to stand-ins first.
+QdrantVectorStore = None
+Memory = None
+
+# State of the session the current request belongs to (see get_response / session_store.py)
+_session = contextvars.ContextVar("synapse_session", default=None)
 
 class WebAgent:
     def __init__(self):
+        """Cheap constructor: no network calls. Call `await start()` to bring subsystems up."""
         print("\n[INIT] 🚀 Starting WebAgent...")
-        
-        # ... (Existing Model Init) ...
-        self.router = ChatOllama(model=LLM_MODEL, format="json", temperature=0)
-        self.tutor = ChatOllama(model=LLM_MODEL, temperature=0.3)
-        self.coder = ChatOllama(model="qwen2.5-coder", temperature=0.2)
-        self.vision = ChatOllama(model="llava:7b", temperature=0.1)
-
-        # ... (Existing DB Init) ...
-        self.embeddings = OllamaEmbeddings(model=EMBED_MODEL)
+
+        # --- SUBSYSTEMS (see start()) ---
+        self.status = {name: "loading" for name in SUBSYSTEMS}
+        self._ready = {name: asyncio.Event() for name in SUBSYSTEMS}
+        self._failed_at = {}
+        self.router = None
+        self.tutor = None
+        self.embeddings = None
+        self.vector_store = None
+        self.retriever = None
+        self.user_memory = None
+        self.research = None
+        self.answer_cache = None
+        self._coder = None     # Created on first coding request
+        self._vision = None    # Created on first image
+        self.user_id = "local_user"
+
+        # --- STATE ---
+        # Per-session mode / quiz / study state lives in the session store, not on the agent,
+        # so any worker process can serve any session. Outside a request this one is used.
+        self._local_state = {"id": DEFAULT_SESSION, **new_state()}
+
+    # =========================================================================
+    #  ⚙️ INITIALIZATION (Concurrent stages, lazy per-tool components)
+    # =========================================================================
+
+    async def start(self):
+        """Runs all init stages concurrently. Chat is usable as soon as the "tutor" stage is ready."""
+        started = time.perf_counter()
+        await asyncio.gather(*[self._init_stage(name) for name in SUBSYSTEMS])
+        print(f"[INIT] ✅ System Ready! ({time.perf_counter() - started:.1f}s)\n")
+
+    async def _init_stage(self, name):
+        factory = {
+            "tutor": self._init_core,
+            "rag": self._init_rag,
+            "memory": self._init_memory,
+            "research": self._init_research,
+        }[name]
+        started = time.perf_counter()
+        try:
+            # Blocking constructors (Qdrant, Mem0) run in worker threads, off the event loop
+            self.status[name] = await asyncio.to_thread(factory) or "ready"
+            print(f"[INIT] ✅ {name} {self.status[name]} ({time.perf_counter() - started:.1f}s)")
+        except Exception as e:
+            self.status[name] = f"error: {e}"
+            self._failed_at[name] = time.monotonic()
+            print(f"[INIT] ❌ {name} failed: {e}")
+        finally:
+            self._ready[name].set()
+
+    def _init_core(self):
+        # Same num_ctx / keep_alive for both: one loaded model, one KV cache (see prompts.py)
+        # Calls are spread over the Ollama servers in OLLAMA_HOSTS (see backend_pool.py)
+        self.router = PooledChatOllama(model=LLM_MODEL, format="json", temperature=0, **model_options())
+        self.tutor = PooledChatOllama(model=LLM_MODEL, temperature=0.3, **model_options())
+        self.embeddings = PooledOllamaEmbeddings(model=EMBED_MODEL)
+
+        # --- SEMANTIC ANSWER CACHE (opt-in: SEMANTIC_CACHE=1) ---
+        self.answer_cache = SemanticCache(self.embeddings) if SEMANTIC_CACHE_ENABLED else None
+
+    def _init_rag(self):
+        global QdrantVectorStore
+        if QdrantVectorStore is None:
+            from langchain_qdrant import QdrantVectorStore
+        embeddings = PooledOllamaEmbeddings(model=EMBED_MODEL)
         self.vector_store = QdrantVectorStore(
-            client=QdrantClient(url=QDRANT_URL),
+            client=get_client(),   # Qdrant server or embedded, see vectordb.py
             collection_name="study_knowledge_base",
-            embedding=self.embeddings,
+            embedding=embeddings,
         )
-        
-        # ... (Existing Mem0 Init) ...
+        # Over-fetch + rerank + MMR + token budget, see retrieval.py
+        self.retriever = Retriever(self.vector_store)
+
+    def _init_memory(self):
+        global Memory
+        if Memory is None:
+            from mem0 import Memory
         mem0_config = {
-            "vector_store": {
-                "provider": "qdrant",
-                "config": {"url": QDRANT_URL, "collection_name": "user_long_term_memory"}
-            },
-            "embedder": {"provider": "ollama", "config": {"model": EMBED_MODEL}},
-            "llm": {"provider": "ollama", "config": {"model": LLM_MODEL, "temperature": 0}}
+            "vector_store": mem0_vector_store("user_long_term_memory"),
+            # Mem0 has its own Ollama client: pin it to one backend from the pool
+            "embedder": {"provider": "ollama", "config": {"model": EMBED_MODEL, "ollama_base_url": primary_url(EMBED_MODEL)}},
+            "llm": {"provider": "ollama", "config": {"model": LLM_MODEL, "temperature": 0, "ollama_base_url": primary_url(LLM_MODEL)}}
         }
         self.user_memory = Memory.from_config(mem0_config)
-        self.user_id = "local_user"
-
-        # --- INIT LINKUP CLIENT ---
-        if LinkupClient and LINKUP_API_KEY:
-            self.linkup = LinkupClient(api_key=LINKUP_API_KEY)
-            print("[INIT] 🌐 Linkup API Connected (Research Mode Ready)")
-        else:
-            self.linkup = None
 
-        # --- STATE ---
-        self.mode = "chat"
-        self.quiz_data = {"topic": None, "question": None, "score": 0, "count": 0}
-        self.study_data = {"syllabus": [], "index": 0}
-        
-        print("[INIT] ✅ System Ready!\n")
+    def _init_research(self):
+        # Linkup or local stand-in, see research.py
+        self.research = create_research_backend()
+        return "ready" if self.research else "disabled"
+
+    def is_ready(self, name):
+        return self.status.get(name) == "ready"
+
+    async def _wait_for(self, name, timeout=INIT_WAIT_TIMEOUT):
+        """Waits for a subsystem that is still starting (or retries a failed one). Returns True if usable."""
+        failed_at = self._failed_at.get(name)
+        if self._ready[name].is_set() and failed_at and time.monotonic() - failed_at > INIT_RETRY_INTERVAL:
+            # e.g. the launcher started the server before Qdrant / ingestion finished
+            self._failed_at.pop(name)
+            self._ready[name].clear()
+            self.status[name] = "loading"
+            asyncio.create_task(self._init_stage(name))
+        if not self._ready[name].is_set():
+            print(f"[INIT] ⏳ Waiting for {name}...")
+            try:
+                await asyncio.wait_for(self._ready[name].wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return self.is_ready(name)
+
+    # --- SESSION STATE (the current request's session) ---
+    def _state(self):
+        return _session.get() or self._local_state
+
+    @property
+    def session_id(self):
+        return self._state()["id"]
+
+    @property
+    def mode(self):
+        return self._state()["mode"]
+
+    @mode.setter
+    def mode(self, value):
+        self._state()["mode"] = value
+
+    @property
+    def quiz_data(self):
+        return self._state()["quiz_data"]
+
+    @quiz_data.setter
+    def quiz_data(self, value):
+        self._state()["quiz_data"] = value
+
+    @property
+    def study_data(self):
+        return self._state()["study_data"]
+
+    @study_data.setter
+    def study_data(self, value):
+        self._state()["study_data"] = value
+
+    @property
+    def coder(self):
+        if self._coder is None:
+            self._coder = PooledChatOllama(model="qwen2.5-coder", temperature=0.2, **model_options())
+        return self._coder
+
+    @property
+    def vision(self):
+        if self._vision is None:
+            self._vision = PooledChatOllama(model="llava:7b", temperature=0.1, **model_options())
+        return self._vision
 
     # --- HELPER: SAVE FILE (Existing) ---
     def _save_file_to_disk(self, filename, content):
@@ -81,62 +208,179 @@ class WebAgent:
             return f"✅ **File Saved:** `{file_path}`"
         except Exception as e: return f"❌ **Error:** {str(e)}"
 
-    async def get_response(self, user_query, image_data=None):
+    async def get_response(self, user_query, image_data=None, image_id=None, scope=None, session_id=DEFAULT_SESSION):
+        """Entry point for /chat: runs one turn inside a latency trace (see tracing.py).
+        `scope` optionally restricts document search to a ./data folder or file name.
+        The session's state is loaded from the shared store first and saved back afterwards."""
+        trace = start_trace()
+        with span("session_load"):
+            state = {"id": session_id, **load_session(session_id)}
+        _session.set(state)
+        try:
+            async for chunk in self._respond(user_query, image_data, image_id, scope):
+                yield chunk
+        finally:
+            with span("session_save"):
+                save_session(session_id, {k: v for k, v in state.items() if k != "id"})
+            _session.set(None)
+            trace.finish()
+
+    # --- HELPERS: TRACED MODEL CALLS ---
+    async def _stream_llm(self, llm, prompt, visible=True):
+        """
+        Streams the answer from `llm`. deepseek-r1's <think> reasoning is filtered out (see
+        streaming.py) so it never reaches the client, the history or later prompts. If the
+        thought runs past THINK_BUDGET_TOKENS, it is closed for the model and the answer forced.
+        """
+        reasoning = ReasoningFilter()
+        async for text in self._stream_once(llm, prompt, reasoning, visible):
+            yield text
+        truncated = reasoning.over_budget()
+        if truncated:
+            print(f"[LLM] ✂️ Thinking budget reached (~{reasoning.reasoning_tokens} tokens), forcing the answer.")
+            # Ollama continues a trailing assistant message; the shared prefix is still in its KV cache
+            messages = [HumanMessage(content=prompt)] if isinstance(prompt, str) else list(prompt)
+            messages.append(AIMessage(content=f"{THINK_OPEN}\n{reasoning.text()}\n{THINK_CLOSE}\n\n"))
+            answer = ReasoningFilter()
+            async for text in self._stream_once(llm, messages, answer, visible):
+                yield text
+            reasoning.reasoning.extend(answer.reasoning)
+
+        trace = current_trace()
+        if REASONING_MODE == "side" and reasoning.reasoning_chars:
+            reasoning_log.add(trace.id if trace else None, trace.tool if trace else None, reasoning.text(), truncated)
+
+    async def _stream_once(self, llm, prompt, reasoning, visible=True):
+        """One model call through `reasoning`, recording TTFT, queue wait and tokens/sec on the current trace.
+        Stops generating as soon as the thinking budget is spent."""
+        started = time.perf_counter()
+        first_token = first_visible = None
+        chunks = 0
+        metadata = {}
+        prompt_tokens, cached_tokens = prefix_tracker.observe(llm.model, prompt)
+        stream = llm.astream(prompt)
+        try:
+            async for c in stream:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                chunks += 1
+                if c.response_metadata:
+                    metadata = c.response_metadata  # Ollama puts timings on the final chunk
+                text = reasoning.feed(c.content)
+                if text:
+                    first_visible = first_visible or time.perf_counter()
+                    yield text
+                if reasoning.over_budget():
+                    break
+            else:
+                text = reasoning.flush()
+                if text:
+                    first_visible = first_visible or time.perf_counter()
+                    yield text
+        finally:
+            await stream.aclose()  # Budget hit or client gone: stop generating
+        trace = current_trace()
+        if trace:
+            trace.record_generation(llm.model, started, first_token, time.perf_counter(), chunks, metadata,
+                                    visible and first_visible is not None, reasoning.reasoning_tokens, first_visible,
+                                    {"prompt_version": PROMPT_VERSION, "prompt_tokens_est": prompt_tokens,
+                                     "cached_tokens_est": cached_tokens})
+
+    async def _invoke_llm(self, llm, prompt, visible=True):
+        """Non-streaming call with the same reasoning filter, thinking budget and trace bookkeeping.
+        Returns the answer text. `visible=False` marks internal calls (routing) that must not count
+        as time-to-first-token; visible ones reach the user only once complete."""
+        answer = "".join([text async for text in self._stream_llm(llm, prompt, visible=False)])
+        trace = current_trace()
+        if trace and visible:
+            trace.mark_first_output(time.perf_counter())
+        return answer
+
+    async def _respond(self, user_query, image_data=None, image_id=None, scope=None):
         print(f"\n[INPUT] 📥 User said: '{user_query}'")
-        add_message("user", user_query)
-        chat_history = get_recent_history(limit=20)
-        clean_query = re.sub(r'<think>.*?</think>', '', user_query, flags=re.DOTALL)
+        trace = current_trace()
+        clean_query = user_query.strip()
+        with span("history_load"):
+            # Earlier turns only; the window start moves in steps so the prompt prefix stays cached
+            sid = self.session_id
+            start = history_window(count_messages(sid))
+            query_vector = await self._history_vector(clean_query)
+            # Older turns come back only when they match this query (see memory.search_history)
+            chat_history = History(get_messages(start, HISTORY_WINDOW, sid),
+                                   search_history(clean_query, start, sid, query_vector))
+            add_message("user", user_query, sid, vector=query_vector)
 
         # 0. EXIT COMMANDS
         if clean_query.lower() in ["stop", "exit", "quit", "end"]:
+            trace.tool = "exit"
             self.mode = "chat"
             yield "🛑 **Mode Deactivated.** Returning to normal chat."
             return
 
         # 1. VISION MODE
-        if image_data:
+        if image_data and not image_id:
+            try:
+                # Legacy JSON/base64 upload; decoding and resizing run off the event loop
+                image_id = await asyncio.to_thread(image_cache.add_base64, image_data)
+            except ValueError as e:
+                trace.tool = "vision"
+                print(f"[VISION] ⚠️ Rejected image: {e}")
+                reply = "⚠️ **Vision Mode**\n\nThat attachment isn't an image I can read. Please try a PNG or JPEG."
+                yield reply
+                with span("history_write"):
+                    add_message("assistant", reply, self.session_id)
+                return
+        if image_id:
+            trace.tool = "vision"
             yield "👁️ **Vision Mode**\n\n"
             full_resp = "👁️ **Vision Mode**\n\n"
-            async for chunk in self._run_vision(user_query, image_data): 
+            async for chunk in self._run_vision(user_query, image_id): 
                 full_resp += chunk
                 yield chunk
-            add_message("assistant", full_resp)
+            with span("history_write"):
+                add_message("assistant", full_resp, self.session_id)
             return
 
         # 2. ACTIVE MODE HANDLING (Quiz/Study)
         if self.mode == "quiz":
+            trace.tool = "quiz"
             full_resp = ""
             async for chunk in self._handle_quiz_loop(clean_query):
                 full_resp += chunk
                 yield chunk
-            add_message("assistant", full_resp)
+            with span("history_write"):
+                add_message("assistant", full_resp, self.session_id)
             return 
         elif self.mode == "study":
+            trace.tool = "study"
             full_resp = ""
             async for chunk in self._handle_study_loop(clean_query):
                 full_resp += chunk
                 yield chunk
-            add_message("assistant", full_resp)
+            with span("history_write"):
+                add_message("assistant", full_resp, self.session_id)
             return
 
         # 3. ROUTING (The Brain)
-        lower_q = clean_query.lower()
-        
-        if "quiz" in lower_q or "test me" in lower_q:
-            tool = "quiz_start"
-        elif "syllabus" in lower_q or "teach me" in lower_q:
-            tool = "study_start"
-        # RAG Triggers (Local Files)
-        elif any(k in lower_q for k in ["doc", "file", "pdf", "context", "notes", "written", "summary", "lecture"]):
-            tool = "rag"
-        # CODER Triggers
-        elif "code" in lower_q or "python" in lower_q or "function" in lower_q or "save" in lower_q:
-            tool = "coder"
-        # RESEARCH Triggers (Internet)
-        elif any(k in lower_q for k in ["search", "internet", "online", "google", "find out", "latest", "news", "linkup"]):
-            tool = "research"
-        else:
-            tool = await self._route_query(clean_query, chat_history)
+        with span("routing"):
+            lower_q = clean_query.lower()
+        
+            if "quiz" in lower_q or "test me" in lower_q:
+                tool = "quiz_start"
+            elif "syllabus" in lower_q or "teach me" in lower_q:
+                tool = "study_start"
+            # RAG Triggers (Local Files)
+            elif any(k in lower_q for k in ["doc", "file", "pdf", "context", "notes", "written", "summary", "lecture"]):
+                tool = "rag"
+            # CODER Triggers
+            elif "code" in lower_q or "python" in lower_q or "function" in lower_q or "save" in lower_q:
+                tool = "coder"
+            # RESEARCH Triggers (Internet)
+            elif any(k in lower_q for k in ["search", "internet", "online", "google", "find out", "latest", "news", "linkup"]):
+                tool = "research"
+            else:
+                tool = await self._route_query(clean_query, chat_history)
+        trace.tool = tool
         
         print(f"[ROUTER] 🔀 Decision: {tool.upper()}")
 
@@ -147,6 +391,7 @@ class WebAgent:
             
             # Save topic to state
             self.quiz_data["topic"] = topic
+            self.quiz_data["scope"] = parse_scope(scope) or infer_scope(clean_query)
             self.mode = "quiz"
             # Remove this line: yield f"🎯 **Quiz Mode Started!**\n\n" 
             # (The loop handles the intro message now)
@@ -176,7 +421,12 @@ class WebAgent:
             yield header
             full_response = header
             facts = ""
-            async for chunk in self._run_rag(clean_query, chat_history, facts):
+            rag_scope = parse_scope(scope) or infer_scope(clean_query)
+            # Same question, different scope -> different answer, so the scope is part of the cache key
+            cache_key = "rag:" + (rag_scope.get("category") or rag_scope.get("source")) if rag_scope else "rag"
+            outcome = {}
+            async for chunk in self._cached_stream(cache_key, clean_query, chat_history,
+                                                   self._run_rag(clean_query, chat_history, facts, rag_scope, outcome), outcome):
                 full_response += chunk
                 yield chunk
 
@@ -194,87 +444,101 @@ class WebAgent:
             yield header
             full_response = header
             facts = ""
-            async for chunk in self._run_tutor(clean_query, chat_history, facts):
+            async for chunk in self._cached_stream("tutor", clean_query, chat_history, self._run_tutor(clean_query, chat_history, facts)):
                 full_response += chunk
                 yield chunk
 
         # 5. FINALIZE
-        add_message("assistant", full_response)
+        with span("history_write"):
+            add_message("assistant", full_response, self.session_id)
         if self.mode == "chat":
             asyncio.create_task(self._save_to_mem0_bg(clean_query, full_response))
         print("[DONE] ✅ Response finished.")
 
+    async def _cached_stream(self, tool, query, history, stream, outcome=None):
+        """
+        Replays a cached answer for near-identical questions asked on the same conversation
+        (`history`), otherwise runs `stream` and caches its answer. Nothing is cached when the
+        stream marks `outcome["fallback"]` (it could not answer the way `tool` promises).
+        """
+        if not self.answer_cache:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        version = get_collection_version()
+        context = history_digest(history)
+        answer, vector = await self.answer_cache.lookup(query, tool, version, context)
+        if answer is not None:
+            await stream.aclose()  # Never started, no model call
+            async for chunk in self.answer_cache.replay(answer):
+                yield chunk
+            return
+
+        answer = ""
+        async for chunk in stream:
+            answer += chunk
+            yield chunk
+        if outcome is None or not outcome.get("fallback"):
+            self.answer_cache.store(query, tool, version, answer, vector, context)
+
+    async def _history_vector(self, query):
+        """Embedding of the query for recall by meaning (HISTORY_EMBEDDINGS=1), else None."""
+        if not HISTORY_EMBEDDINGS or not self.embeddings:
+            return None
+        try:
+            return await self.embeddings.aembed_query(query)
+        except Exception as e:
+            print(f"[MEMORY] ⚠️ History embedding failed: {e}")
+            return None
+
     # --- NEW: RESEARCH FUNCTION ---
     async def _run_research(self, query, history):
-        if not self.linkup:
-            yield "❌ **Error:** Linkup API Key is missing. Please add it to `agent.py`."
+        if not await self._wait_for("research"):
+            yield "❌ **Error:** Research backend is not configured. Set `LINKUP_API_KEY` in `.env` (or `RESEARCH_BACKEND=local`)."
             return
 
-        print(f"[RESEARCH] 🌍 Searching Linkup for: {query}")
+        print(f"[RESEARCH] 🌍 Searching {self.research.name} for: {query}")
         try:
             # 1. Perform Search (Depth='standard' is faster, 'deep' is thorough)
-            # sourcedAnswer gives a synthesized answer + citations.
-            # searchResults gives raw data chunks (Better for Agent context).
-            response = self.linkup.search(
-                query=query,
-                depth="standard",
-                output_type="searchResults" 
-            )
+            # Async end-to-end and cached by normalized query (see research.py)
+            with span("retrieval"):
+                results = await self.research.search(query, depth="standard")
             
             # 2. Format Results for LLM
-            search_context = ""
-            if response.results:
-                for res in response.results:
-                    search_context += f"Source: {res.name} ({res.url})\nContent: {res.content}\n\n"
-            else:
-                search_context = "No relevant online results found."
-
-            # 3. Prompt the LLM
-            prompt = f"""
-            You are a Research Assistant with access to the internet.
-            
-            User Query: {query}
-            
-            Real-Time Search Results (Linkup API):
-            {search_context}
-            
-            Chat History:
-            {history}
+            with span("prompt_build"):
+                search_context = ""
+                if results:
+                    for res in results:
+                        search_context += f"Source: {res['name']} ({res['url']})\nContent: {res['content']}\n\n"
+                else:
+                    search_context = "No relevant online results found."
+
+                # 3. Prompt the LLM (static -> history -> results + query, see prompts.py)
+                prompt = build("research", history, query=query, backend=self.research.name, results=search_context)
             
-            Task:
-            Answer the user's question using the Search Results above. 
-            Cite your sources if possible (e.g., [Source Name]).
-            If the search results don't answer the question, admit it.
-            """
-            
-            async for c in self.tutor.astream(prompt): 
-                yield c.content
+            async for text in self._stream_llm(self.tutor, prompt): 
+                yield text
                 
         except Exception as e:
             yield f"⚠️ **Research Error:** {str(e)}"
     async def _save_to_mem0_bg(self, query, response):
+        if not await self._wait_for("memory"):
+            return
         try:
-            self.user_memory.add(query, user_id=self.user_id, prompt=response)
+            # Runs after the response finished; timed as its own span
+            with span("mem0_write"):
+                self.user_memory.add(query, user_id=self.user_id, prompt=response)
             print("[BACKGROUND] ✨ Mem0 updated successfully.")
         except Exception as e:
             print(f"[ERROR] Mem0 Background Error: {e}")
 
     async def _route_query(self, query, history):
         print("[ROUTER] 🤔 Analyzing intent...")
-        prompt = ChatPromptTemplate.from_template(
-            """Analyze the query. History: {history}. Query: {query}
-            RULES:
-            - If user explicitly asks for a "quiz", "test me" -> "quiz_start".
-            - If user asks to "teach me", "syllabus" -> "study_start".
-            - If "pdf", "file", "notes", "search docs" -> "rag".
-            - If "code", "python", "debug" -> "coder".
-            - Otherwise -> "tutor".
-            Return ONLY JSON: {{ "tool": "coder" | "rag" | "tutor" | "quiz_start" | "study_start" }}
-            """
-        )
+        # Same system + history prefix as the tutor call that follows, so routing warms the cache for it
+        prompt = build("router", history, query=query)
         try:
-            resp = self.router.invoke({"query": query, "history": history})
-            content = resp.content
+            content = await self._invoke_llm(self.router, prompt, visible=False)
             # Strict JSON extraction
             json_str = content[content.find("{"):content.rfind("}")+1]
             return json.loads(json_str).get("tool", "tutor")
@@ -290,7 +554,7 @@ class WebAgent:
             self.quiz_data["count"] = 0
             self.quiz_data["score"] = 0
             
-            q_text = await self._generate_rag_question(self.quiz_data["topic"])
+            q_text = await self._generate_rag_question(self.quiz_data["topic"], self.quiz_data.get("scope"))
             self.quiz_data["question"] = q_text
             
             yield f"🎯 **Quiz Started: {self.quiz_data['topic']}**\n\n"
@@ -302,22 +566,12 @@ class WebAgent:
         print("[QUIZ] 📝 Grading answer...")
         
         # STRONG PROMPT: Force a single word decision first
-        grading_prompt = f"""
-        You are a strict Grader.
-        Question: {self.quiz_data['question']}
-        Student Answer: {user_input}
-        
-        Rules:
-        1. Determine if the answer is CORRECT or INCORRECT.
-        2. Output format MUST be exactly:
-           VERDICT: [CORRECT/INCORRECT]
-           EXPLANATION: [Reasoning]
-        """
+        grading_prompt = build("quiz_grade", question=self.quiz_data['question'], answer=user_input)
         
         # Buffer the response so we can parse it
         grade_response = ""
-        async for chunk in self.tutor.astream(grading_prompt):
-            grade_response += chunk.content
+        async for text in self._stream_llm(self.tutor, grading_prompt):
+            grade_response += text
         
         # 3. PARSE DECISION
         # We only count it if the AI explicitly wrote "VERDICT: CORRECT"
@@ -337,47 +591,31 @@ class WebAgent:
         yield f"📊 **Score: {self.quiz_data['score']} / {self.quiz_data['count']}**\n"
         yield "---\n**Next Question:**\n"
         
-        q_text = await self._generate_rag_question(self.quiz_data["topic"])
+        q_text = await self._generate_rag_question(self.quiz_data["topic"], self.quiz_data.get("scope"))
         self.quiz_data["question"] = q_text
         yield q_text
 
-    async def _generate_rag_question(self, topic):
+    async def _generate_rag_question(self, topic, scope=None):
         # Retry loop to ensure valid question generation
         for attempt in range(3):
             print(f"[QUIZ] 🎲 Generating question (Attempt {attempt+1}/3)...")
             
             # 1. Context Search
-            results = await self.vector_store.asimilarity_search(str(topic), k=2)
+            results = []
+            if await self._wait_for("rag"):
+                results = await self.retriever.retrieve(str(topic), scope, max_chunks=2, budget=600)
             context = "\n".join([d.page_content for d in results]) if results else "General Knowledge"
             
             # 2. Strict Prompt
-            prompt = f"""
-            You are a strict Quiz Generator.
-            Context: {context}
-            Task: Create exactly ONE multiple-choice question about: {topic}.
-            
-            CRITICAL OUTPUT RULES:
-            1. Output ONLY the question and 4 options (A, B, C, D).
-            2. Do NOT write "Answer:", "Explanation:", or any conversational text.
-            3. Do NOT explain why the other options are wrong.
-            4. Stop immediately after Option D.
-            
-            Format:
-            Question: [Text]
-            A) [Option]
-            B) [Option]
-            C) [Option]
-            D) [Option]
-            """
+            prompt = build("quiz_question", context=context, topic=topic)
             
             try:
                 # 3. Generate
-                response = await self.tutor.ainvoke(prompt)
-                raw_content = response.content
+                raw_content = await self._invoke_llm(self.tutor, prompt)
 
                 # 4. AGGRESSIVE CLEANING
-                # Step A: Remove <think> tags (DeepSeek specific)
-                clean_content = re.sub(r'<think>.*?</think>', '', raw_content, flags=re.DOTALL).strip()
+                # Step A: <think> reasoning is already filtered out by _invoke_llm
+                clean_content = raw_content.strip()
                 
                 # Step B: Hard Cut after Option D
                 # We look for "D)" and the next newline
@@ -406,12 +644,16 @@ class WebAgent:
                 continue
         
         return "⚠️ **Error:** Could not generate a clean question. Type 'next' to retry."
-    async def _run_rag(self, query, history, facts):
+    async def _run_rag(self, query, history, facts, scope=None, outcome=None):
         print("[RAG] 📚 Querying Qdrant...")
-        results = await self.vector_store.asimilarity_search(query, k=4)
+        results = []
+        if await self._wait_for("rag"):
+            results = await self.retriever.retrieve(query, scope)
         
         if not results: 
             print("[RAG] ❌ No docs found. Falling back to Tutor.")
+            if outcome is not None:
+                outcome["fallback"] = True   # Not a document answer: keep it out of the answer cache
             yield "⚠️ **No documents found.** Switching to general knowledge...\n\n"
             # Fallback to normal Tutor
             async for chunk in self._run_tutor(query, history, facts):
@@ -419,24 +661,12 @@ class WebAgent:
             return
         
         print(f"[RAG] ✅ Found {len(results)} chunks.")
-        context = "\n".join([f"📄 {os.path.basename(r.metadata.get('source','?'))}:\n{r.page_content}" for r in results])
-        
-        prompt = f"""You are a helpful assistant. Use the history and context to answer.
-        
-        History:
-        {history}
-        
-        Facts (Long Term Memory):
-        {facts}
-        
-        Context (Documents):
-        {context}
-        
-        User Question:
-        {query}
-        """
-        async for c in self.tutor.astream(prompt): 
-            yield c.content
+        with span("prompt_build"):
+            context = "\n".join([f"📄 {os.path.basename(r.metadata.get('source','?'))}:\n{r.page_content}" for r in results])
+            # Retrieved chunks change every turn, so they go after the cached system + history prefix
+            prompt = build("rag", history, facts, context=context, query=query)
+        async for text in self._stream_llm(self.tutor, prompt): 
+            yield text
 
     def _save_file_to_disk(self, filename, content):
         """Tool: Writes code to the workspace directory."""
@@ -458,30 +688,11 @@ class WebAgent:
     async def _run_coder(self, query, history, facts):
         print("[CODER] 💻 Analyzing request...")
         
-        # 1. System Prompt with TOOL Instructions
-        system_prompt = f"""
-        You are an expert Python Coder with FILE ACCESS.
-        
-        History: {history}
-        User Request: {query}
-        
-        RULES:
-        1. If the user asks to SAVE code to a file, you MUST output a SINGLE JSON block.
-        2. Format:
-           ```json
-           {{
-             "action": "save_file",
-             "filename": "example.py",
-             "content": "print('Hello World')"
-           }}
-           ```
-        3. If the user just asks a question, reply with normal text/code blocks.
-        4. Do NOT include any text outside the JSON block if you are saving a file.
-        """
+        # 1. Prompt with TOOL Instructions
+        system_prompt = build("coder", history, facts, query=query)
         
         # 2. Invoke the model (Non-streaming first to check for JSON)
-        response = await self.coder.ainvoke(system_prompt)
-        content = response.content
+        content = await self._invoke_llm(self.coder, system_prompt)
         
         # 3. Check for Tool Use (JSON)
         # We look for the specific pattern of a JSON block
@@ -513,22 +724,23 @@ class WebAgent:
     async def _run_tutor(self, query, history, facts):
         print("[TUTOR] 🎓 Generating explanation...")
         
-        # FIX: Added 'History: {history}'
-        prompt = f"""You are a helpful tutor.
-        
-        Chat History:
-        {history}
-        
-        Facts about User:
-        {facts}
-        
-        User Question:
-        {query}
-        """
-        async for c in self.tutor.astream(prompt): 
-            yield c.content
-    async def _run_vision(self, query, b64_image):
+        prompt = build("tutor", history, facts, query=query)
+        async for text in self._stream_llm(self.tutor, prompt): 
+            yield text
+    async def _run_vision(self, query, image_id):
         print("[VISION] 👁️ Analyzing image...")
+
+        # Same image + same question -> replay the earlier answer
+        cached = image_cache.get_analysis(image_id, query)
+        if cached is not None:
+            print("[VISION] ♻️ Cache hit, skipping llava.")
+            yield cached
+            return
+
+        b64_image = image_cache.get(image_id)
+        if b64_image is None:
+            yield "⚠️ **Image expired.** Please attach it again."
+            return
         
         # FIX: "image_url" must be a dictionary with a "url" key
         msg = HumanMessage(content=[
@@ -540,8 +752,12 @@ class WebAgent:
         ])
         
         try:
-            async for c in self.vision.astream([msg]): 
-                yield c.content
+            answer = ""
+            async for text in self._stream_llm(self.vision, [msg]): 
+                answer += text
+                yield text
+            if answer:
+                image_cache.put_analysis(image_id, query, answer)
         except Exception as e:
             print(f"[ERROR] Vision failed: {e}")
             yield f"❌ **Vision Error:** {str(e)}\n\n*Make sure you have run: `ollama pull llava:7b`*"
@@ -569,20 +785,13 @@ class WebAgent:
         yield f"📘 **Designing Course Structure for: {topic}...**\n\n"
 
         # Prompt for Syllabus Generation
-        prompt = f"""
-        You are an expert curriculum designer. Create a concise 4-step study syllabus for: {topic}.
-        
-        RULES:
-        1. Return ONLY a valid JSON list of strings.
-        2. No conversational filler (no "Here is the list").
-        3. Example format: ["Introduction to {topic}", "Core Concepts", "Advanced Techniques", "Real-world Applications"]
-        """
+        prompt = build("syllabus", topic=topic)
         
         try:
             # Generate and Parse
-            response = await self.tutor.ainvoke(prompt)
+            content = await self._invoke_llm(self.tutor, prompt)
             # Regex to find the list [...] inside the response
-            match = re.search(r'\[.*\]', response.content, re.DOTALL)
+            match = re.search(r'\[.*\]', content, re.DOTALL)
             if match:
                 syllabus = json.loads(match.group(0))
             else:
@@ -635,19 +844,11 @@ class WebAgent:
             yield f"### 📖 Module {idx+1}: {current_module}\n\n"
 
             # Generate Lesson Content
-            lesson_prompt = f"""
-            You are a teacher explaining '{current_module}' as part of a course on '{topic}'.
-            
-            INSTRUCTIONS:
-            - Explain the concept clearly and concisely.
-            - Provide ONE simple code example or analogy if applicable.
-            - Keep it engaging but brief (under 200 words).
-            - Do not say "Module X". Just teach.
-            """
+            lesson_prompt = build("lesson", module=current_module, topic=topic)
             
             # Stream the Lesson
-            async for chunk in self.tutor.astream(lesson_prompt):
-                yield chunk.content
+            async for text in self._stream_llm(self.tutor, lesson_prompt):
+                yield text
             
             # Advance Index
             self.study_data["index"] += 1
@@ -659,16 +860,9 @@ class WebAgent:
             current_context = syllabus[idx-1] if idx > 0 else "Introduction"
             
             yield "👨‍🏫 **Tutor:**\n"
-            qna_prompt = f"""
-            The student is taking a course on '{topic}'. 
-            We just finished discussing '{current_context}'.
-            
-            Student Question: "{user_input}"
-            
-            Answer the question helpfully, keeping the context of the course in mind.
-            """
+            qna_prompt = build("study_qna", topic=topic, module=current_context, query=user_input)
             
-            async for chunk in self.tutor.astream(qna_prompt):
-                yield chunk.content
+            async for text in self._stream_llm(self.tutor, qna_prompt):
+                yield text
             
             yield "\n\n*(Type 'Next' when you are ready to move on)*"
\ No newline at end of file
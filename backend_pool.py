@@ -0,0 +1,305 @@
+"""
+Spreads model calls over several Ollama servers.
+
+    OLLAMA_HOSTS=http://gpu1:11434,http://gpu2:11434                 # every model
+    OLLAMA_MODEL_HOSTS='{"nomic-embed-text:v1.5": ["http://cpu1:11434"]}'  # per-model override
+
+- Balancing: each call goes to the healthy backend with the fewest requests in flight
+  (counted per server, across all models it hosts).
+- Health: a backend is ejected after EJECT_AFTER consecutive failures (or a failed health
+  probe) and only re-admitted once a probe succeeds after the ejection period.
+- Retry: a call that fails before producing output is retried on another backend.
+- Embedding batches are split into shards and embedded on all healthy backends at once.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from langchain_core.embeddings import Embeddings
+
+# --- CONFIGURATION ---
+OLLAMA_HOSTS = [h.strip().rstrip("/") for h in
+                os.getenv("OLLAMA_HOSTS", os.getenv("OLLAMA_HOST", "http://localhost:11434")).split(",") if h.strip()]
+OLLAMA_MODEL_HOSTS = json.loads(os.getenv("OLLAMA_MODEL_HOSTS", "{}"))
+EJECT_AFTER = int(os.getenv("POOL_EJECT_AFTER", "2"))            # Consecutive failures before ejection
+EJECT_SECONDS = float(os.getenv("POOL_EJECT_SECONDS", "15"))     # Doubles on repeated ejections (max 8x)
+HEALTH_INTERVAL = float(os.getenv("POOL_HEALTH_INTERVAL", "5"))
+HEALTH_TIMEOUT = 2
+MIN_SHARD = 16  # Texts per embedding shard: smaller shards cost more in per-request overhead than they save
+
+
+class Backend:
+    """One Ollama server. Shared by every pool (model) it serves."""
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0           # Total
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = None   # None = healthy
+
+    @property
+    def healthy(self):
+        return self.ejected_until is None
+
+    def stats(self):
+        return {"healthy": self.healthy, "outstanding": self.outstanding, "requests": self.requests,
+                "failures": self.failures, "ejections": self.ejections}
+
+
+class BackendPool:
+    """The backends serving one model."""
+    def __init__(self, model, backends):
+        self.model = model
+        self.backends = backends
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+
+    def _pick(self, exclude=()):
+        candidates = [b for b in self.backends if b.healthy and b.url not in exclude]
+        if not candidates:
+            # Everything is ejected: better to try the one ejected longest ago than to fail outright
+            candidates = sorted((b for b in self.backends if b.url not in exclude),
+                                key=lambda b: b.ejected_until or 0)[:1]
+        if not candidates:
+            return None
+        fewest = min(b.outstanding for b in candidates)
+        tied = [b for b in candidates if b.outstanding == fewest]
+        return tied[next(self._rr) % len(tied)]
+
+    @contextmanager
+    def acquire(self, exclude=()):
+        """Reserves the least-loaded backend for one request. Yields None if none is left to try."""
+        with self._lock:
+            backend = self._pick(exclude)
+            if backend:
+                backend.outstanding += 1
+                backend.requests += 1
+        try:
+            yield backend
+        finally:
+            if backend:
+                with self._lock:
+                    backend.outstanding -= 1
+
+    def healthy_backends(self):
+        return [b for b in self.backends if b.healthy] or self.backends[:1]
+
+    def report(self, backend, ok):
+        """Passive health check: outcome of a real request."""
+        with self._lock:
+            if ok:
+                backend.consecutive_failures = 0
+                return
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            if backend.healthy and backend.consecutive_failures >= EJECT_AFTER:
+                _eject(backend)
+
+
+# --- REGISTRY (one Backend per URL, one pool per model) ---
+_backends = {}
+_pools = {}
+_registry_lock = threading.Lock()
+_health_thread = None
+
+
+def _eject(backend):
+    backend.ejections += 1
+    backend.ejected_until = time.monotonic() + EJECT_SECONDS * min(8, 2 ** (backend.ejections - 1))
+    print(f"[POOL] ⛔ Ejected {backend.url} ({backend.consecutive_failures} consecutive failures)")
+
+
+def hosts_for(model):
+    return [h.rstrip("/") for h in OLLAMA_MODEL_HOSTS.get(model, OLLAMA_HOSTS)]
+
+
+def get_pool(model):
+    global _health_thread
+    with _registry_lock:
+        if model not in _pools:
+            backends = [_backends.setdefault(url, Backend(url)) for url in hosts_for(model)]
+            _pools[model] = BackendPool(model, backends)
+        if _health_thread is None and len(_backends) > 1:
+            _health_thread = threading.Thread(target=_health_loop, name="backend-health", daemon=True)
+            _health_thread.start()
+        return _pools[model]
+
+
+def pool_stats():
+    """Per-backend counters for /health."""
+    with _registry_lock:
+        return {url: b.stats() for url, b in _backends.items()}
+
+
+def probe(url):
+    try:
+        with urllib.request.urlopen(f"{url}/api/version", timeout=HEALTH_TIMEOUT) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def _health_loop():
+    """Active health check: ejects backends that stop answering, re-admits recovered ones."""
+    while True:
+        time.sleep(HEALTH_INTERVAL)
+        with _registry_lock:
+            backends = list(_backends.values())
+        for backend in backends:
+            ok = probe(backend.url)
+            if backend.healthy and not ok:
+                backend.consecutive_failures = max(backend.consecutive_failures, EJECT_AFTER)
+                _eject(backend)
+            elif not backend.healthy and ok and time.monotonic() >= backend.ejected_until:
+                backend.ejected_until = None
+                backend.consecutive_failures = 0
+                print(f"[POOL] ✅ Re-admitted {backend.url}")
+
+
+def model_digest(model):
+    """Ollama's content digest of `model` from the first backend that answers (None if none does)."""
+    for url in hosts_for(model):
+        try:
+            with urllib.request.urlopen(f"{url}/api/tags", timeout=HEALTH_TIMEOUT) as response:
+                tags = json.load(response)
+        except Exception:
+            continue
+        for entry in tags.get("models", []):
+            if model in (entry.get("name"), entry.get("model")):
+                return entry.get("digest")
+    return None
+
+
+def primary_url(model):
+    """A single URL for clients that cannot use the pool (e.g. Mem0's own Ollama client)."""
+    pool = get_pool(model)
+    with pool.acquire() as backend:
+        return backend.url
+
+
+# =========================================================================
+#  DROP-IN CLIENTS
+# =========================================================================
+
+class PooledChatOllama:
+    """
+    ChatOllama over a backend pool: same constructor arguments, `astream` / `ainvoke`.
+    A streamed call is only retried if it failed before its first chunk, since chunks
+    already sent to the user cannot be taken back.
+    """
+    def __init__(self, model, **kwargs):
+        self.model = model
+        self.kwargs = kwargs
+        self.pool = get_pool(model)
+        self._clients = {}
+
+    def _client(self, backend):
+        if backend.url not in self._clients:
+            from langchain_ollama import ChatOllama  # Imported with the first client, not with the server
+            self._clients[backend.url] = ChatOllama(model=self.model, base_url=backend.url, **self.kwargs)
+        return self._clients[backend.url]
+
+    async def astream(self, prompt, **kwargs):
+        tried, last_error = [], None
+        while True:
+            with self.pool.acquire(exclude=tried) as backend:
+                if backend is None:
+                    raise last_error or RuntimeError(f"No Ollama backend configured for {self.model}")
+                tried.append(backend.url)
+                stream = self._client(backend).astream(prompt, **kwargs)
+                started = False
+                try:
+                    async for chunk in stream:
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    self.pool.report(backend, False)
+                    if started:
+                        raise
+                    print(f"[POOL] 🔁 {self.model} failed on {backend.url} ({e}), retrying elsewhere")
+                    last_error = e
+                    continue
+                finally:
+                    await stream.aclose()
+                self.pool.report(backend, True)
+                return
+
+    async def ainvoke(self, prompt, **kwargs):
+        tried, last_error = [], None
+        while True:
+            with self.pool.acquire(exclude=tried) as backend:
+                if backend is None:
+                    raise last_error or RuntimeError(f"No Ollama backend configured for {self.model}")
+                tried.append(backend.url)
+                try:
+                    response = await self._client(backend).ainvoke(prompt, **kwargs)
+                except Exception as e:
+                    self.pool.report(backend, False)
+                    last_error = e
+                    continue
+                self.pool.report(backend, True)
+                return response
+
+
+class PooledOllamaEmbeddings(Embeddings):
+    """OllamaEmbeddings over a backend pool. Document batches are sharded across healthy backends."""
+    def __init__(self, model, **kwargs):
+        self.model = model
+        self.kwargs = kwargs
+        self.pool = get_pool(model)
+        self._clients = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.pool.backends)), thread_name_prefix="embed")
+
+    def _client(self, backend):
+        if backend.url not in self._clients:
+            from langchain_ollama import OllamaEmbeddings
+            self._clients[backend.url] = OllamaEmbeddings(model=self.model, base_url=backend.url, **self.kwargs)
+        return self._clients[backend.url]
+
+    def _call(self, method, payload):
+        """Runs one embedding request with retry on other backends."""
+        tried, last_error = [], None
+        while True:
+            with self.pool.acquire(exclude=tried) as backend:
+                if backend is None:
+                    raise last_error or RuntimeError(f"No Ollama backend configured for {self.model}")
+                tried.append(backend.url)
+                try:
+                    result = getattr(self._client(backend), method)(payload)
+                except Exception as e:
+                    self.pool.report(backend, False)
+                    last_error = e
+                    continue
+                self.pool.report(backend, True)
+                return result
+
+    def _shards(self, texts):
+        count = min(len(self.pool.healthy_backends()), max(1, len(texts) // MIN_SHARD))
+        size = -(-len(texts) // count) if texts else 1
+        return [texts[i:i + size] for i in range(0, len(texts), size)]
+
+    def embed_documents(self, texts):
+        shards = self._shards(list(texts))
+        if len(shards) <= 1:
+            return self._call("embed_documents", list(texts))
+        vectors = []
+        for part in self._executor.map(lambda shard: self._call("embed_documents", shard), shards):
+            vectors.extend(part)
+        return vectors
+
+    def embed_query(self, text):
+        return self._call("embed_query", text)
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embed_query, text)
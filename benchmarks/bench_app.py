@@ -0,0 +1,232 @@
+"""
+End-to-end load test of the FastAPI app with local stand-ins (no Ollama / Qdrant needed).
+
+    python -m benchmarks.bench_app --sessions 8 --rounds 3
+    python -m benchmarks.bench_app --workers 4              # uvicorn worker processes instead of an in-process server
+    python -m benchmarks.bench_app --compare benchmarks/results/app-20260101-120000.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes
+from benchmarks.report import summarize, print_table, save_results, compare
+
+# Scripted turns per workload. Quiz/study sessions are stateful and end with "stop".
+SCENARIOS = {
+    "chat": ["what is recursion?", "explain virtual memory simply", "why is quicksort fast on average?",
+             "what is gradient descent?", "how does a mutex differ from a semaphore?"],
+    "quiz": ["quiz me on recursion", "B", "A", "B", "stop"],
+    "study": ["teach me operating systems", "start", "next", "what is a page table?", "next", "stop"],
+    "rag": ["summarize my notes on scheduling", "what do my lecture notes say about graphs?",
+            "find the pdf section on gradient loss", "what did I write about page tables?"],
+}
+HEADER_RE = re.compile(r"^(?:[^\n]*\*\*[^\n]*\*\*\n\n)+")   # Mode banners like "🎓 **Tutor Mode**\n\n"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fresh_db():
+    import memory
+    import session_store
+    memory.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="synapse-bench-"), "chat_history.db")
+    memory.init_db()
+    session_store.init_store()
+    return memory.DB_PATH
+
+
+def start_server(port):
+    """Runs the real app (lifespan included) with uvicorn in a background thread."""
+    import uvicorn
+    fresh_db()
+    fakes.install()
+    fakes.seed_corpus()
+    import server
+
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    srv = uvicorn.Server(config)
+    thread = threading.Thread(target=srv.run, daemon=True)
+    thread.start()
+    return srv, thread
+
+
+def start_workers(port, workers):
+    """Runs the app in `workers` uvicorn processes (see benchmarks/fake_server.py), sharing one SQLite store."""
+    env = {**os.environ, "CHAT_DB_PATH": fresh_db(), "FAKES_SETTINGS": json.dumps(fakes.SETTINGS)}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.fake_server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=root, env=env, stdout=subprocess.DEVNULL,   # Agent progress prints; errors still go to stderr
+    )
+
+
+async def wait_ready(client, base_url, workers=1, timeout=60):
+    """Waits until `workers` distinct worker processes report ready (new connection per probe)."""
+    deadline = time.monotonic() + timeout
+    ready = set()
+    while time.monotonic() < deadline:
+        try:
+            r = await client.get(f"{base_url}/health", headers={"Connection": "close"})
+            data = r.json()
+            subsystems = data.get("subsystems", {})
+            if subsystems and "loading" not in subsystems.values():
+                ready.add(data.get("worker"))
+                if len(ready) >= workers:
+                    return
+                continue
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not become ready")
+
+
+async def send(client, base_url, query, session_id):
+    start = time.perf_counter()
+    ttft = None
+    received = ""
+    size = 0
+    try:
+        async with client.stream("POST", f"{base_url}/chat", json={"query": query, "session_id": session_id}) as response:
+            if response.status_code != 200:
+                return {"ok": False, "latency_ms": (time.perf_counter() - start) * 1000}
+            async for text in response.aiter_text():
+                size += len(text.encode("utf-8"))
+                # TTFT = first model output, not the instant mode banner
+                if ttft is None:
+                    received += text
+                    if HEADER_RE.sub("", received):
+                        ttft = (time.perf_counter() - start) * 1000
+    except httpx.HTTPError:
+        return {"ok": False, "latency_ms": (time.perf_counter() - start) * 1000}
+    return {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": ttft, "bytes": size}
+
+
+async def run_session(client, base_url, workload, rounds, samples, session_id, rng):
+    """Each simulated user has its own session, so quiz/study scripts run concurrently with everything else."""
+    for _ in range(rounds):
+        turns = SCENARIOS[workload]
+        if workload not in ("quiz", "study"):
+            turns = rng.sample(turns, len(turns))
+        for turn in turns:
+            samples[workload].append(await send(client, base_url, turn, session_id))
+
+
+def parse_mix(mix, sessions):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    total = sum(weights.values())
+    plan = []
+    for name, w in weights.items():
+        plan += [name] * max(1, round(sessions * w / total))
+    return plan
+
+
+async def main_async(args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    workers = getattr(args, "workers", 0)
+    if workers:
+        process = start_workers(port, workers)
+    else:
+        srv, thread = start_server(port)
+    limits = httpx.Limits(max_connections=args.sessions * 2)
+    try:
+        async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+            await wait_ready(client, base_url, max(1, workers))
+            plan = parse_mix(args.mix, args.sessions)
+            samples = {name: [] for name in SCENARIOS}
+            print(f"🏁 Running {len(plan)} sessions ({args.mix}), {args.rounds} rounds each"
+                  f"{f' against {workers} workers' if workers else ''}...")
+
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                run_session(client, base_url, workload, args.rounds, samples, f"bench-{i}", random.Random(i))
+                for i, workload in enumerate(plan)
+            ])
+            wall = time.perf_counter() - start
+    finally:
+        if workers:
+            process.terminate()
+            process.wait(timeout=30)
+        else:
+            srv.should_exit = True
+            thread.join(timeout=5)
+
+    results = {name: summarize(s, wall) for name, s in samples.items() if s}
+    everything = [x for s in samples.values() for x in s]
+    results["all"] = summarize(everything, wall)
+    # Bytes streamed to clients, stored in the chat history, and fed back into prompts
+    # (prompt sizes are only visible when the fakes run in this process)
+    results["all"]["sizes"] = {
+        "streamed_kb": round(sum(x.get("bytes", 0) for x in everything) / 1024, 1),
+        "history_kb": round(history_bytes() / 1024, 1),
+        "avg_prompt_chars": round(fakes.USAGE["prompt_chars"] / fakes.USAGE["calls"]) if fakes.USAGE["calls"] else None,
+        "avg_prefill_tokens": round(fakes.USAGE["prefill_tokens"] / fakes.USAGE["calls"]) if fakes.USAGE["calls"] else None,
+    }
+    return results
+
+
+def history_bytes():
+    import memory
+    with sqlite3.connect(memory.DB_PATH) as conn:
+        return conn.execute("SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM messages").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Synapse API.")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent client sessions")
+    parser.add_argument("--rounds", type=int, default=2, help="Times each session repeats its script")
+    parser.add_argument("--mix", default="chat=4,quiz=1,study=1,rag=2", help="Workload weights")
+    parser.add_argument("--first-token-ms", type=float, default=150)
+    parser.add_argument("--tokens-per-sec", type=float, default=40)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--think-tokens", type=int, default=0)
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=0, help="Simulated prefill cost of uncached prompt tokens")
+    parser.add_argument("--embed-ms", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=0, help="0 = in-process server, N = N uvicorn worker processes")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    fakes.configure(first_token_ms=args.first_token_ms, tokens_per_sec=args.tokens_per_sec,
+                    answer_tokens=args.answer_tokens, think_tokens=args.think_tokens, embed_ms=args.embed_ms,
+                    prefill_tokens_per_sec=args.prefill_tokens_per_sec)
+    results = asyncio.run(main_async(args))
+    print_table("App load test", results)
+    sizes = results["all"]["sizes"]
+    prompts = (f", avg prompt {sizes['avg_prompt_chars']} chars, avg prefill {sizes['avg_prefill_tokens']} tokens"
+               if sizes["avg_prompt_chars"] is not None else "")
+    print(f"\n📦 Streamed {sizes['streamed_kb']} KB, history {sizes['history_kb']} KB{prompts}")
+
+    settings = {**vars(args), "fakes": dict(fakes.SETTINGS)}
+    if not args.no_save:
+        save_results("app", settings, results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
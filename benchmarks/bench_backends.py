@@ -0,0 +1,131 @@
+"""
+Server (Docker Qdrant over HTTP) vs. embedded (Qdrant local mode, in-process) vector
+backends for the knowledge base, see VECTOR_BACKEND in vectordb.py.
+
+    python -m benchmarks.bench_backends --points 5000
+    python -m benchmarks.bench_backends --only embedded     # no Docker needed
+
+Startup = open the client on an existing collection + first query (what a server
+restart pays). Query latency uses filtered and unfiltered searches with payloads,
+the same shape as a RAG lookup.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient, models
+
+import vectordb
+from benchmarks.report import summarize, print_table, save_results, compare
+from benchmarks.bench_vectors import make_vectors
+
+COLLECTION = "bench_backends"
+CATEGORIES = ["os", "ml", "dbms", "networks"]
+
+
+def open_client(backend, url, path):
+    return QdrantClient(path=path) if backend == "embedded" else QdrantClient(url=url)
+
+
+def build(client, data):
+    if client.collection_exists(COLLECTION):
+        client.delete_collection(COLLECTION)
+    client.create_collection(collection_name=COLLECTION, **vectordb.collection_params(data.shape[1]))
+    payloads = [{"page_content": f"chunk {i}", "metadata": {"category": CATEGORIES[i % len(CATEGORIES)]}}
+                for i in range(len(data))]
+    client.upload_collection(collection_name=COLLECTION, vectors=data, payload=payloads,
+                             ids=range(len(data)), batch_size=512)
+
+
+def query(client, vector, category=None):
+    flt = None
+    if category:
+        flt = models.Filter(must=[models.FieldCondition(
+            key="metadata.category", match=models.MatchValue(value=category))])
+    return client.query_points(collection_name=COLLECTION, query=vector.tolist(), limit=30,
+                               query_filter=flt, with_payload=True)
+
+
+def run_backend(backend, url, data, queries, restarts):
+    path = tempfile.mkdtemp(prefix="bench_qdrant_") if backend == "embedded" else None
+    try:
+        client = open_client(backend, url, path)
+        started = time.perf_counter()
+        build(client, data)
+        build_s = time.perf_counter() - started
+        client.close()
+
+        # Cold start: reopen (embedded reloads the collection from disk) and answer one query
+        startups = []
+        for _ in range(restarts):
+            t0 = time.perf_counter()
+            client = open_client(backend, url, path)
+            query(client, queries[0])
+            startups.append((time.perf_counter() - t0) * 1000)
+            client.close()
+
+        client = open_client(backend, url, path)
+        samples = []
+        wall = time.perf_counter()
+        for i, q in enumerate(queries):
+            t0 = time.perf_counter()
+            query(client, q, CATEGORIES[i % len(CATEGORIES)] if i % 2 else None)
+            samples.append({"ok": True, "latency_ms": (time.perf_counter() - t0) * 1000})
+        stats = summarize(samples, time.perf_counter() - wall)
+        client.delete_collection(COLLECTION)
+        client.close()
+        stats.update(startup_ms=round(float(np.median(startups)), 1), build_s=round(build_s, 2))
+        return stats
+    finally:
+        if path:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server vs. embedded vector backend benchmark.")
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=5_000, help="A typical ./data folder is a few thousand chunks")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--restarts", type=int, default=3)
+    parser.add_argument("--only", nargs="*", choices=["server", "embedded"])
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    backends = args.only or ["server", "embedded"]
+    if "server" in backends:
+        try:
+            QdrantClient(url=args.url).get_collections()
+        except Exception as e:
+            print(f"⚠️ Qdrant is not reachable at {args.url} ({e}); skipping the server backend.")
+            backends = [b for b in backends if b != "server"]
+
+    print(f"🧪 {args.points} x {args.dim}-d vectors, {args.queries} queries (half filtered by category)")
+    data, queries = make_vectors(args.points, args.queries, args.dim)
+
+    results = {}
+    for backend in backends:
+        print(f"   ⏳ {backend}...")
+        results[backend] = run_backend(backend, args.url, data, queries, args.restarts)
+
+    print_table("Vector backends", results)
+    print(f"\n{'backend':<18}{'startup ms':>12}{'build s':>9}")
+    for name, s in results.items():
+        print(f"{name:<18}{s['startup_ms']:>12}{s['build_s']:>9}")
+
+    if not args.no_save:
+        save_results("backends", vars(args), results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
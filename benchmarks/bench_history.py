@@ -0,0 +1,98 @@
+"""
+Chat-history recall (memory.search_history) on a long-lived database: lookup latency and the
+history part of the prompt (recent window + recalled turns) as the table grows, then the
+effect of the retention limits.
+
+    python -m benchmarks.bench_history --messages 1000 10000 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+from prompts import history_window, HISTORY_WINDOW
+from benchmarks.fakes import WORDS
+from benchmarks.report import save_results
+
+
+# Common study words plus a long tail of rarer terms, with Zipf-like frequencies like real chat text
+VOCABULARY = WORDS + [f"term{i}" for i in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def text(rng, k):
+    return " ".join(rng.choices(VOCABULARY, WEIGHTS, k=k))
+
+
+def fill(count, rng):
+    """`count` messages of alternating user questions and assistant answers (one bulk insert)."""
+    conn = memory.connect()
+    rows = []
+    for i in range(count):
+        words = text(rng, 40 if i % 2 else 12)
+        rows.append(("assistant" if i % 2 else "user", words, memory.DEFAULT_SESSION))
+    conn.executemany("INSERT INTO messages (role, content, session_id) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def measure(queries, rng):
+    total = memory.count_messages()
+    start = history_window(total)
+    window = memory.get_messages(start, HISTORY_WINDOW)
+    latencies, recalled_chars = [], []
+    for _ in range(queries):
+        query = text(rng, 8)
+        started = time.perf_counter()
+        recalled = memory.search_history(query, start)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalled_chars.append(sum(len(c) for _, c in recalled))
+    return {
+        "messages": total,
+        "recall_p50_ms": round(percentile(latencies, 50), 2),
+        "recall_p95_ms": round(percentile(latencies, 95), 2),
+        "window_chars": sum(len(c) for _, c in window),
+        "recalled_chars": round(sum(recalled_chars) / len(recalled_chars)),
+        "db_mb": round(os.path.getsize(memory.DB_PATH) / 2 ** 20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat-history recall and retention benchmark.")
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    memory.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="synapse-history-"), "chat_history.db")
+    results, stored = {}, 0
+    print(f"\n{'messages':>10}{'recall p50 ms':>15}{'p95 ms':>9}{'window chars':>14}{'recalled chars':>16}{'db MB':>8}")
+    for target in sorted(args.messages):
+        fill(target - stored, rng)
+        stored = target
+        results[f"messages_{target}"] = r = measure(args.queries, rng)
+        print(f"{r['messages']:>10}{r['recall_p50_ms']:>15}{r['recall_p95_ms']:>9}{r['window_chars']:>14}"
+              f"{r['recalled_chars']:>16}{r['db_mb']:>8}")
+
+    pruned = memory.prune_history()
+    results["pruned"] = r = measure(args.queries, rng)
+    print(f"\n🧹 Retention (HISTORY_MAX_MESSAGES={memory.HISTORY_MAX_MESSAGES}) removed {pruned} messages; "
+          f"recall p50 {r['recall_p50_ms']} ms on the remaining {r['messages']}")
+
+    if not args.no_save:
+        save_results("history", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
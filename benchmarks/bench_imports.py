@@ -0,0 +1,109 @@
+"""
+Cold-start import cost of the entry-point modules, measured with `python -X importtime` in a
+fresh interpreter per run. Also checks that heavy backends stay lazy (e.g. `import server`
+must not pull in qdrant_client or mem0; those load in the agent's init stages).
+
+    python -m benchmarks.bench_imports --repeat 5
+    python -m benchmarks.bench_imports --compare benchmarks/results/imports-<timestamp>.json --max-regression 25
+
+Exits with status 1 if a lazy module got imported eagerly, or (with --compare) if a module
+got slower than --max-regression percent.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.report import save_results
+
+MODULES = ["memory", "semantic_cache", "document_loader", "ingest", "watcher", "agent", "server"]
+
+# Imported on first use, never by importing the module itself
+LAZY = {
+    "memory": ["numpy"],
+    "semantic_cache": ["numpy"],
+    "document_loader": ["docx", "pptx", "pymupdf", "openpyxl", "unstructured", "bs4"],
+    "ingest": ["docx", "pptx", "pymupdf", "langchain_qdrant", "langchain_ollama"],
+    "agent": ["qdrant_client", "langchain_qdrant", "mem0", "langchain_ollama", "sentence_transformers"],
+    "server": ["qdrant_client", "langchain_qdrant", "mem0", "langchain_ollama", "sentence_transformers"],
+}
+
+
+def import_profile(module):
+    """One cold import. Returns (cumulative ms, {direct child: cumulative ms}, every module imported)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total, children, imported = None, {}, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        depth = len(name) - len(name.lstrip())
+        name, ms = name.strip(), int(cumulative) / 1000
+        if depth == 1:
+            # Post-order output: the subtree printed so far belongs to this top-level import
+            if name == module:
+                total = ms
+                break
+            children, imported = {}, set()
+            continue
+        imported.add(name)
+        if depth == 3:
+            children[name] = ms
+    return total, children, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark for the entry-point modules.")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module (median is reported)")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest direct imports listed per module")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=25.0, help="Percent slowdown that fails --compare")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    results, failures = {}, []
+    print(f"\n📦 Import time (median of {args.repeat} cold starts)")
+    print(f"{'module':<18}{'ms':>8}   heaviest direct imports")
+    for module in args.modules:
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        total = statistics.median(r[0] for r in runs)
+        heaviest = sorted(runs[-1][1].items(), key=lambda kv: -kv[1])[:args.top]
+        eager = sorted(m for m in LAZY.get(module, []) if any(m in r[2] for r in runs))
+        results[module] = {"ms": round(total, 1), "heaviest": [[n, round(ms, 1)] for n, ms in heaviest], "eager": eager}
+        print(f"{module:<18}{total:>8.0f}   " + ", ".join(f"{n} {ms:.0f}" for n, ms in heaviest))
+        if eager:
+            failures.append(f"import {module} eagerly loads {', '.join(eager)}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\n🔍 Compared to {os.path.basename(args.compare)}")
+        for module, s in results.items():
+            old = baseline.get(module, {}).get("ms")
+            if not old:
+                continue
+            change = 100 * (s["ms"] - old) / old
+            print(f"   {module:<18}{old:>8.0f} -> {s['ms']:.0f} ms ({change:+.1f}%)")
+            if change > args.max_regression:
+                failures.append(f"import {module} is {change:.0f}% slower than the baseline")
+
+    if not args.no_save:
+        save_results("imports", vars(args), results)
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
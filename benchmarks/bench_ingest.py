@@ -0,0 +1,127 @@
+"""
+Offline benchmark for ingest_documents() and retrieval, using the local stand-ins.
+
+    python -m benchmarks.bench_ingest --files 200 --queries 500
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes
+from benchmarks.report import summarize, print_table, save_results, compare
+
+
+def make_corpus(folder, files, words):
+    """Writes a deterministic mix of .txt notes and .csv tables into category sub-folders."""
+    for i in range(files):
+        category = ["os", "algorithms", "ml", "math"][i % 4]
+        os.makedirs(os.path.join(folder, category), exist_ok=True)
+        if i % 5 == 4:
+            with open(os.path.join(folder, category, f"table_{i}.csv"), "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["term", "definition"])
+                for row in range(40):
+                    writer.writerow([fakes.WORDS[row % len(fakes.WORDS)], " ".join(fakes._words(i * 100 + row, 12))])
+        else:
+            with open(os.path.join(folder, category, f"note_{i}.txt"), "w", encoding="utf-8") as f:
+                paragraphs = [" ".join(fakes._words(i * 100 + p, words // 5)) for p in range(5)]
+                f.write("\n\n".join(paragraphs))
+
+
+def bench_ingest(args):
+    import chunking
+    import ingest
+    import kb_manifest
+
+    chunking.CHUNKING = args.chunking
+    workdir = tempfile.mkdtemp(prefix="synapse-ingest-")
+    kb_manifest.MANIFEST_PATH = os.path.join(workdir, "kb_manifest.json")
+    ingest.DOCS_FOLDER = os.path.join(workdir, "data")
+    make_corpus(ingest.DOCS_FOLDER, args.files, args.words)
+
+    start = time.perf_counter()
+    ingest.ingest_documents()
+    wall = time.perf_counter() - start
+    docs = fakes.COLLECTIONS[ingest.COLLECTION_NAME]["docs"]
+    points = len(docs)
+    avg_tokens = sum(chunking.estimate_tokens(d.page_content) for d in docs) // max(points, 1)
+    return {"files": args.files, "chunking": args.chunking, "points": points, "avg_tokens": avg_tokens,
+            "seconds": round(wall, 3),
+            "files_per_sec": round(args.files / wall, 2), "points_per_sec": round(points / wall, 2)}
+
+
+async def bench_retrieval(args, pipeline=False, scoped=False):
+    """Plain top-4 vector search, or the full retrieval.py pipeline (over-fetch, rerank, MMR, packing),
+    optionally restricted to one category folder like "in my os notes"."""
+    from chunking import estimate_tokens
+    from retrieval import Retriever, create_reranker
+
+    store = fakes.FakeVectorStore(collection_name="study_knowledge_base", embedding=fakes.FakeEmbeddings())
+    retriever = Retriever(store, reranker=create_reranker(args.reranker))
+    queries = [" ".join(fakes._words(10_000 + i, 8)) for i in range(args.queries)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    samples = []
+    context_tokens = []
+
+    async def one(q):
+        async with semaphore:
+            t0 = time.perf_counter()
+            if pipeline:
+                docs = await retriever.retrieve(q, {"category": "os"} if scoped else None)
+            else:
+                docs = await store.asimilarity_search(q, k=4)
+            samples.append({"ok": True, "latency_ms": (time.perf_counter() - t0) * 1000})
+            context_tokens.append(sum(estimate_tokens(d.page_content) for d in docs))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(q) for q in queries])
+    stats = summarize(samples, time.perf_counter() - start)
+    stats["context_tokens"] = round(sum(context_tokens) / max(len(context_tokens), 1))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest + retrieval benchmark.")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--words", type=int, default=600, help="Words per text file")
+    parser.add_argument("--chunking", choices=["structured", "fixed"], default="structured")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--reranker", choices=["lexical", "cross-encoder", "none"], default="lexical")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--embed-ms", type=float, default=5)
+    parser.add_argument("--search-ms", type=float, default=2)
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    fakes.configure(embed_ms=args.embed_ms, search_ms=args.search_ms)
+    fakes.install()
+
+    ingest_stats = bench_ingest(args)
+    print(f"\n📥 Ingest: {ingest_stats['files']} files -> {ingest_stats['points']} points "
+          f"(~{ingest_stats['avg_tokens']} tokens each, {ingest_stats['chunking']} chunking) "
+          f"in {ingest_stats['seconds']}s ({ingest_stats['points_per_sec']} points/s)")
+
+    results = {
+        "vector_top4": asyncio.run(bench_retrieval(args)),
+        "rerank_pipeline": asyncio.run(bench_retrieval(args, pipeline=True)),
+        "rerank_scoped": asyncio.run(bench_retrieval(args, pipeline=True, scoped=True)),
+    }
+    print_table("Retrieval", results)
+    for name, stats in results.items():
+        print(f"   {name}: ~{stats['context_tokens']} context tokens per query")
+
+    if not args.no_save:
+        save_results("ingest", {**vars(args), "fakes": dict(fakes.SETTINGS), "ingest": ingest_stats}, results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+The same loader (document_loader.iter_any_file) used two ways on a generated textbook-sized
+PDF and spreadsheet: every Document of the file materialized and chunked at once, vs. streamed
+through ingest.iter_chunks one window at a time. Peak Python memory and time.
+
+    python -m benchmarks.bench_loader --pages 1000 --rows 20000
+
+Every 10th page is blank and every 10th an image-only scan (skipped by the loader in both
+runs). Peak memory is measured with tracemalloc (Python objects only).
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest
+from chunking import chunk_documents
+from document_loader import iter_any_file
+
+PARAGRAPH = "Virtual memory maps pages of a process to frames in physical memory. " * 6
+
+
+def make_pdf(path, pages):
+    import pymupdf
+    pdf = pymupdf.open()
+    scan = pymupdf.Pixmap(pymupdf.csRGB, pymupdf.IRect(0, 0, 300, 400), 0)
+    for i in range(pages):
+        page = pdf.new_page()
+        if i % 10 == 5:
+            continue
+        if i % 10 == 7:
+            page.insert_image(page.rect, pixmap=scan)
+            continue
+        page.insert_textbox(page.rect + (50, 50, -50, -50), f"Chapter {i // 20 + 1}\n\n" + (PARAGRAPH + "\n\n") * 6,
+                            fontsize=9)
+    pdf.save(path)
+
+
+def make_xlsx(path, rows):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("grades")
+    sheet.append(["student", "course", "score", "notes"])
+    for r in range(rows):
+        sheet.append([f"student {r}", f"course {r % 40}", r % 100, "submitted on time"])
+    workbook.save(path)
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks = fn()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"chunks": chunks, "seconds": round(seconds, 2), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def whole(path):
+    return len(chunk_documents(list(iter_any_file(path, strict=True)), path))
+
+
+def streamed(path):
+    return sum(1 for _ in ingest.iter_chunks(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialized vs. streamed document loading.")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench_loader_")
+    files = {"pdf": os.path.join(folder, "textbook.pdf"), "xlsx": os.path.join(folder, "grades.xlsx")}
+    print(f"   ⏳ Generating a {args.pages}-page PDF and a {args.rows}-row spreadsheet...")
+    make_pdf(files["pdf"], args.pages)
+    make_xlsx(files["xlsx"], args.rows)
+
+    print(f"\n{'file':<8}{'loader':<10}{'chunks':>8}{'seconds':>10}{'peak MB':>10}")
+    for kind, path in files.items():
+        for name, fn in (("whole", whole), ("streamed", streamed)):
+            result = measure(lambda: fn(path))
+            print(f"{kind:<8}{name:<10}{result['chunks']:>8}{result['seconds']:>10}{result['peak_mb']:>10}")
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Model backend pool (backend_pool.py) against local stand-in Ollama servers (fake_ollama.py):
+generation throughput and ingest embedding speed with 1 vs. N backends, and a failover run
+where one backend goes down halfway through.
+
+    python -m benchmarks.bench_pool --backends 1 2 4 --streams 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend_pool
+from benchmarks import fake_ollama
+from benchmarks.report import summarize, print_table, save_results, compare
+
+LLM_MODEL = "deepseek-r1:7b"
+EMBED_MODEL = "nomic-embed-text:v1.5"
+
+
+def use_backends(servers):
+    """Points the pool registry at `servers` (fresh counters)."""
+    backend_pool.OLLAMA_HOSTS = [s.url for s in servers]
+    backend_pool._backends.clear()
+    backend_pool._pools.clear()
+
+
+async def stream_load(llm, streams, requests):
+    samples = []
+    queue = list(range(requests))
+
+    async def worker():
+        while queue:
+            i = queue.pop()
+            start = time.perf_counter()
+            ttft = None
+            try:
+                async for _ in llm.astream(f"question {i}: explain recursion"):
+                    ttft = ttft or (time.perf_counter() - start) * 1000
+                samples.append({"ok": True, "latency_ms": (time.perf_counter() - start) * 1000, "ttft_ms": ttft})
+            except Exception:
+                samples.append({"ok": False, "latency_ms": (time.perf_counter() - start) * 1000})
+
+    wall = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(streams)])
+    return summarize(samples, time.perf_counter() - wall)
+
+
+def embed_load(texts, batch_size):
+    """Same batching as ingest.add_chunks: one embed_documents call per batch."""
+    embeddings = backend_pool.PooledOllamaEmbeddings(model=EMBED_MODEL)
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    return round(len(texts) / (time.perf_counter() - started), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend pool benchmark with stand-in Ollama servers.")
+    parser.add_argument("--backends", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--slots", type=int, default=1, help="Parallel requests per backend")
+    parser.add_argument("--streams", type=int, default=16, help="Concurrent generations")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--first-token-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-sec", type=float, default=100)
+    parser.add_argument("--answer-tokens", type=int, default=30)
+    parser.add_argument("--texts", type=int, default=2048, help="Chunks embedded in the ingest run")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    settings = dict(slots=args.slots, first_token_ms=args.first_token_ms,
+                    tokens_per_sec=args.tokens_per_sec, answer_tokens=args.answer_tokens)
+    servers = [fake_ollama.start(**settings) for _ in range(max(args.backends))]
+    texts = [f"chunk {i} about page tables, schedulers and gradient descent" for i in range(args.texts)]
+    backend_pool.HEALTH_INTERVAL = 1
+
+    results, embed_rates = {}, {}
+    for n in args.backends:
+        print(f"   ⏳ {n} backend(s)...")
+        use_backends(servers[:n])
+        llm = backend_pool.PooledChatOllama(model=LLM_MODEL)
+        results[f"backends_{n}"] = asyncio.run(stream_load(llm, args.streams, args.requests))
+        embed_rates[f"backends_{n}"] = embed_load(texts, args.batch_size)
+
+    # Failover: the first backend goes down after a third of the run
+    n = max(args.backends)
+    if n > 1:
+        print(f"   ⏳ failover ({n} backends, one goes down)...")
+        use_backends(servers[:n])
+        llm = backend_pool.PooledChatOllama(model=LLM_MODEL)
+        outage = threading.Timer(args.requests / 3 * args.answer_tokens / args.tokens_per_sec / args.streams * n,
+                                 lambda: setattr(servers[0], "down", True))
+        outage.start()
+        results[f"failover_{n}"] = asyncio.run(stream_load(llm, args.streams, args.requests))
+        outage.cancel()
+        servers[0].down = False
+        results[f"failover_{n}"]["backends"] = backend_pool.pool_stats()
+
+    print_table("Generation through the backend pool", results)
+    print(f"\n{'ingest embedding':<18}{'texts/s':>10}")
+    for name, rate in embed_rates.items():
+        print(f"{name:<18}{rate:>10}")
+        results[name]["embed_texts_per_sec"] = rate
+    if n > 1:
+        stats = results[f"failover_{n}"]["backends"]
+        print(f"\n🩺 Failover: {results[f'failover_{n}']['errors']} failed requests; "
+              + ", ".join(f"{url} ejected {s['ejections']}x" for url, s in stats.items() if s["ejections"]))
+
+    if not args.no_save:
+        save_results("pool", vars(args), results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
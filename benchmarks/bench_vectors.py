@@ -0,0 +1,177 @@
+"""
+Recall vs. latency vs. memory for the knowledge-base index options in vectordb.py
+(quantization, on-disk storage, HNSW parameters). Needs a running Qdrant server:
+
+    docker-compose up -d
+    python -m benchmarks.bench_vectors --points 50000 --dim 768
+
+Vectors are synthetic (clustered, unit length); recall@k is measured against exact
+brute-force search in NumPy. Memory is measured with Qdrant's own counters (GET /metrics):
+growth of the heap (jemalloc allocated bytes) and of the resident set from before the
+collection is created to after the queries. Mapped on-disk files are not heap; pages of them
+the queries touched show up in the resident set until the OS reclaims them.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient, models
+
+import vectordb
+from benchmarks.report import summarize, print_table, save_results, compare
+
+# name -> (quantization, on_disk, hnsw m, search ef, rescore, oversampling)
+SETTINGS = {
+    "float32_ram": ("none", False, 16, 128, None, None),
+    "float32_disk": ("none", True, 16, 128, None, None),
+    "scalar": ("scalar", False, 16, 128, True, 2.0),
+    "scalar_disk": ("scalar", True, 16, 128, True, 2.0),
+    "scalar_norescore": ("scalar", True, 16, 128, False, 1.0),
+    "binary": ("binary", True, 16, 128, True, 3.0),
+    "hnsw_m32": ("none", False, 32, 256, None, None),
+}
+
+
+def make_vectors(points, queries, dim, clusters=64, seed=7):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    data = centers[rng.integers(0, clusters, points)] + 0.6 * rng.normal(size=(points, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    picks = data[rng.integers(0, points, queries)]
+    q = picks + 0.3 * rng.normal(size=picks.shape).astype(np.float32)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return data, q
+
+
+def qdrant_memory(url):
+    """Qdrant's memory counters in bytes ({"allocated", "resident"}), or None if /metrics lacks them."""
+    try:
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            text = response.read().decode("utf-8")
+    except OSError:
+        return None
+    values = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(" ")
+        if name in ("memory_allocated_bytes", "memory_resident_bytes"):
+            values[name.split("_")[1]] = float(value)
+    return values if len(values) == 2 else None
+
+
+def memory_growth_mb(before, after):
+    if not before or not after:
+        return None, None
+    return (round((after["allocated"] - before["allocated"]) / 2**20, 1),
+            round((after["resident"] - before["resident"]) / 2**20, 1))
+
+
+def estimate_ram_mb(points, dim, quantization, on_disk, m):
+    """Resident memory of the vector index: originals, quantized copy and HNSW links."""
+    originals = 0 if on_disk else points * dim * 4
+    quantized = {"none": 0, "scalar": points * dim, "binary": points * math.ceil(dim / 8)}[quantization]
+    graph = 0 if on_disk else points * m * 2 * 4
+    return round((originals + quantized + graph) / 2**20, 1)
+
+
+def wait_indexed(client, name, points, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        info = client.get_collection(name)
+        if info.status == models.CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= points * 0.99:
+            return True
+        time.sleep(0.5)
+    print(f"   ⚠️ {name}: indexing not finished after {timeout}s, results use a partial index")
+    return False
+
+
+def run_setting(client, url, name, setting, data, queries, truth, k):
+    quantization, on_disk, m, ef, rescore, oversampling = setting
+    collection = f"bench_vectors_{name}"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    memory_before = qdrant_memory(url)
+    client.create_collection(
+        collection_name=collection,
+        # Force HNSW construction even for small benchmark sizes
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1),
+        **vectordb.collection_params(data.shape[1], quantization, on_disk, m=m),
+    )
+    started = time.perf_counter()
+    client.upload_collection(collection_name=collection, vectors=data, ids=range(len(data)), batch_size=512, parallel=2)
+    wait_indexed(client, collection, len(data))
+    build_s = time.perf_counter() - started
+
+    params = vectordb.search_params(quantization, ef=ef, rescore=rescore, oversampling=oversampling)
+    samples, hits = [], 0
+    wall = time.perf_counter()
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        result = client.query_points(collection_name=collection, query=q.tolist(), limit=k, search_params=params)
+        samples.append({"ok": True, "latency_ms": (time.perf_counter() - t0) * 1000})
+        hits += len({p.id for p in result.points} & set(expected))
+    stats = summarize(samples, time.perf_counter() - wall)
+    heap_mb, rss_mb = memory_growth_mb(memory_before, qdrant_memory(url))
+    stats.update(
+        recall=round(hits / (len(queries) * k), 4),
+        heap_mb=heap_mb,
+        rss_mb=rss_mb,
+        ram_mb_est=estimate_ram_mb(len(data), data.shape[1], quantization, on_disk, m),
+        build_s=round(build_s, 1),
+    )
+    client.delete_collection(collection)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantization / on-disk / HNSW benchmark for the knowledge base.")
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=768, help="nomic-embed-text produces 768-d vectors")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--only", nargs="*", choices=list(SETTINGS), help="Run a subset of settings")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url)
+    try:
+        client.get_collections()
+    except Exception as e:
+        print(f"❌ Qdrant is not reachable at {args.url} ({e}). Start it with `docker-compose up -d`.")
+        sys.exit(1)
+
+    print(f"🧪 {args.points} x {args.dim}-d vectors, {args.queries} queries, recall@{args.k}")
+    data, queries = make_vectors(args.points, args.queries, args.dim)
+    truth = np.argsort(-(queries @ data.T), axis=1)[:, :args.k].tolist()
+
+    results = {}
+    for name in args.only or SETTINGS:
+        print(f"   ⏳ {name}...")
+        results[name] = run_setting(client, args.url, name, SETTINGS[name], data, queries, truth, args.k)
+
+    print_table("Vector index settings", results)
+    fmt = lambda v: "-" if v is None else v
+    print(f"\n{'setting':<18}{'recall':>8}{'heap MB':>9}{'RSS MB':>8}{'est. MB*':>10}{'build s':>9}")
+    for name, s in results.items():
+        print(f"{name:<18}{s['recall']:>8.3f}{fmt(s['heap_mb']):>9}{fmt(s['rss_mb']):>8}{s['ram_mb_est']:>10}{s['build_s']:>9}")
+    print("heap / RSS: measured growth of Qdrant's memory (GET /metrics) while the collection was built and queried")
+    print("* estimate from the layout, for comparison (originals + quantized copy + HNSW links held in RAM)")
+    if all(s["heap_mb"] is None for s in results.values()):
+        print("⚠️ This Qdrant doesn't report memory_allocated_bytes / memory_resident_bytes on /metrics: only the estimate is shown.")
+
+    if not args.no_save:
+        save_results("vectors", vars(args), results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Throughput vs. number of server worker processes (`python server.py --workers N`).
+Runs the bench_app load test once per worker count against uvicorn workers with the
+local stand-ins. Model latency is kept short so the server's own CPU work (routing,
+prompt building, reranking, streaming, SQLite) is what limits throughput.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --sessions 32
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes
+from benchmarks.bench_app import main_async
+from benchmarks.report import print_table, save_results, compare
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker-count scaling load test.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--sessions", type=int, default=32, help="Concurrent client sessions")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--mix", default="chat=2,rag=2,quiz=1")
+    parser.add_argument("--first-token-ms", type=float, default=5)
+    parser.add_argument("--tokens-per-sec", type=float, default=2000)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    fakes.configure(first_token_ms=args.first_token_ms, tokens_per_sec=args.tokens_per_sec,
+                    answer_tokens=args.answer_tokens, embed_ms=1)
+    print(f"🧪 {os.cpu_count()} CPUs, {args.sessions} sessions, workers: {args.workers}")
+
+    results = {}
+    for n in args.workers:
+        run = argparse.Namespace(**{**vars(args), "workers": n})
+        results[f"workers_{n}"] = asyncio.run(main_async(run))["all"]
+
+    print_table("Throughput by worker count", results)
+    base = results[f"workers_{args.workers[0]}"]["rps"]
+    for name, s in results.items():
+        print(f"   {name:<18}{s['rps']:>8} rps  x{s['rps'] / base:.2f}")
+
+    if not args.no_save:
+        save_results("workers", {**vars(args), "cpus": os.cpu_count(), "fakes": dict(fakes.SETTINGS)}, results)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+A stand-in Ollama HTTP server (/api/chat, /api/embed, /api/version, /api/tags) for testing
+backend_pool.py without GPUs. Each server has a fixed number of parallel slots, like a GPU
+box with OLLAMA_NUM_PARALLEL, so extra load queues up the way it does on real hardware.
+
+    python -m benchmarks.fake_ollama --port 11501 --slots 2
+    OLLAMA_HOSTS=http://localhost:11501,http://localhost:11502 python server.py
+
+POST /fake/down and /fake/up simulate an outage (every endpoint answers 503 while down).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes
+
+DEFAULTS = {
+    "slots": 1,               # Requests processed at once; the rest wait
+    "first_token_ms": 100,    # Prefill before the first token
+    "tokens_per_sec": 50,
+    "answer_tokens": 40,
+    "embed_ms_per_text": 2,   # Embedding cost per input text
+}
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"   # Close-delimited bodies: streaming needs no chunked encoding
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.server.down:
+            return self._json(503, {"error": "down"})
+        if self.path == "/api/version":
+            return self._json(200, {"version": "0.0.0-fake"})
+        if self.path == "/api/tags":
+            return self._json(200, {"models": []})
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path in ("/fake/down", "/fake/up"):
+            self.server.down = self.path == "/fake/down"
+            return self._json(200, {"down": self.server.down})
+        if self.server.down:
+            return self._json(503, {"error": "down"})
+        request = self._read()
+        with self.server.slots:
+            self.server.served += 1
+            if self.path == "/api/chat":
+                return self._chat(request)
+            if self.path == "/api/embed":
+                return self._embed(request)
+        self._json(404, {"error": "not found"})
+
+    def _chat(self, request):
+        s = self.server.settings
+        text = " ".join(str(m.get("content", "")) for m in request.get("messages", []))
+        words = fakes._words(fakes._seed(text), s["answer_tokens"])
+        created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        time.sleep(s["first_token_ms"] / 1000)
+        if not request.get("stream", True):
+            time.sleep(len(words) / s["tokens_per_sec"])
+            return self._json(200, {"model": request.get("model"), "created_at": created, "done": True,
+                                    "message": {"role": "assistant", "content": " ".join(words)},
+                                    "eval_count": len(words)})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for i, word in enumerate(words):
+            line = {"model": request.get("model"), "created_at": created, "done": False,
+                    "message": {"role": "assistant", "content": word + (" " if i < len(words) - 1 else "")}}
+            self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(1 / s["tokens_per_sec"])
+        final = {"model": request.get("model"), "created_at": created, "done": True, "done_reason": "stop",
+                 "message": {"role": "assistant", "content": ""},
+                 "prompt_eval_count": len(text) // 4, "prompt_eval_duration": int(s["first_token_ms"] * 1e6),
+                 "eval_count": len(words), "eval_duration": int(len(words) / s["tokens_per_sec"] * 1e9),
+                 "load_duration": 0, "total_duration": 0}
+        self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+
+    def _embed(self, request):
+        s = self.server.settings
+        texts = request.get("input", "")
+        texts = [texts] if isinstance(texts, str) else texts
+        time.sleep(len(texts) * s["embed_ms_per_text"] / 1000)
+        embedder = fakes.FakeEmbeddings()
+        vectors = [embedder._vector(t) for t in texts]
+        self._json(200, {"model": request.get("model"), "embeddings": vectors})
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, **settings):
+        super().__init__(("127.0.0.1", port), FakeOllamaHandler)
+        self.settings = {**DEFAULTS, **{k: v for k, v in settings.items() if v is not None}}
+        self.slots = threading.BoundedSemaphore(self.settings["slots"])
+        self.down = False
+        self.served = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def start(port=0, **settings):
+    """Runs a fake server in a background thread (port 0 = any free port). Returns the server."""
+    server = FakeOllamaServer(port, **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server.")
+    parser.add_argument("--port", type=int, default=11501)
+    for key, value in DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = vars(parser.parse_args())
+    server = FakeOllamaServer(args.pop("port"), **args)
+    print(f"🤖 Fake Ollama at {server.url} ({server.settings['slots']} slots)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
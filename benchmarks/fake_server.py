@@ -0,0 +1,18 @@
+"""
+The real app with the local stand-ins installed, importable by uvicorn worker processes:
+
+    FAKES_SETTINGS='{"first_token_ms": 20}' CHAT_DB_PATH=/tmp/bench.db \
+        python -m uvicorn benchmarks.fake_server:app --workers 4
+
+Each worker installs the fakes and seeds its own (identical) in-memory corpus.
+"""
+import json
+import os
+
+from benchmarks import fakes
+
+fakes.configure(**json.loads(os.getenv("FAKES_SETTINGS", "{}")))
+fakes.install()
+fakes.seed_corpus()
+
+from server import app  # noqa: E402  (must come after install())
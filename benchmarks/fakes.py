@@ -0,0 +1,355 @@
+"""
+Deterministic local stand-ins for Ollama (chat + embeddings), Qdrant and Mem0.
+`install()` swaps them into agent.py / ingest.py so benchmarks run without models or Docker.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# --- CONFIGURATION (overridable via configure()) ---
+SETTINGS = {
+    "first_token_ms": 150,     # Queue wait + prefill before the first token
+    "tokens_per_sec": 40,      # Generation speed
+    "answer_tokens": 120,      # Length of a free-form answer
+    "think_tokens": 0,         # Length of a deepseek-style <think> block (0 = none)
+    "prefill_tokens_per_sec": 0,  # Prompt processing speed for tokens not in the KV cache (0 = free)
+    "embed_ms": 5,             # Latency per embedding call
+    "search_ms": 2,            # Latency per vector search
+    "mem0_ms": 50,             # Latency of a Mem0 write
+    "dim": 256,                # Embedding dimension
+}
+
+# Totals over all chat calls, for benchmarks that report prompt sizes
+USAGE = {"calls": 0, "prompt_chars": 0, "prefill_tokens": 0}
+_kv_cache = {}   # model -> last prompt text (one slot per model, like OLLAMA_NUM_PARALLEL=1)
+
+WORDS = ("the function returns a value when the base case is reached recursion stack memory "
+         "process thread kernel scheduler page table cache virtual address lock queue graph "
+         "tree node edge algorithm complexity proof theorem matrix vector gradient loss").split()
+
+
+def configure(**overrides):
+    SETTINGS.update({k: v for k, v in overrides.items() if v is not None})
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+def _prompt_text(prompt):
+    if isinstance(prompt, str):
+        return prompt
+    parts = []
+    for m in prompt:
+        content = getattr(m, "content", m)
+        if isinstance(content, list):
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+def _words(seed, count):
+    rng = np.random.default_rng(seed)
+    return [WORDS[i] for i in rng.integers(0, len(WORDS), count)]
+
+
+# =========================================================================
+#  CHAT MODEL
+# =========================================================================
+
+class FakeChatModel:
+    """Mimics ChatOllama.astream / ainvoke with configurable latency and token rate."""
+    def __init__(self, model="fake", format=None, temperature=0, **kwargs):
+        self.model = model
+        self.format = format
+        self.temperature = temperature
+
+    def _answer(self, text, think=True):
+        if self.format == "json":
+            return '{"tool": "tutor"}'
+        if "Quiz Generator" in text:
+            return ("Question: Which structure does recursion use to track calls?\n"
+                    "A) Heap\nB) Stack\nC) Queue\nD) Graph")
+        if "Grader" in text:
+            return "VERDICT: CORRECT\nEXPLANATION: The call stack stores each frame."
+        if "curriculum" in text:
+            return '["Introduction", "Core Concepts", "Advanced Techniques", "Applications"]'
+        body = " ".join(_words(_seed(text), SETTINGS["answer_tokens"]))
+        if SETTINGS["think_tokens"] and think:
+            body = "<think>" + " ".join(_words(_seed(text) + 1, SETTINGS["think_tokens"])) + "</think>\n" + body
+        return body
+
+    def _prefill(self, text):
+        """Tokens to evaluate after reusing the common prefix with this model's previous prompt."""
+        previous, _kv_cache[self.model] = _kv_cache.get(self.model, ""), text
+        cached = 0
+        for a, b in zip(previous, text):
+            if a != b:
+                break
+            cached += 1
+        tokens = max(1, (len(text) - cached) // 4)
+        USAGE["calls"] += 1
+        USAGE["prompt_chars"] += len(text)
+        USAGE["prefill_tokens"] += tokens
+        rate = SETTINGS["prefill_tokens_per_sec"]
+        return tokens, SETTINGS["first_token_ms"] / 1000 + (tokens / rate if rate else 0)
+
+    def _metadata(self, tokens, prefill_tokens, prefill_s):
+        return {
+            "model": self.model,
+            "done": True,
+            "load_duration": 0,
+            "prompt_eval_count": prefill_tokens,
+            "prompt_eval_duration": int(prefill_s * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int(tokens / SETTINGS["tokens_per_sec"] * 1e9),
+        }
+
+    async def astream(self, prompt, **kwargs):
+        text = _prompt_text(prompt)
+        prefill_tokens, prefill_s = self._prefill(text)
+        # A trailing assistant message is continued, like Ollama does (used to close a <think> block)
+        continued = not isinstance(prompt, str) and isinstance(prompt[-1], AIMessage)
+        tokens = self._answer(_prompt_text(prompt[:-1]) if continued else text, think=not continued).split(" ")
+        await asyncio.sleep(prefill_s)
+        delay = 1 / SETTINGS["tokens_per_sec"]
+        for i, tok in enumerate(tokens):
+            last = i == len(tokens) - 1
+            yield AIMessageChunk(content=tok if last else tok + " ",
+                                 response_metadata=self._metadata(len(tokens), prefill_tokens, prefill_s) if last else {})
+            if not last:
+                await asyncio.sleep(delay)
+
+    async def ainvoke(self, prompt, **kwargs):
+        text = _prompt_text(prompt)
+        prefill_tokens, prefill_s = self._prefill(text)
+        answer = self._answer(text)
+        tokens = len(answer.split(" "))
+        await asyncio.sleep(prefill_s + tokens / SETTINGS["tokens_per_sec"])
+        return AIMessage(content=answer, response_metadata=self._metadata(tokens, prefill_tokens, prefill_s))
+
+    def invoke(self, prompt, **kwargs):
+        text = _prompt_text(prompt)
+        return AIMessage(content=self._answer(text))
+
+
+# =========================================================================
+#  EMBEDDINGS
+# =========================================================================
+
+class FakeEmbeddings:
+    """Bag-of-words hashing embeddings: similar texts get similar vectors, fully deterministic."""
+    def __init__(self, model="fake-embed", **kwargs):
+        self.model = model
+
+    def _vector(self, text):
+        vec = np.zeros(SETTINGS["dim"], dtype=np.float32)
+        for word in text.lower().split():
+            vec[_seed(word) % SETTINGS["dim"]] += 1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(SETTINGS["embed_ms"] / 1000)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        time.sleep(SETTINGS["embed_ms"] / 1000)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(SETTINGS["embed_ms"] / 1000)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(SETTINGS["embed_ms"] / 1000)
+        return self._vector(text)
+
+
+# =========================================================================
+#  VECTOR STORE (Qdrant stand-in)
+# =========================================================================
+
+COLLECTIONS = {}   # collection name -> {"docs": [Document], "ids": [int], "indexes": {}, "matrix": np.ndarray}
+_next_id = [0]
+
+
+def _empty_collection():
+    return {"docs": [], "ids": [], "indexes": {}, "matrix": np.zeros((0, SETTINGS["dim"]), np.float32)}
+
+
+def _field(doc, key):
+    if key == "page_content":
+        return doc.page_content
+    return doc.metadata.get(key.split(".", 1)[-1])
+
+
+def _condition(doc, condition):
+    value = _field(doc, condition.key)
+    values = value if isinstance(value, list) else [value]
+    if getattr(condition.match, "any", None) is not None:
+        return any(v in condition.match.any for v in values)
+    return condition.match.value in values
+
+
+def _matches(doc, query_filter):
+    """Evaluates a qdrant Filter: `must` (all), `should` (any) with MatchValue/MatchAny on payload keys."""
+    if query_filter is None:
+        return True
+    if query_filter.must and not all(_condition(doc, c) for c in query_filter.must):
+        return False
+    if query_filter.should and not any(_condition(doc, c) for c in query_filter.should):
+        return False
+    return True
+
+
+class _Point:
+    def __init__(self, point_id, doc):
+        self.id = point_id
+        self.payload = {"page_content": doc.page_content, "metadata": json.loads(json.dumps(doc.metadata))}
+
+
+class FakeQdrantClient:
+    def __init__(self, url=None, **kwargs):
+        self.url = url
+
+    def close(self):
+        pass
+
+    def collection_exists(self, collection_name):
+        return collection_name in COLLECTIONS
+
+    def delete_collection(self, collection_name):
+        COLLECTIONS.pop(collection_name, None)
+
+    def get_collection(self, collection_name):
+        col = COLLECTIONS.get(collection_name) or _empty_collection()
+        return SimpleNamespace(points_count=len(col["docs"]), payload_schema=dict(col["indexes"]))
+
+    def create_payload_index(self, collection_name, field_name, field_schema=None, **kwargs):
+        COLLECTIONS[collection_name]["indexes"][field_name] = field_schema
+
+    def create_collection(self, collection_name, vectors_config=None, **kwargs):
+        COLLECTIONS[collection_name] = _empty_collection()
+
+    def scroll(self, collection_name, scroll_filter=None, limit=10, offset=None, **kwargs):
+        col = COLLECTIONS.get(collection_name) or _empty_collection()
+        hits = [_Point(pid, doc) for pid, doc in zip(col["ids"], col["docs"])
+                if (offset is None or pid >= offset) and _matches(doc, scroll_filter)]
+        page = hits[:limit]
+        return page, (hits[limit].id if len(hits) > limit else None)
+
+    def set_payload(self, collection_name, payload, points, **kwargs):
+        col = COLLECTIONS[collection_name]
+        for i, pid in enumerate(col["ids"]):
+            if pid in points:
+                col["docs"][i].metadata = dict(payload.get("metadata", col["docs"][i].metadata))
+
+    def delete(self, collection_name, points_selector=None, **kwargs):
+        """Supports FilterSelector and PointIdsList."""
+        col = COLLECTIONS.get(collection_name)
+        if not col or not col["docs"]:
+            return
+        if hasattr(points_selector, "points"):
+            drop = set(points_selector.points)
+            keep = [i for i, pid in enumerate(col["ids"]) if pid not in drop]
+        else:
+            keep = [i for i, doc in enumerate(col["docs"]) if not _matches(doc, points_selector.filter)]
+        col["docs"] = [col["docs"][i] for i in keep]
+        col["ids"] = [col["ids"][i] for i in keep]
+        col["matrix"] = col["matrix"][keep]
+
+
+class FakeVectorStore:
+    """Brute-force cosine search over an in-process matrix (same API surface as QdrantVectorStore)."""
+    def __init__(self, client=None, collection_name="default", embedding=None, **kwargs):
+        self.client = client or FakeQdrantClient()
+        self.collection_name = collection_name
+        self.embeddings = embedding or FakeEmbeddings()
+        COLLECTIONS.setdefault(collection_name, _empty_collection())
+
+    @classmethod
+    def from_documents(cls, documents, embedding, collection_name="default", force_recreate=False, **kwargs):
+        if force_recreate:
+            COLLECTIONS.pop(collection_name, None)
+        store = cls(collection_name=collection_name, embedding=embedding)
+        store.add_documents(documents)
+        return store
+
+    def add_documents(self, documents, **kwargs):
+        col = COLLECTIONS[self.collection_name]
+        vectors = np.asarray(self.embeddings.embed_documents([d.page_content for d in documents]), np.float32)
+        ids = list(range(_next_id[0], _next_id[0] + len(documents)))
+        _next_id[0] += len(documents)
+        col["docs"].extend(documents)
+        col["ids"].extend(ids)
+        col["matrix"] = np.vstack([col["matrix"], vectors.reshape(-1, SETTINGS["dim"])])
+        return [str(i) for i in ids]
+
+    async def asimilarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        col = COLLECTIONS[self.collection_name]
+        if not col["docs"]:
+            return []
+        q = np.asarray(await self.embeddings.aembed_query(query), np.float32)
+        await asyncio.sleep(SETTINGS["search_ms"] / 1000)
+        scores = col["matrix"] @ q
+        if filter is not None:
+            mask = np.array([_matches(doc, filter) for doc in col["docs"]])
+            scores = np.where(mask, scores, -np.inf)
+        top = [i for i in np.argsort(-scores)[:k] if np.isfinite(scores[i])]
+        return [(col["docs"][i], float(scores[i])) for i in top]
+
+    async def asimilarity_search(self, query, k=4, **kwargs):
+        return [d for d, _ in await self.asimilarity_search_with_score(query, k, **kwargs)]
+
+
+def seed_corpus(collection_name="study_knowledge_base", docs=500, words=180):
+    """Fills the stand-in collection with deterministic synthetic notes."""
+    documents = []
+    for i in range(docs):
+        category = ["os", "algorithms", "ml", "math"][i % 4]
+        text = " ".join(_words(i, words))
+        documents.append(Document(page_content=text, metadata={"source": f"data/{category}/note_{i}.txt", "category": category}))
+    FakeVectorStore.from_documents(documents, FakeEmbeddings(), collection_name=collection_name, force_recreate=True)
+    return len(documents)
+
+
+# =========================================================================
+#  MEM0
+# =========================================================================
+
+class FakeMemory:
+    @classmethod
+    def from_config(cls, config):
+        return cls()
+
+    def add(self, *args, **kwargs):
+        time.sleep(SETTINGS["mem0_ms"] / 1000)   # Mem0's add() is synchronous too
+        return {"results": []}
+
+    def search(self, *args, **kwargs):
+        return {"results": []}
+
+
+def install():
+    """Patches agent.py and ingest.py to use the stand-ins. Call before creating WebAgent."""
+    import agent
+    import ingest
+    import vectordb
+
+    agent.PooledChatOllama = FakeChatModel
+    agent.PooledOllamaEmbeddings = FakeEmbeddings
+    agent.primary_url = lambda model: "http://fake-ollama"
+    agent.QdrantVectorStore = FakeVectorStore
+    agent.Memory = FakeMemory
+    ingest.PooledOllamaEmbeddings = FakeEmbeddings
+    ingest.model_digest = lambda model: "sha256:fake"
+    vectordb.QdrantClient = FakeQdrantClient
+    vectordb._client = None
+    ingest.QdrantVectorStore = FakeVectorStore
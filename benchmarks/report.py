@@ -0,0 +1,78 @@
+import json
+import os
+import platform
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(samples, wall_seconds):
+    """`samples` is a list of dicts with latency_ms / ttft_ms / ok. Returns percentile stats."""
+    ok = [s for s in samples if s.get("ok", True)]
+    latencies = [s["latency_ms"] for s in ok]
+    ttfts = [s["ttft_ms"] for s in ok if s.get("ttft_ms") is not None]
+    stats = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "rps": round(len(ok) / wall_seconds, 2) if wall_seconds else None,
+    }
+    for name, values in (("latency_ms", latencies), ("ttft_ms", ttfts)):
+        stats[name] = {p: round(percentile(values, int(p[1:])), 2) if values else None for p in ("p50", "p95", "p99")}
+    return stats
+
+
+def print_table(title, results):
+    print(f"\n📊 {title}")
+    print(f"{'workload':<18}{'reqs':>6}{'err':>5}{'rps':>8}{'lat p50':>10}{'p95':>9}{'p99':>9}{'ttft p50':>10}{'p95':>9}{'p99':>9}")
+    for name, s in results.items():
+        lat, ttft = s["latency_ms"], s["ttft_ms"]
+        fmt = lambda v: f"{v:.0f}" if v is not None else "-"
+        print(f"{name:<18}{s['requests']:>6}{s['errors']:>5}{fmt(s['rps']):>8}"
+              f"{fmt(lat['p50']):>10}{fmt(lat['p95']):>9}{fmt(lat['p99']):>9}"
+              f"{fmt(ttft['p50']):>10}{fmt(ttft['p95']):>9}{fmt(ttft['p99']):>9}")
+
+
+def save_results(name, settings, results):
+    """Writes results/<name>-<timestamp>.json so runs can be compared later."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    payload = {
+        "name": name,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"\n💾 Saved: {path}")
+    return path
+
+
+def compare(baseline_path, results):
+    """Prints the relative change of each metric against an earlier run."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"\n🔍 Compared to {os.path.basename(baseline_path)} (negative latency / positive rps = better)")
+    for name, s in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        parts = []
+        if old.get("rps") and s.get("rps"):
+            parts.append(f"rps {100 * (s['rps'] - old['rps']) / old['rps']:+.1f}%")
+        for metric in ("latency_ms", "ttft_ms"):
+            for p in ("p50", "p95", "p99"):
+                a, b = old[metric][p], s[metric][p]
+                if a and b is not None:
+                    parts.append(f"{metric.split('_')[0]} {p} {100 * (b - a) / a:+.1f}%")
+        print(f"   {name:<18}" + ", ".join(parts))
@@ -0,0 +1,166 @@
+import os
+import re
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# --- CONFIGURATION ---
+CHUNKING = os.getenv("CHUNKING", "structured")          # "structured" | "fixed" (old 1000/200 splitter)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "350"))    # Target chunk size
+MIN_CHUNK_TOKENS = int(os.getenv("MIN_CHUNK_TOKENS", "80"))  # Smaller pieces are merged with neighbours
+PROSE_OVERLAP = 0.1                                     # Overlap only where a unit has to be cut mid-text
+CHARS_PER_TOKEN = 4                                     # Rough estimate, good enough for budgeting
+
+RECORD_TYPES = {".csv", ".xlsx", ".xls"}
+SLIDE_TYPES = {".pptx", ".ppt"}
+SECTIONED_TYPES = {".pdf", ".md"}
+
+# "1.2 Paging", "Chapter 3", "## Scheduling", "DEADLOCK AVOIDANCE"
+HEADING_RE = re.compile(
+    r"^(#{1,6}\s+\S.*"
+    r"|(?:\d+(?:\.\d+)*\.?|(?i:chapter|section)\s+\d+(?:\.\d+)*)\s+[A-Z][^\n.]{0,80}"
+    r"|[A-Z][A-Z0-9 ,:&()\-]{3,60})$",
+    re.MULTILINE,
+)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _splitter(overlap=True):
+    size = CHUNK_TOKENS * CHARS_PER_TOKEN
+    return RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=int(size * PROSE_OVERLAP) if overlap else 0)
+
+
+def _base_metadata(doc):
+    """Keeps only the fields retrieval uses; loader-specific extras (element ids, html) are dropped."""
+    return {k: doc.metadata[k] for k in ("source", "category") if k in doc.metadata}
+
+
+def _span(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return str(values[0]) if values[0] == values[-1] else f"{values[0]}-{values[-1]}"
+
+
+def _merge_small(pieces):
+    """Glues splitter fragments below MIN_CHUNK_TOKENS (e.g. a lone heading line) onto the next piece."""
+    merged = []
+    for piece in pieces:
+        if merged and estimate_tokens(merged[-1]) < MIN_CHUNK_TOKENS:
+            merged[-1] = merged[-1] + "\n" + piece
+        else:
+            merged.append(piece)
+    return merged
+
+
+def _pack(units, position_key, separator="\n\n", boundary=None):
+    """
+    Greedily merges (text, metadata, position) units into chunks of up to CHUNK_TOKENS.
+    Units are never cut unless a single one exceeds the budget; `boundary(unit)` may force
+    a new chunk (e.g. at a heading) once the current one is big enough to stand alone.
+    """
+    chunks = []
+    texts, positions, metadata, tokens = [], [], None, 0
+
+    def emit():
+        if texts:
+            meta = dict(metadata)
+            span = _span(positions)
+            if span is not None:
+                meta[position_key] = span
+            chunks.append(Document(page_content=separator.join(texts), metadata=meta))
+
+    for text, meta, position in units:
+        size = estimate_tokens(text)
+        starts_section = boundary is not None and boundary(text) and tokens >= MIN_CHUNK_TOKENS
+        # A small leftover is carried into the first piece of an oversized unit instead of standing alone
+        carry = size > CHUNK_TOKENS and tokens < MIN_CHUNK_TOKENS
+        if texts and (starts_section or (tokens + size > CHUNK_TOKENS and not carry)):
+            emit()
+            texts, positions, tokens = [], [], 0
+        if size > CHUNK_TOKENS:
+            # Oversized unit: split it on its own, with overlap since the cut is mid-text
+            prefix, prefix_positions, prefix_meta = texts, positions, metadata
+            for i, piece in enumerate(_merge_small(_splitter().split_text(text))):
+                if i == 0 and prefix:
+                    texts, positions, metadata = prefix + [piece], prefix_positions + [position], prefix_meta
+                else:
+                    texts, positions, metadata = [piece], [position], meta
+                emit()
+            texts, positions, tokens = [], [], 0
+            continue
+        if not texts:
+            metadata = meta
+        texts.append(text)
+        positions.append(position)
+        tokens += size
+    emit()
+    return chunks
+
+
+def chunk_records(docs):
+    """CSV rows / spreadsheet elements: many tiny documents -> row batches, no overlap."""
+    units = []
+    for i, doc in enumerate(docs):
+        text = doc.page_content.strip()
+        if text:
+            units.append((text, _base_metadata(doc), doc.metadata.get("row", doc.metadata.get("page_number", i))))
+    return _pack(units, "rows", separator="\n")
+
+
+def chunk_slides(docs):
+    """Slides stay whole; consecutive short slides share a chunk."""
+    units = [(d.page_content.strip(), _base_metadata(d), d.metadata.get("slide")) for d in docs if d.page_content.strip()]
+    return _pack(units, "slide")
+
+
+def _sections(text):
+    """Splits text at heading lines; each heading stays with the body that follows it."""
+    starts = [m.start() for m in HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    return [text[a:b].strip() for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+
+def chunk_sectioned(docs):
+    """PDF pages / Markdown: cut at headings and page breaks, pack small sections together."""
+    units = []
+    for doc in docs:
+        page = doc.metadata.get("page")
+        for section in _sections(doc.page_content):
+            units.append((section, _base_metadata(doc), page))
+    return _pack(units, "page", boundary=lambda text: bool(HEADING_RE.match(text)))
+
+
+def chunk_prose(docs):
+    """Plain text / DOCX / HTML: paragraph-aware splitting with a small overlap."""
+    units = []
+    for doc in docs:
+        for paragraph in re.split(r"\n\s*\n", doc.page_content):
+            if paragraph.strip():
+                units.append((paragraph.strip(), _base_metadata(doc), None))
+    return _pack(units, "part")
+
+
+def chunk_fixed(docs):
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_documents(docs)
+
+
+def chunk_documents(docs, file_path):
+    """Picks the chunking strategy for `file_path`'s format."""
+    if not docs:
+        return []
+    if CHUNKING == "fixed":
+        return chunk_fixed(docs)
+
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in RECORD_TYPES:
+        return chunk_records(docs)
+    if ext in SLIDE_TYPES:
+        return chunk_slides(docs)
+    if ext in SECTIONED_TYPES:
+        return chunk_sectioned(docs)
+    return chunk_prose(docs)
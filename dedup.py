@@ -0,0 +1,257 @@
+import hashlib
+import os
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# --- CONFIGURATION ---
+DEDUP_ENABLED = os.getenv("DEDUP", "1") == "1"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))  # Jaccard similarity of word shingles
+DOC_DUP_THRESHOLD = float(os.getenv("DOC_DUP_THRESHOLD", "0.95"))    # Same, for whole files (near-identical only)
+DOC_LENGTH_RATIO = 0.95                 # ...whose word counts also differ by at most 5%
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 64
+DOC_SKETCH_SIZE = 256                   # Whole documents: estimate error ~0.025 instead of ~0.05
+LSH_BANDS = 16                          # 16 bands x 4 rows: pairs above ~0.5 similarity become candidates
+BOILERPLATE_MIN_PAGES = 3               # Header/footer detection needs at least this many pages
+BOILERPLATE_RATIO = 0.5                 # ...and the line must repeat on this share of them
+BOILERPLATE_EDGE_LINES = 3              # Only the first/last lines of a page can be header/footer
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, _PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def content_hash(text):
+    return hashlib.sha1(normalize(text).encode("utf-8")).hexdigest()
+
+
+def shingles(text):
+    """Set of 32-bit hashes of overlapping word n-grams."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(shingle_set):
+    x = np.fromiter(shingle_set, dtype=np.uint64) % _PRIME
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+class DocumentSignature:
+    """
+    Bottom-k sketch (the DOC_SKETCH_SIZE smallest shingle hashes) and word count of a whole
+    document, fed page by page (or slide, row) while it is chunked, so it costs no extra read.
+    Shingles spanning two pages are kept, so the same text split at different places (a deck
+    as PPTX slides vs. PDF pages) gets the same signature. Larger than the chunk MinHash, since
+    a wrong document match drops a whole file, and one sort per page instead of k hashes.
+    """
+    def __init__(self):
+        self.minhash = None   # None until the document has SHINGLE_WORDS words
+        self.words = 0
+        self._tail = []
+
+    def update(self, text):
+        words = re.findall(r"\w+", text.lower())
+        self.words += len(words)
+        words = self._tail + words
+        if len(words) < SHINGLE_WORDS:
+            self._tail = words
+            return
+        x = np.fromiter((
+            zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+            for i in range(len(words) - SHINGLE_WORDS + 1)
+        ), dtype=np.uint64)
+        x = (_A[0] * x + _B[0]) % _PRIME   # Spread CRCs of similar text over the range
+        if self.minhash is not None:
+            x = np.concatenate([self.minhash, x])
+        self.minhash = np.unique(x)[:DOC_SKETCH_SIZE]
+        self._tail = words[-(SHINGLE_WORDS - 1):]
+
+
+def sketch_similarity(a, b):
+    """Jaccard estimate of two bottom-k sketches: share of the union's k smallest hashes in both."""
+    shared = np.intersect1d(a, b, assume_unique=True)
+    if not len(shared):
+        return 0.0
+    union = np.union1d(a, b)[:DOC_SKETCH_SIZE]
+    return int((shared <= union[-1]).sum()) / len(union)
+
+
+def signature_hex(signature):
+    return signature.astype(np.uint32).tobytes().hex()   # Values are < 2^31
+
+
+def signature_from_hex(text):
+    return np.frombuffer(bytes.fromhex(text), dtype=np.uint32).astype(np.uint64)
+
+
+class DocumentIndex:
+    """
+    Whole-document signatures of indexed files. Chunk boundaries depend on the file format, so
+    the same document in two formats rarely has matching chunks; its full text still matches.
+    Only near-identical documents of about the same length match: a revision that adds or
+    replaces material is chunked, and chunk-level dedup merges the passages it shares.
+    """
+    def __init__(self, threshold=DOC_DUP_THRESHOLD, length_ratio=DOC_LENGTH_RATIO):
+        self.threshold = threshold
+        self.length_ratio = length_ratio
+        self.signatures = {}
+
+    def add(self, path, signature, words):
+        self.signatures[path] = (signature, words)
+
+    def find(self, signature, words):
+        """The indexed file most similar to `signature` (see sketch_similarity), or None."""
+        best, best_similarity = None, self.threshold
+        for path, (other, other_words) in self.signatures.items():
+            if min(words, other_words) < self.length_ratio * max(words, other_words):
+                continue
+            if len(np.intersect1d(signature, other, assume_unique=True)) < best_similarity * max(len(signature), len(other)):
+                continue   # Upper bound of the estimate below (most pairs stop here)
+            similarity = sketch_similarity(signature, other)
+            if similarity >= best_similarity:
+                best, best_similarity = path, similarity
+        return best
+
+
+def band_keys(signature):
+    """LSH bucket keys; two chunks sharing any key are near-duplicate candidates."""
+    return [
+        f"{band}-{zlib.crc32(signature[band * _ROWS:(band + 1) * _ROWS].tobytes()):08x}"
+        for band in range(LSH_BANDS)
+    ]
+
+
+def fingerprint(doc):
+    """Stores the dedup keys on the chunk (they travel to Qdrant with the payload)."""
+    doc.metadata["content_hash"] = content_hash(doc.page_content)
+    doc.metadata["lsh_bands"] = band_keys(minhash(shingles(doc.page_content)))
+    doc.metadata.setdefault("sources", [doc.metadata["source"]] if "source" in doc.metadata else [])
+    return doc
+
+
+def merge_sources(canonical_metadata, duplicate_metadata):
+    """Adds the duplicate's sources to the canonical chunk. Returns True if anything was added."""
+    sources = canonical_metadata.setdefault("sources", [])
+    added = False
+    for source in duplicate_metadata.get("sources") or [duplicate_metadata.get("source")]:
+        if source and source not in sources:
+            sources.append(source)
+            added = True
+    return added
+
+
+class Deduplicator:
+    """
+    Exact + near-duplicate filter for one ingest run. The first chunk seen is kept as the
+    canonical copy; later copies only add their source to its `sources` list.
+    """
+    def __init__(self, threshold=NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self.by_hash = {}
+        self.buckets = defaultdict(list)   # band key -> indexes into self.kept
+        self.kept = []
+        self._shingles = []
+        self.exact = 0
+        self.near = 0
+        self.documents = 0   # Whole files found to duplicate another file (see DocumentIndex)
+
+    def add(self, doc):
+        """Returns True if `doc` is new (and kept), False if it was merged into an earlier chunk."""
+        if "content_hash" not in doc.metadata:
+            fingerprint(doc)
+        h = doc.metadata["content_hash"]
+        if h in self.by_hash:
+            merge_sources(self.by_hash[h].metadata, doc.metadata)
+            self.exact += 1
+            return False
+
+        doc_shingles = shingles(doc.page_content)
+        candidates = {i for key in doc.metadata["lsh_bands"] for i in self.buckets.get(key, ())}
+        for i in sorted(candidates):
+            if jaccard(doc_shingles, self._shingles[i]) >= self.threshold:
+                merge_sources(self.kept[i].metadata, doc.metadata)
+                self.by_hash[h] = self.kept[i]   # Later exact copies of this variant resolve directly
+                self.near += 1
+                return False
+
+        index = len(self.kept)
+        self.kept.append(doc)
+        self._shingles.append(doc_shingles)
+        self.by_hash[h] = doc
+        for key in doc.metadata["lsh_bands"]:
+            self.buckets[key].append(index)
+        return True
+
+    def forget(self):
+        """Drops the kept chunks but not the counts. For streaming ingestion: once a batch is
+        stored, later batches are matched against the collection (ingest.merge_into_collection)."""
+        self.by_hash.clear()
+        self.buckets.clear()
+        self.kept.clear()
+        self._shingles.clear()
+
+    def report(self, total):
+        removed = self.exact + self.near
+        share = removed / total * 100 if total else 0
+        report = f"🧹 Dedup: {removed}/{total} chunks removed ({self.exact} exact, {self.near} near-duplicate, {share:.1f}%)"
+        if self.documents:
+            report += f", {self.documents} duplicate document(s) linked"
+        return report
+
+
+def deduplicate(chunks, threshold=NEAR_DUP_THRESHOLD):
+    """Returns (kept chunks, Deduplicator with the counts)."""
+    dedup = Deduplicator(threshold)
+    kept = [doc for doc in chunks if dedup.add(doc)]
+    return kept, dedup
+
+
+def _line_key(line):
+    # Page numbers change from page to page ("Page 3 of 40"), so digits are ignored
+    return re.sub(r"\d+", "#", normalize(line))
+
+
+def _edges(lines):
+    """Indexes of the first/last few non-empty lines of a page."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:BOILERPLATE_EDGE_LINES] + filled[-BOILERPLATE_EDGE_LINES:])
+
+
+def strip_boilerplate(docs):
+    """Removes header/footer lines repeated at the top/bottom of many pages of one document (PDF page docs)."""
+    if len(docs) < BOILERPLATE_MIN_PAGES:
+        return docs
+    pages = [doc.page_content.splitlines() for doc in docs]
+    counts = Counter()
+    for lines in pages:
+        counts.update({_line_key(lines[i]) for i in _edges(lines)})
+    limit = max(BOILERPLATE_MIN_PAGES, int(len(docs) * BOILERPLATE_RATIO))
+    repeated = {key for key, n in counts.items() if n >= limit}
+    if not repeated:
+        return docs
+    for doc, lines in zip(docs, pages):
+        edges = _edges(lines)
+        doc.page_content = "\n".join(
+            line for i, line in enumerate(lines) if not (i in edges and _line_key(line) in repeated)
+        )
+    return docs
@@ -1,28 +1,18 @@
 import os
 from langchain_core.documents import Document
-from docx import Document as DocxDocument  # Requires: pip install python-docx
-from pptx import Presentation            # Requires: pip install python-pptx
 
-from langchain_community.document_loaders import (
-    CSVLoader, 
-    UnstructuredExcelLoader, 
-    BSHTMLLoader, 
-    UnstructuredMarkdownLoader,
-    PyMuPDFLoader
-)
+# Format backends (python-docx, python-pptx, PyMuPDF, unstructured, ...) are imported by the
+# loader that needs them, on first use: a folder of .txt files never pays for the rest.
 
 # === CSV Loader ===
 def load_csv(path):
     """
     Loads CSV files. Creates one Document per row by default.
     """
-    try:
-        # csv_args can be customized for delimiters
-        loader = CSVLoader(file_path=path, encoding="utf-8", csv_args={'delimiter': ','})
-        return loader.load()
-    except Exception as e:
-        print(f"Error loading CSV {path}: {e}")
-        return []
+    from langchain_community.document_loaders import CSVLoader
+    # csv_args can be customized for delimiters
+    loader = CSVLoader(file_path=path, encoding="utf-8", csv_args={'delimiter': ','})
+    return loader.load()
 
 # === Excel Loader ===
 def load_excel(path):
@@ -30,13 +20,10 @@ def load_excel(path):
     Loads .xlsx files. 
     Note: Requires 'openpyxl' installed.
     """
-    try:
-        # mode="elements" keeps the structure better for tables
-        loader = UnstructuredExcelLoader(path, mode="elements")
-        return loader.load()
-    except Exception as e:
-        print(f"Error loading Excel {path}: {e}")
-        return []
+    from langchain_community.document_loaders import UnstructuredExcelLoader
+    # mode="elements" keeps the structure better for tables
+    loader = UnstructuredExcelLoader(path, mode="elements")
+    return loader.load()
 
 # === HTML Loader ===
 def load_html(path):
@@ -44,12 +31,9 @@ def load_html(path):
     Loads HTML files using BeautifulSoup to extract just the text.
     Note: Requires 'beautifulsoup4' installed.
     """
-    try:
-        loader = BSHTMLLoader(path, open_encoding="utf-8")
-        return loader.load()
-    except Exception as e:
-        print(f"Error loading HTML {path}: {e}")
-        return []
+    from langchain_community.document_loaders import BSHTMLLoader
+    loader = BSHTMLLoader(path, open_encoding="utf-8")
+    return loader.load()
 
 # === Markdown Loader ===
 def load_markdown(path):
@@ -57,94 +41,198 @@ def load_markdown(path):
     Loads Markdown files. 
     Note: Requires 'unstructured' installed.
     """
-    try:
-        loader = UnstructuredMarkdownLoader(path)
-        return loader.load()
-    except Exception as e:
-        print(f"Error loading Markdown {path}: {e}")
-        return []
+    from langchain_community.document_loaders import UnstructuredMarkdownLoader
+    loader = UnstructuredMarkdownLoader(path)
+    return loader.load()
     
 # === PDF Loader ===
 def load_pdf(path):
     """Uses LangChain's PyMuPDFLoader to load PDF content."""
-    try:
-        loader = PyMuPDFLoader(path)
-        return loader.load()
-    except Exception as e:
-        print(f"Error loading PDF {path}: {e}")
-        return []
+    from langchain_community.document_loaders import PyMuPDFLoader
+    loader = PyMuPDFLoader(path)
+    return loader.load()
 
 # === DOCX Loader ===
 def load_docx(path):
     """Loads text from a .docx file using python-docx."""
-    try:
-        doc = DocxDocument(path)
-        # Extract text from paragraphs, ignoring empty lines
-        paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
-        content = "\n".join(paragraphs)
-        return [Document(page_content=content, metadata={"source": path})]
-    except Exception as e:
-        print(f"Error loading DOCX {path}: {e}")
-        return []
+    from docx import Document as DocxDocument  # Requires: pip install python-docx
+    doc = DocxDocument(path)
+    # Extract text from paragraphs, ignoring empty lines
+    paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
+    content = "\n".join(paragraphs)
+    return [Document(page_content=content, metadata={"source": path})]
 
 # === PPTX Loader ===
 def load_pptx(path):
     """Loads text from a .pptx file, organized by slide."""
-    try:
-        prs = Presentation(path)
-        slides_text = []
-
-        for slide_num, slide in enumerate(prs.slides, start=1):
-            slide_content = []
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    slide_content.append(shape.text)
-            
-            # Only add the slide if it contains text
-            if slide_content:
-                full_text = "\n".join(slide_content)
-                slides_text.append(
-                    Document(page_content=full_text, metadata={"source": path, "slide": slide_num})
-                )
-        return slides_text
-    except Exception as e:
-        print(f"Error loading PPTX {path}: {e}")
-        return []
+    from pptx import Presentation  # Requires: pip install python-pptx
+    prs = Presentation(path)
+    slides_text = []
+
+    for slide_num, slide in enumerate(prs.slides, start=1):
+        slide_content = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text.strip():
+                slide_content.append(shape.text)
+        
+        # Only add the slide if it contains text
+        if slide_content:
+            full_text = "\n".join(slide_content)
+            slides_text.append(
+                Document(page_content=full_text, metadata={"source": path, "slide": slide_num})
+            )
+    return slides_text
 
 # === TXT Loader ===
 def load_txt(path):
     """Loads text from a standard .txt file."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        content = f.read()
+    return [Document(page_content=content, metadata={"source": path})]
+
+# Extension -> loader. Registering a format costs nothing until a file of that type shows up.
+LOADERS = {
+    # Standard Documents
+    ".pdf": load_pdf,
+    ".docx": load_docx, ".doc": load_docx,
+    ".pptx": load_pptx, ".ppt": load_pptx,
+    ".txt": load_txt,
+    # New Formats
+    ".csv": load_csv,
+    ".xlsx": load_excel, ".xls": load_excel,
+    ".html": load_html, ".htm": load_html,
+    ".md": load_markdown,
+}
+
+def _load_failed(file_path, error, strict):
+    """Loader errors: raised for ingestion (strict), which must not replace a file's points with
+    nothing; otherwise reported and the file is treated as empty."""
+    if strict:
+        raise error
+    ext = os.path.splitext(file_path)[1]
+    print(f"Error loading {ext.upper().lstrip('.')} {file_path}: {error}")
+
+def load_any_file(file_path, strict=False):
+    """Factory function to pick the correct loader based on extension."""
+    ext = os.path.splitext(file_path)[1].lower()
+    loader = LOADERS.get(ext)
+    if loader is None:
+        print(f"⚠️ Unsupported file type: {ext}")
+        return []
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
-        return [Document(page_content=content, metadata={"source": path})]
+        return loader(file_path)
     except Exception as e:
-        print(f"Error loading TXT {path}: {e}")
+        _load_failed(file_path, e, strict)
         return []
-def load_any_file(file_path):
-    """Factory function to pick the correct loader based on extension."""
+
+
+# =========================================================================
+#  LAZY LOADING (one page / slide / row at a time)
+# =========================================================================
+
+def parse_page_range(spec):
+    """'10-20' -> (10, 20), '5' -> (5, 5), '7-' -> (7, None). 1-based and inclusive, like a print dialog."""
+    if not spec:
+        return None
+    first, _, last = str(spec).partition("-")
+    first = int(first) if first.strip() else 1
+    if not _:
+        return (first, first)
+    return (first, int(last) if last.strip() else None)
+
+def _in_range(number, pages):
+    return pages is None or (number >= pages[0] and (pages[1] is None or number <= pages[1]))
+
+def iter_pdf(path, pages=None):
+    """
+    Yields one Document per PDF page (same metadata as load_pdf: 0-based `page`).
+    Only the requested pages are opened; pages without fonts (scans, full-page
+    figures) are skipped before any text is extracted.
+    """
+    import pymupdf
+    with pymupdf.open(path) as pdf:
+        total = pdf.page_count
+        first = (pages[0] if pages else 1) - 1
+        last = min(total, pages[1] or total) if pages else total
+        for index in range(max(0, first), last):
+            page = pdf.load_page(index)
+            if not page.get_fonts():
+                continue  # Image-only page: nothing to extract without OCR
+            text = page.get_text()
+            if text.strip():
+                yield Document(page_content=text, metadata={
+                    "source": path, "file_path": path, "page": index, "total_pages": total,
+                })
+
+def iter_pptx(path, pages=None):
+    """Yields one Document per slide that has text. `pages` selects slides (1-based)."""
+    from pptx import Presentation
+    prs = Presentation(path)
+    for slide_num, slide in enumerate(prs.slides, start=1):
+        if not _in_range(slide_num, pages):
+            continue
+        slide_content = [shape.text for shape in slide.shapes if hasattr(shape, "text") and shape.text.strip()]
+        if slide_content:
+            yield Document(page_content="\n".join(slide_content), metadata={"source": path, "slide": slide_num})
+
+def iter_csv(path):
+    """Yields one Document per row, read from disk as it goes."""
+    from langchain_community.document_loaders import CSVLoader
+    loader = CSVLoader(file_path=path, encoding="utf-8", csv_args={'delimiter': ','})
+    yield from loader.lazy_load()
+
+def iter_excel(path):
+    """
+    Yields one Document per .xlsx row ("header: value" lines, like the CSV loader), streamed
+    with openpyxl's read-only mode. Old .xls files have no streaming reader and go through load_excel.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        load_workbook = None
+    if load_workbook is None or path.lower().endswith(".xls"):
+        yield from load_excel(path)
+        return
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            header = None
+            for row_num, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                values = ["" if value is None else str(value).strip() for value in row]
+                if not any(values):
+                    continue
+                if header is None:
+                    header = [v or f"column {i + 1}" for i, v in enumerate(values)]
+                    continue
+                lines = [f"{name}: {value}" for name, value in zip(header, values) if value]
+                yield Document(page_content="\n".join(lines),
+                               metadata={"source": path, "sheet": sheet.title, "row": row_num})
+    finally:
+        workbook.close()
+
+# Formats with a streaming reader; everything else is one Document anyway (see LOADERS)
+STREAMING_LOADERS = {
+    ".pdf": iter_pdf,
+    ".pptx": iter_pptx, ".ppt": iter_pptx,
+    ".csv": iter_csv,
+    ".xlsx": iter_excel, ".xls": iter_excel,
+}
+PAGED_LOADERS = {iter_pdf, iter_pptx}  # Accept a `pages` range
+
+def iter_any_file(file_path, pages=None, strict=False):
+    """
+    Streaming load_any_file: yields Documents one page / slide / row at a time, so memory
+    stays bounded by a page, not the file. `pages` = (first, last) 1-based, inclusive
+    (last may be None), applies to PDFs and slide decks. Formats that are one Document
+    anyway (DOCX, TXT, HTML, Markdown) come from the regular loaders. With `strict`, loader
+    errors are raised (possibly after some Documents were yielded) instead of ending the stream.
+    """
     ext = os.path.splitext(file_path)[1].lower()
-    
-    # Standard Documents
-    if ext == ".pdf":
-        return load_pdf(file_path)
-    elif ext in [".docx", ".doc"]:
-        return load_docx(file_path)
-    elif ext in [".pptx", ".ppt"]:
-        return load_pptx(file_path)
-    elif ext == ".txt":
-        return load_txt(file_path)
-        
-    # New Formats
-    elif ext == ".csv":
-        return load_csv(file_path)
-    elif ext in [".xlsx", ".xls"]:
-        return load_excel(file_path)
-    elif ext in [".html", ".htm"]:
-        return load_html(file_path)
-    elif ext == ".md":
-        return load_markdown(file_path)
-        
-    else:
-        print(f"⚠️ Unsupported file type: {ext}")
-        return []
\ No newline at end of file
+    stream = STREAMING_LOADERS.get(ext)
+    if stream is None:
+        yield from load_any_file(file_path, strict)
+        return
+    try:
+        yield from stream(file_path, pages) if stream in PAGED_LOADERS else stream(file_path)
+    except Exception as e:
+        _load_failed(file_path, e, strict)
@@ -1,21 +1,344 @@
 import os
 import sys
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_ollama import OllamaEmbeddings
-from langchain_qdrant import QdrantVectorStore
+from backend_pool import PooledOllamaEmbeddings, model_digest
+from qdrant_client import models
+from chunking import chunk_documents
+from vectordb import get_client, is_embedded, collection_params, update_params, KB_QUANTIZATION, KB_ON_DISK, KB_HNSW_M
+from dedup import (
+    DEDUP_ENABLED, Deduplicator, DocumentIndex, DocumentSignature, merge_sources, shingles, jaccard,
+    strip_boilerplate, signature_hex, signature_from_hex,
+)
+from kb_manifest import (
+    bump_collection_version, set_ingest_progress, set_embedding_identity,
+    get_indexed_files, record_file, forget_file, reset_files, category_of,
+)
 
 # Try to import your loader, or fail gracefully
 try:
-    from document_loader import load_any_file
+    from document_loader import iter_any_file
 except ImportError:
     print("❌ Error: missing 'document_loaders.py'")
     sys.exit(1)
 
 # --- CONFIGURATION ---
 DOCS_FOLDER = "./data"
-QDRANT_URL = "http://localhost:6333" 
 COLLECTION_NAME = "study_knowledge_base"
 EMBED_MODEL = "nomic-embed-text:v1.5"
+EMBED_BATCH_SIZE = 256  # Chunks embedded per request (progress is reported per batch)
+LOAD_WINDOW_CHARS = 256_000  # Loaded text held at once while chunking a file (~64 PDF pages)
+# Keyword indexes for filtered search (category/source scopes) and incremental sync/dedup lookups
+PAYLOAD_INDEXES = ("metadata.category", "metadata.source", "metadata.sources",
+                   "metadata.content_hash", "metadata.lsh_bands")
+QdrantVectorStore = None  # langchain_qdrant, imported when the collection is opened
+
+def list_data_files(folder=None):
+    """Every indexable file under ./data, as the same paths the loaders store in metadata.source."""
+    folder = folder or DOCS_FOLDER
+    return [
+        os.path.join(root, file_name)
+        for root, dirs, files in os.walk(folder)
+        for file_name in files if not file_name.startswith(".")
+    ]
+
+def file_signature(file_path):
+    """Cheap change detection: (mtime, size). Returns None if the file is gone."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+def iter_windows(file_path, pages=None):
+    """
+    Streams one file through the loader about LOAD_WINDOW_CHARS at a time, as lists of
+    tagged Documents, so a 1,000-page PDF or a huge spreadsheet never sits in memory whole.
+    `pages` = (first, last) limits PDFs and slide decks. Raises on loader errors, so a
+    corrupt or half-written file never replaces its indexed points with nothing.
+    """
+    cat = category_of(file_path)
+    window, size = [], 0
+    for doc in iter_any_file(file_path, pages, strict=True):
+        # Tag with folder name
+        doc.metadata["category"] = cat
+        doc.metadata["source"] = file_path
+        window.append(doc)
+        size += len(doc.page_content)
+        if size >= LOAD_WINDOW_CHARS:
+            yield _clean_window(window, file_path)
+            window, size = [], 0
+    if window:
+        yield _clean_window(window, file_path)
+
+def _clean_window(docs, file_path):
+    if DEDUP_ENABLED and file_path.lower().endswith(".pdf"):
+        docs = strip_boilerplate(docs)  # Headers/footers repeat within any window of pages too
+    return docs
+
+def iter_chunks(file_path, pages=None, signature=None):
+    """
+    Chunks of one file (by format), streamed window by window. Raises on loader errors.
+    A DocumentSignature passed as `signature` is fed the same text on the way.
+    """
+    for window in iter_windows(file_path, pages):
+        if signature is not None:
+            signature.update("\n".join(doc.page_content for doc in window))
+        yield from chunk_documents(window, file_path)
+
+def known_documents(exclude=()):
+    """DocumentIndex of the files already in the collection, except `exclude` (being replaced)."""
+    documents = DocumentIndex()
+    for path, info in get_indexed_files().items():
+        if path not in exclude and info.get("doc_minhash") and info.get("doc_words"):
+            documents.add(path, signature_from_hex(info["doc_minhash"]), info["doc_words"])
+    return documents
+
+def iter_batches(chunks, size=EMBED_BATCH_SIZE):
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def get_vector_store(embedding_model, recreate=False):
+    """Opens the collection, creating it (sized from the embedding model) when missing."""
+    global QdrantVectorStore
+    if QdrantVectorStore is None:
+        from langchain_qdrant import QdrantVectorStore
+    client = get_client()
+    if recreate and client.collection_exists(COLLECTION_NAME):
+        client.delete_collection(COLLECTION_NAME)
+    if not client.collection_exists(COLLECTION_NAME):
+        dim = len(embedding_model.embed_query("dimension probe"))
+        # Quantization / on-disk / HNSW layout comes from the KB_* settings in vectordb.py
+        client.create_collection(collection_name=COLLECTION_NAME, **collection_params(dim))
+        # Vectors are only comparable with the model that made them (checked by kb_snapshot restore)
+        set_embedding_identity(model=EMBED_MODEL, dim=dim, digest=model_digest(EMBED_MODEL))
+    ensure_payload_indexes(client)
+    return QdrantVectorStore(client=client, collection_name=COLLECTION_NAME, embedding=embedding_model)
+
+def ensure_payload_indexes(client):
+    """Without these, every filtered search or delete scans all payloads."""
+    if is_embedded():
+        return  # Local mode always scans (and warns that indexes have no effect)
+    existing = client.get_collection(COLLECTION_NAME).payload_schema or {}
+    for field in PAYLOAD_INDEXES:
+        if field not in existing:
+            client.create_payload_index(
+                collection_name=COLLECTION_NAME, field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+
+def source_filter(file_path):
+    """Points that came from `file_path`, either alone or as one of several merged duplicates."""
+    return models.Filter(should=[
+        models.FieldCondition(key="metadata.source", match=models.MatchValue(value=file_path)),
+        models.FieldCondition(key="metadata.sources", match=models.MatchValue(value=file_path)),
+    ])
+
+def scroll_points(vector_store, query_filter):
+    client = vector_store.client
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=COLLECTION_NAME, scroll_filter=query_filter,
+            limit=256, offset=offset, with_payload=True, with_vectors=False,
+        )
+        yield from points
+        if offset is None:
+            break
+
+def delete_file_chunks(vector_store, file_path):
+    """
+    Removes `file_path` from the collection. Points it shared with other files (deduplicated
+    chunks) are kept and only lose this source. Returns the number of points deleted.
+    """
+    client = vector_store.client
+    orphaned = []
+    for point in list(scroll_points(vector_store, source_filter(file_path))):
+        metadata = point.payload.get("metadata") or {}
+        sources = [s for s in metadata.get("sources") or [metadata.get("source")] if s and s != file_path]
+        if not sources:
+            orphaned.append(point.id)
+            continue
+        metadata.update(sources=sources, source=sources[0], category=category_of(sources[0]))
+        client.set_payload(collection_name=COLLECTION_NAME, payload={"metadata": metadata}, points=[point.id])
+    if orphaned:
+        client.delete(collection_name=COLLECTION_NAME, points_selector=models.PointIdsList(points=orphaned))
+    return len(orphaned)
+
+def merge_into_collection(vector_store, chunks, dedup):
+    """
+    Incremental dedup: chunks that duplicate a point already stored only add their source
+    to it. Returns the chunks that still need embedding.
+    """
+    if not chunks:
+        return chunks
+    hashes = sorted({c.metadata["content_hash"] for c in chunks})
+    bands = sorted({key for c in chunks for key in c.metadata["lsh_bands"]})
+    existing = list(scroll_points(vector_store, models.Filter(should=[
+        models.FieldCondition(key="metadata.content_hash", match=models.MatchAny(any=hashes)),
+        models.FieldCondition(key="metadata.lsh_bands", match=models.MatchAny(any=bands)),
+    ])))
+    if not existing:
+        return chunks
+
+    by_hash = {p.payload["metadata"].get("content_hash"): p for p in existing}
+    existing_shingles = {p.id: shingles(p.payload.get("page_content", "")) for p in existing}
+    new_chunks = []
+    for chunk in chunks:
+        match = by_hash.get(chunk.metadata["content_hash"])
+        if match is not None:
+            dedup.exact += 1
+        else:
+            chunk_shingles = shingles(chunk.page_content)
+            chunk_bands = set(chunk.metadata["lsh_bands"])
+            match = next((p for p in existing
+                          if chunk_bands & set(p.payload["metadata"].get("lsh_bands") or [])
+                          and jaccard(chunk_shingles, existing_shingles[p.id]) >= dedup.threshold), None)
+            if match is None:
+                new_chunks.append(chunk)
+                continue
+            dedup.near += 1
+        metadata = match.payload["metadata"]
+        if merge_sources(metadata, chunk.metadata):
+            vector_store.client.set_payload(collection_name=COLLECTION_NAME, payload={"metadata": metadata}, points=[match.id])
+    return new_chunks
+
+def add_chunks(vector_store, chunks, on_batch=None):
+    for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+        vector_store.add_documents(chunks[start:start + EMBED_BATCH_SIZE])
+        if on_batch:
+            on_batch(min(start + EMBED_BATCH_SIZE, len(chunks)))
+
+def link_duplicate(vector_store, file_path, canonical):
+    """Makes `file_path` a source of every point of `canonical` (the same document, another format)."""
+    for point in list(scroll_points(vector_store, source_filter(canonical))):
+        metadata = point.payload.get("metadata") or {}
+        if merge_sources(metadata, {"sources": [file_path]}):
+            vector_store.client.set_payload(collection_name=COLLECTION_NAME, payload={"metadata": metadata}, points=[point.id])
+
+def index_files(vector_store, file_paths, dedup=None, on_batch=None, on_file=None, documents=None):
+    """
+    Streams files into the collection in EMBED_BATCH_SIZE batches that span file boundaries:
+    only one batch is in memory, whatever the file or corpus size. Duplicates within a batch
+    are merged by `dedup`, duplicates of stored points by merge_into_collection. With a
+    DocumentIndex (`documents`), each file's whole-text signature is taken while it is chunked;
+    a file that turns out near-identical to an indexed one gives its points back and only
+    becomes a source of that file's points. A file whose loader fails is reported and its
+    stored chunks are removed.
+    Returns ({file path: manifest info (chunks, doc_minhash, doc_words, duplicate_of)} for every
+    file loaded, chunks stored).
+    """
+    loaded, failed, duplicates = {}, [], {}
+
+    def chunks():
+        for i, file_path in enumerate(file_paths, start=1):
+            info = {"chunks": 0}
+            signature = DocumentSignature() if documents is not None else None
+            try:
+                for chunk in iter_chunks(file_path, signature=signature):
+                    info["chunks"] += 1
+                    yield chunk
+                if signature is not None and signature.minhash is not None:
+                    info.update(doc_minhash=signature_hex(signature.minhash), doc_words=signature.words)
+                    canonical = documents.find(signature.minhash, signature.words)
+                    if canonical is None:
+                        documents.add(file_path, signature.minhash, signature.words)
+                    else:
+                        info.update(chunks=0, duplicate_of=canonical)
+                        duplicates[file_path] = canonical
+                        if dedup is not None:
+                            dedup.documents += 1
+                loaded[file_path] = info
+            except Exception as e:
+                print(f"    Error {os.path.basename(file_path)}: {e}")
+                failed.append(file_path)
+            if on_file:
+                on_file(i, file_path, info)
+
+    stored = 0
+    for batch in iter_batches(chunks()):
+        if dedup is not None:
+            batch = merge_into_collection(vector_store, [c for c in batch if dedup.add(c)], dedup)
+            dedup.forget()
+        add_chunks(vector_store, batch)
+        stored += len(batch)
+        if on_batch:
+            on_batch(stored)
+    # After the last batch: a file's chunks (and its canonical's) may have been in it
+    for file_path in failed + list(duplicates):
+        stored -= delete_file_chunks(vector_store, file_path)
+    for file_path, canonical in duplicates.items():
+        link_duplicate(vector_store, file_path, canonical)
+        print(f"   🔗 {os.path.basename(file_path)} is the same document as {os.path.basename(canonical)}")
+    return loaded, stored
+
+def sync_files(changed=(), removed=(), vector_store=None, on_file=None, on_batch=None):
+    """
+    Incremental update: re-indexes `changed` files and drops `removed` ones, touching only
+    their points. Bumps the collection version once if anything changed. `on_file` and
+    `on_batch` report progress as in index_files.
+    Returns (files indexed, files removed).
+    """
+    if not changed and not removed:
+        return 0, 0
+    vector_store = vector_store or get_vector_store(PooledOllamaEmbeddings(model=EMBED_MODEL))
+    indexed = dropped = 0
+
+    # Read first: a file that fails to load keeps its previous points. This pass only parses
+    # (one page at a time); the file is read again below while its chunks are embedded.
+    ready = {}
+    for file_path in changed:
+        signature = file_signature(file_path)
+        if signature is None:   # Deleted again before we got to it
+            removed = list(removed) + [file_path]
+            continue
+        try:
+            for _ in iter_any_file(file_path, strict=True):
+                pass
+            ready[file_path] = signature
+        except Exception as e:
+            print(f"    Error {os.path.basename(file_path)}: {e}")
+
+    # Replace the old versions of these files, not the whole collection
+    for file_path in list(removed) + list(ready):
+        delete_file_chunks(vector_store, file_path)
+    for file_path in removed:
+        forget_file(file_path)
+        dropped += 1
+        print(f"   🗑️ Removed: {file_path}")
+
+    dedup = Deduplicator() if DEDUP_ENABLED else None
+    documents = known_documents(exclude=set(ready) | set(removed)) if DEDUP_ENABLED else None
+    loaded, _ = index_files(vector_store, list(ready), dedup, on_batch=on_batch, on_file=on_file, documents=documents)
+    for file_path, info in loaded.items():
+        record_file(file_path, **info, **ready[file_path])
+        indexed += 1
+        print(f"   ✅ Indexed: {file_path} ({info['chunks']} chunks)")
+    if dedup is not None and loaded:
+        print(f"   {dedup.report(sum(info['chunks'] for info in loaded.values()))}")
+
+    if not indexed and not dropped:
+        return 0, 0   # Every changed file failed to load: nothing to invalidate
+    version = bump_collection_version()
+    print(f"🔄 Knowledge base updated to v{version} (+{indexed} / -{dropped} files)")
+    return indexed, dropped
+
+def find_changes(folder=None):
+    """Compares ./data against the manifest. Returns (new or modified files, deleted files)."""
+    indexed = get_indexed_files()
+    on_disk = {path: file_signature(path) for path in list_data_files(folder)}
+    changed = [
+        path for path, sig in on_disk.items()
+        if sig and (path not in indexed
+                    or indexed[path].get("mtime") != sig["mtime"]
+                    or indexed[path].get("size") != sig["size"])
+    ]
+    removed = [path for path in indexed if path not in on_disk]
+    return changed, removed
 
 def ingest_documents():
     if not os.path.exists(DOCS_FOLDER):
@@ -23,45 +346,54 @@ def ingest_documents():
         print(f"Please put files in {DOCS_FOLDER}")
         return
 
-    all_docs = []
     print(f" Scanning {DOCS_FOLDER}...")
+    file_paths = list_data_files()
+    # Taken before loading: a file edited meanwhile no longer matches and the next sync redoes it
+    before = {path: file_signature(path) or {} for path in file_paths}
+    set_ingest_progress(state="embedding", files_done=0, files_total=len(file_paths), chunks_done=0, chunks_total=0)
+    # Each batch is sharded across the embedding servers in OLLAMA_HOSTS
+    embedding_model = PooledOllamaEmbeddings(model=EMBED_MODEL)
 
-    for root, dirs, files in os.walk(DOCS_FOLDER):
-        for file_name in files:
-            if file_name.startswith("."): continue
-            file_path = os.path.join(root, file_name)
-            
-            try:
-                docs = load_any_file(file_path)
-                if docs:
-                    # Tag with folder name
-                    cat = os.path.basename(root)
-                    for d in docs: d.metadata["category"] = cat
-                    all_docs.extend(docs)
-                    print(f"   ✅ Loaded: {file_name}")
-            except Exception as e:
-                print(f"    Error {file_name}: {e}")
+    # Full rebuild: fresh collection, fresh per-file manifest. Files are streamed in
+    # EMBED_BATCH_SIZE batches, so memory doesn't grow with the corpus.
+    vector_store = get_vector_store(embedding_model, recreate=True)
+    dedup = Deduplicator() if DEDUP_ENABLED else None
 
-    if not all_docs:
-        print("No documents found.")
-        return
+    def file_done(i, file_path, info):
+        if info["chunks"]:
+            print(f"   ✅ Indexed: {os.path.basename(file_path)} ({info['chunks']} chunks)")
+        set_ingest_progress(files_done=i)
 
-    print(f"\n  Splitting {len(all_docs)} docs...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = text_splitter.split_documents(all_docs)
+    loaded, stored = index_files(vector_store, file_paths, dedup, on_file=file_done,
+                                 on_batch=lambda n: set_ingest_progress(chunks_done=n),
+                                 documents=DocumentIndex() if DEDUP_ENABLED else None)
+    signatures = {path: dict(before[path], **info) for path, info in loaded.items()}
+    total = sum(info["chunks"] for info in loaded.values())
 
-    print(f"\n🧠 Saving to Qdrant (Docker)...")
-    embedding_model = OllamaEmbeddings(model=EMBED_MODEL)
+    reset_files(signatures)
+    set_ingest_progress(state="done")
+    if not total:
+        print("No documents found.")
+        return
+    if dedup is not None:
+        print(f"\n{dedup.report(total)}")
 
-    QdrantVectorStore.from_documents(
-        documents=chunks,
-        embedding=embedding_model,
-        url=QDRANT_URL,
-        collection_name=COLLECTION_NAME,
-        force_recreate=True 
-    )
+    # New collection contents -> invalidate cached RAG answers
+    version = bump_collection_version()
+    print(f"🎉 Ingestion Complete! {stored} chunks saved (knowledge base v{version})")
 
-    print("🎉 Ingestion Complete!")
+def reconfigure():
+    """Applies the current KB_* index settings to the existing collection without re-embedding."""
+    client = get_client()
+    if not client.collection_exists(COLLECTION_NAME):
+        print(f"❌ Collection '{COLLECTION_NAME}' does not exist yet. Run `python ingest.py` first.")
+        return
+    client.update_collection(collection_name=COLLECTION_NAME, **update_params())
+    print(f"✅ Reconfigured '{COLLECTION_NAME}': quantization={KB_QUANTIZATION}, on_disk={KB_ON_DISK}, "
+          f"hnsw_m={KB_HNSW_M} (Qdrant re-optimizes in the background)")
 
 if __name__ == "__main__":
-    ingest_documents()
\ No newline at end of file
+    if "--reconfigure" in sys.argv:
+        reconfigure()
+    else:
+        ingest_documents()
@@ -0,0 +1,105 @@
+import copy
+import json
+import os
+import time
+
+# --- CONFIGURATION ---
+MANIFEST_PATH = os.getenv("KB_MANIFEST_PATH", "kb_manifest.json")
+
+_cached = {"mtime": None, "data": None}
+
+
+def load_manifest():
+    """Returns the knowledge-base manifest ({"version": int, "updated": float, ...})."""
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return {"version": 0, "updated": None}
+
+    # Re-read only when the file changed (the agent checks the version on every request)
+    if _cached["mtime"] != mtime:
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                _cached["data"] = json.load(f)
+            _cached["mtime"] = mtime
+        except (OSError, ValueError):
+            return {"version": 0, "updated": None}
+    return copy.deepcopy(_cached["data"])
+
+
+def save_manifest(manifest):
+    """Atomic write so readers in other processes never see a half-written file."""
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def get_collection_version():
+    return load_manifest().get("version", 0)
+
+
+def bump_collection_version():
+    """Called after every change to the knowledge base so downstream caches invalidate."""
+    manifest = load_manifest()
+    manifest["version"] = manifest.get("version", 0) + 1
+    manifest["updated"] = time.time()
+    save_manifest(manifest)
+    return manifest["version"]
+
+
+def set_ingest_progress(**fields):
+    """Records ingestion progress (state, files_done, files_total, chunks...) for /health and the UI."""
+    manifest = load_manifest()
+    progress = manifest.get("ingest") or {}
+    progress.update(fields, updated=time.time())
+    manifest["ingest"] = progress
+    save_manifest(manifest)
+
+
+def get_ingest_progress():
+    return load_manifest().get("ingest")
+
+
+def get_indexed_files():
+    """{source path: {"mtime", "size", "chunks"}} for every file currently in the collection."""
+    return load_manifest().get("files") or {}
+
+
+def record_file(file_path, **info):
+    manifest = load_manifest()
+    manifest.setdefault("files", {})[file_path] = info
+    save_manifest(manifest)
+
+
+def forget_file(file_path):
+    manifest = load_manifest()
+    if (manifest.get("files") or {}).pop(file_path, None) is not None:
+        save_manifest(manifest)
+
+
+def reset_files(files):
+    """Replaces the per-file index after a full rebuild."""
+    manifest = load_manifest()
+    manifest["files"] = files
+    save_manifest(manifest)
+
+
+def get_embedding_identity():
+    """{"model", "dim", "digest"} of the embedding model that built the collection (None if unknown)."""
+    return load_manifest().get("embedding")
+
+
+def set_embedding_identity(**identity):
+    manifest = load_manifest()
+    manifest["embedding"] = identity
+    save_manifest(manifest)
+
+
+def category_of(file_path):
+    """Documents are tagged with the name of the folder they live in (./data/<category>/...)."""
+    return os.path.basename(os.path.dirname(file_path))
+
+
+def get_categories():
+    return sorted({category_of(path) for path in get_indexed_files()} - {""})
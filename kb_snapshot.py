@@ -0,0 +1,298 @@
+"""
+Snapshot / restore of the vector collections, so a fresh machine (or a wiped Qdrant) starts
+with a ready knowledge base instead of re-embedding every document.
+
+    python kb_snapshot.py snapshot                      # -> snapshots/kb-<timestamp>.kbsnap
+    python kb_snapshot.py restore snapshots/kb-....kbsnap
+    python kb_snapshot.py info snapshots/kb-....kbsnap
+
+A snapshot is a zip file (works with both VECTOR_BACKEND=server and embedded):
+    meta.json                   format, embedding model identity, collections (size, distance, count, batches)
+    manifest.json               kb_manifest.json (indexed files, so `ingest`/`watcher` resume incrementally)
+    file_hashes.json            content hash per indexed file (re-stamps copies of unchanged files on restore)
+    <collection>/<n>.f32        one scroll batch of raw float32 vectors
+    <collection>/<n>.jsonl      {"id", "payload"} of the same points, in the same order
+
+Vectors only make sense to the model that produced them, so a restore is refused when the
+configured EMBED_MODEL (or, if Ollama is reachable, its digest) differs from the snapshot's.
+A restore checks every member (CRC, batch sizes, point counts) before it replaces anything.
+With the embedded backend, stop the server first (the storage is locked by one process).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+from qdrant_client import models
+
+from backend_pool import model_digest
+from ingest import COLLECTION_NAME, EMBED_MODEL, ensure_payload_indexes, file_signature
+from kb_manifest import load_manifest, save_manifest, get_embedding_identity
+from vectordb import get_client, is_embedded, collection_params, VECTOR_BACKEND
+
+# --- CONFIGURATION ---
+SNAPSHOT_DIR = "./snapshots"
+SNAPSHOT_FORMAT = 1
+MEMORY_COLLECTION = "user_long_term_memory"  # Mem0's long-term memory (see agent._init_memory)
+COLLECTIONS = (COLLECTION_NAME, MEMORY_COLLECTION)
+BATCH_SIZE = 1024
+INDEXING_THRESHOLD = 20000  # Qdrant's default, restored after the bulk load
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_identity():
+    """The embedding model this install would embed queries with."""
+    return {"model": EMBED_MODEL, "digest": model_digest(EMBED_MODEL)}
+
+
+def check_identity(snapshot_identity, current):
+    """Raises SnapshotError if vectors from `snapshot_identity` can't be searched with `current`."""
+    if not snapshot_identity:
+        raise SnapshotError("Snapshot has no embedding model identity.")
+    if snapshot_identity.get("model") != current["model"]:
+        raise SnapshotError(f"Snapshot was embedded with '{snapshot_identity.get('model')}', "
+                            f"this install uses '{current['model']}'. Re-ingest instead.")
+    if snapshot_identity.get("digest") and current.get("digest") and snapshot_identity["digest"] != current["digest"]:
+        raise SnapshotError(f"'{current['model']}' has a different digest here "
+                            f"({current['digest'][:19]} vs {snapshot_identity['digest'][:19]}): "
+                            f"the model was updated since the snapshot. Re-ingest instead.")
+
+
+# =========================================================================
+#  SNAPSHOT
+# =========================================================================
+
+def _vector_config(client, name):
+    vectors = client.get_collection(name).config.params.vectors
+    if isinstance(vectors, dict):
+        raise SnapshotError(f"Collection '{name}' uses named vectors, which snapshots don't support.")
+    return {"size": vectors.size, "distance": vectors.distance.value if hasattr(vectors.distance, "value") else str(vectors.distance)}
+
+
+def _export_collection(client, zf, name):
+    config = _vector_config(client, name)
+    count, batches, offset = 0, 0, None
+    while True:
+        points, offset = client.scroll(collection_name=name, limit=BATCH_SIZE, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        if points:
+            vectors = np.asarray([p.vector for p in points], dtype=np.float32)
+            if vectors.shape[1] != config["size"]:
+                raise SnapshotError(f"Unexpected vector size in '{name}'.")
+            # Float vectors barely compress: stored as is, payload JSON is deflated
+            zf.writestr(f"{name}/{batches:05d}.f32", vectors.tobytes(), compress_type=zipfile.ZIP_STORED)
+            zf.writestr(f"{name}/{batches:05d}.jsonl",
+                        "".join(json.dumps({"id": p.id, "payload": p.payload}) + "\n" for p in points))
+            count += len(points)
+            batches += 1
+        if offset is None:
+            break
+    return {**config, "count": count, "batches": batches}
+
+
+def _write_snapshot(client, path, manifest, identity):
+    collections = {}
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for name in COLLECTIONS:
+            if not client.collection_exists(name):
+                continue
+            collections[name] = _export_collection(client, zf, name)
+            print(f"   ✅ {name}: {collections[name]['count']} points")
+        if not collections:
+            raise SnapshotError("Nothing to snapshot: no collections exist yet. Run `python ingest.py` first.")
+        if COLLECTION_NAME in collections and not identity.get("dim"):
+            identity["dim"] = collections[COLLECTION_NAME]["size"]
+
+        files = manifest.get("files") or {}
+        hashes = {p: file_hash(p) for p in files if os.path.exists(p)}
+        manifest = {k: v for k, v in manifest.items() if k != "ingest"}
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+        zf.writestr("file_hashes.json", json.dumps(hashes))
+        zf.writestr("meta.json", json.dumps({
+            "format": SNAPSHOT_FORMAT, "created": time.time(), "embedding": identity,
+            "collections": collections, "kb_version": manifest.get("version", 0),
+        }, indent=2))
+    return collections
+
+
+def snapshot(path=None):
+    """Writes every existing collection plus the ingest manifest to `path`. Returns the path."""
+    client = get_client()
+    manifest = load_manifest()
+    identity = get_embedding_identity()
+    if identity is None:
+        # Collections built before identities were recorded: this install's model built them
+        identity = dict(current_identity(), dim=None)
+    path = path or os.path.join(SNAPSHOT_DIR, f"kb-{time.strftime('%Y%m%d-%H%M%S')}.kbsnap")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    started = time.perf_counter()
+    print(f"📸 Snapshotting Qdrant ({VECTOR_BACKEND}) to {path}...")
+    tmp_path = path + ".tmp"
+    try:
+        _write_snapshot(client, tmp_path, manifest, identity)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    size_mb = os.path.getsize(path) / 2 ** 20
+    print(f"🎉 Snapshot written: {path} ({size_mb:.1f} MB, {time.perf_counter() - started:.1f}s)")
+    return path
+
+
+# =========================================================================
+#  RESTORE
+# =========================================================================
+
+def read_meta(path):
+    try:
+        with zipfile.ZipFile(path) as zf:
+            meta = json.loads(zf.read("meta.json"))
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise SnapshotError(f"Not a readable snapshot: {e}")
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {meta.get('format')} (expected {SNAPSHOT_FORMAT}).")
+    return meta
+
+
+def verify_snapshot(zf, meta):
+    """
+    Raises SnapshotError unless every batch of every collection is present, intact (CRC) and
+    the expected size. Runs before restore deletes anything, so a truncated or corrupt
+    snapshot leaves the current collections untouched.
+    """
+    bad = zf.testzip()
+    if bad is not None:
+        raise SnapshotError(f"Snapshot is corrupt: '{bad}' fails its checksum.")
+    members = {entry.filename: entry for entry in zf.infolist()}
+    for name in ("manifest.json", "file_hashes.json"):
+        if name not in members:
+            raise SnapshotError(f"Snapshot is incomplete: '{name}' is missing.")
+    for name, info in meta["collections"].items():
+        points = 0
+        for batch in range(info["batches"]):
+            vectors, payloads = f"{name}/{batch:05d}.f32", f"{name}/{batch:05d}.jsonl"
+            if vectors not in members or payloads not in members:
+                raise SnapshotError(f"Snapshot is incomplete: batch {batch} of '{name}' is missing.")
+            size = members[vectors].file_size
+            if size % (info["size"] * 4):
+                raise SnapshotError(f"Snapshot is corrupt: '{vectors}' is not a whole number of vectors.")
+            points += size // (info["size"] * 4)
+        if points != info["count"]:
+            raise SnapshotError(f"Snapshot is incomplete: '{name}' has {points} vectors, expected {info['count']}.")
+
+
+def _import_collection(client, zf, name, info):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    if name == COLLECTION_NAME:
+        params = collection_params(info["size"])   # Layout follows this install's KB_* settings
+    else:
+        params = {"vectors_config": models.VectorParams(size=info["size"], distance=models.Distance(info["distance"]))}
+    if not is_embedded():
+        # Bulk load without building the HNSW graph point by point; it is built once at the end
+        params["optimizers_config"] = models.OptimizersConfigDiff(indexing_threshold=0)
+    client.create_collection(collection_name=name, **params)
+
+    loaded = 0
+    for batch in range(info["batches"]):
+        vectors = np.frombuffer(zf.read(f"{name}/{batch:05d}.f32"), dtype=np.float32).reshape(-1, info["size"])
+        points = [json.loads(line) for line in zf.read(f"{name}/{batch:05d}.jsonl").splitlines()]
+        client.upsert(collection_name=name, wait=is_embedded(), points=models.Batch(
+            ids=[p["id"] for p in points], vectors=vectors.tolist(), payloads=[p["payload"] for p in points],
+        ))
+        loaded += len(points)
+    if not is_embedded():
+        client.update_collection(collection_name=name,
+                                 optimizers_config=models.OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD))
+    return loaded
+
+
+def _restamp_files(files, hashes):
+    """
+    Copies of the data folder get new mtimes. Files whose content matches the snapshot are
+    re-stamped with their local signature so incremental ingestion doesn't re-embed them.
+    """
+    restamped = 0
+    for path, info in files.items():
+        signature = file_signature(path)
+        if not signature or (signature["mtime"] == info.get("mtime") and signature["size"] == info.get("size")):
+            continue
+        if signature["size"] == info.get("size") and hashes.get(path) and file_hash(path) == hashes[path]:
+            info.update(signature)
+            restamped += 1
+    return restamped
+
+
+def restore(path):
+    """Bulk-loads a snapshot into the configured backend and installs its manifest."""
+    meta = read_meta(path)
+    check_identity(meta.get("embedding"), current_identity())
+    client = get_client()
+
+    started = time.perf_counter()
+    print(f"♻️ Restoring {path} into Qdrant ({VECTOR_BACKEND})...")
+    with zipfile.ZipFile(path) as zf:
+        verify_snapshot(zf, meta)
+        for name, info in meta["collections"].items():
+            loaded = _import_collection(client, zf, name, info)
+            print(f"   ✅ {name}: {loaded} points")
+        snapshot_manifest = json.loads(zf.read("manifest.json"))
+        hashes = json.loads(zf.read("file_hashes.json"))
+    if COLLECTION_NAME in meta["collections"]:
+        ensure_payload_indexes(client)
+
+    # The snapshot's file index becomes ours: `ingest`/`watcher` then only pick up what changed since
+    local = load_manifest()
+    files = snapshot_manifest.get("files") or {}
+    restamped = _restamp_files(files, hashes)
+    save_manifest({
+        **snapshot_manifest,
+        "files": files,
+        "embedding": meta["embedding"],
+        # Strictly newer than anything cached here or in the snapshot: cached RAG answers invalidate
+        "version": max(local.get("version", 0), snapshot_manifest.get("version", 0)) + 1,
+        "updated": time.time(),
+        "ingest": {"state": "done", "restored_from": os.path.basename(path), "updated": time.time()},
+    })
+    print(f"🎉 Restored in {time.perf_counter() - started:.1f}s ({len(files)} files indexed"
+          + (f", {restamped} re-stamped" if restamped else "") + "). Run `python watcher.py --once` to index changes since.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot / restore the knowledge-base vector collections.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("snapshot", help="Export collections + manifest").add_argument("path", nargs="?")
+    commands.add_parser("restore", help="Bulk-load a snapshot (replaces the collections)").add_argument("path")
+    commands.add_parser("info", help="Show a snapshot's metadata").add_argument("path")
+    args = parser.parse_args()
+    try:
+        if args.command == "snapshot":
+            snapshot(args.path)
+        elif args.command == "restore":
+            restore(args.path)
+        else:
+            print(json.dumps(read_meta(args.path), indent=2))
+    except SnapshotError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
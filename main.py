@@ -2,22 +2,18 @@ import subprocess
 import sys
 import time
 import os
+import json
+import threading
+import urllib.error
 import urllib.request
+from kb_manifest import set_ingest_progress
+from vectordb import is_embedded
 
-def run_step(command, step_name):
-    """Runs a command and handles errors."""
-    print(f"\n🚀 [STEP] {step_name}...")
-    try:
-        # If command is a string, shell=True. If list, shell=False.
-        use_shell = isinstance(command, str)
-        subprocess.run(command, shell=use_shell, check=True)
-        print(f"✅ {step_name} Success.")
-    except subprocess.CalledProcessError:
-        print(f"❌ {step_name} Failed! Please check the error above.")
-        sys.exit(1)
-    except FileNotFoundError:
-        print(f"❌ Command not found. Is {command[0]} installed?")
-        sys.exit(1)
+# --- CONFIGURATION ---
+SERVER_URL = "http://localhost:8000"
+QDRANT_READY_URL = "http://localhost:6333/readyz"
+SERVER_TIMEOUT = 120
+QDRANT_TIMEOUT = 120
 
 def setup_offline_assets():
     """Ensures static assets (JS/CSS) are downloaded for offline use."""
@@ -50,30 +46,36 @@ def setup_offline_assets():
                     print(f"   ⚠️ Failed to download {filename}: {e}")
         print("✅ Offline Assets Ready.")
 
-def main():
-    print("="*50)
-    print("      🧠 SYNAPSE - FAST LAUNCHER")
-    print("="*50)
-
-    # --- 1. START DOCKER (Database) ---
-    # Will skip automatically if containers are already running
-    run_step(["docker-compose", "up", "-d"], "Starting Qdrant Database")
+def start_process(command, step_name):
+    """Starts a command without waiting for it. Returns the process, or None if it can't start."""
+    print(f"\n🚀 [START] {step_name}...")
+    try:
+        return subprocess.Popen(command)
+    except FileNotFoundError:
+        print(f"❌ Command not found. Is {command[0]} installed?")
+        return None
 
-    # --- 2. SETUP OFFLINE ASSETS (Frontend) ---
-    setup_offline_assets()
+def wait_for_http(url, name, timeout, check=None):
+    """Polls `url` until it answers (and `check(body)` passes). Returns True when ready."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                body = response.read().decode("utf-8", errors="ignore")
+                if check is None or check(body):
+                    print(f"✅ {name} is ready.")
+                    return True
+        except (urllib.error.URLError, OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    print(f"⚠️ {name} not ready after {timeout}s.")
+    return False
 
-    # --- 3. INGEST DOCUMENTS (RAG Data) ---
-    # Scans ./data folder and updates vector DB
-    run_step([sys.executable, "ingest.py"], "Ingesting Knowledge Base")
+def server_is_active(body):
+    return json.loads(body).get("status") == "active"
 
-    # --- 4. START SERVER (Application) ---
-    print("\n🔥 Starting Web Server...")
-    print("👉 Press Ctrl+C to stop Synapse.")
-    print("-" * 50)
-    
-    # Auto-open browser
+def open_browser(url):
     try:
-        url = "http://localhost:8000"
         if sys.platform == 'win32':
             subprocess.Popen(["start", url], shell=True)
         elif sys.platform == 'darwin':
@@ -83,8 +85,63 @@ def main():
     except:
         pass 
 
-    # Run Server
-    subprocess.run([sys.executable, "server.py"])
+def run_background_watcher():
+    """Waits for Qdrant, then starts watcher.py: it indexes whatever changed in ./data and keeps watching."""
+    if not wait_for_http(QDRANT_READY_URL, "Qdrant Database", QDRANT_TIMEOUT):
+        print("⚠️ Skipping ingestion: Qdrant is not reachable. Run `python watcher.py` once it is up.")
+        return None
+    print("\n📥 [BACKGROUND] Syncing Knowledge Base with ./data (progress is shown in the UI)...")
+    watcher = start_process([sys.executable, "watcher.py"], "Watching ./data for changes")
+    if watcher is None:
+        set_ingest_progress(state="failed")
+    return watcher
+
+def main():
+    print("="*50)
+    print("      🧠 SYNAPSE - FAST LAUNCHER")
+    print("="*50)
+
+    # --- 1. START EVERYTHING INDEPENDENT AT ONCE ---
+    # Docker (skips automatically if containers are already running), assets and the server
+    # all start together; the server reports per-subsystem readiness in /health.
+    # With VECTOR_BACKEND=embedded there is no Docker: the server holds the vector store itself
+    embedded = is_embedded()
+    docker = None if embedded else start_process(["docker-compose", "up", "-d"], "Starting Qdrant Database")
+    assets = threading.Thread(target=setup_offline_assets, daemon=True)
+    assets.start()
+    server = start_process([sys.executable, "server.py"], "Starting Web Server")
+    if server is None:
+        sys.exit(1)
+
+    # --- 2. INGEST IN THE BACKGROUND (needs Qdrant, not the server) ---
+    # Only new/changed files are embedded; later edits to ./data are picked up live.
+    background = {}
+    if embedded:
+        print("\n📦 Embedded vector store: the server indexes ./data itself.")
+    else:
+        ingest = threading.Thread(target=lambda: background.update(watcher=run_background_watcher()), daemon=True)
+        ingest.start()
+
+    # --- 3. OPEN THE UI AS SOON AS IT CAN CHAT ---
+    try:
+        assets.join()
+        if wait_for_http(f"{SERVER_URL}/health", "Web Server", SERVER_TIMEOUT, check=server_is_active):
+            print(f"\n🔥 Synapse is live at {SERVER_URL}")
+            print("👉 Press Ctrl+C to stop Synapse.")
+            print("-" * 50)
+            open_browser(SERVER_URL)
+
+        if docker is not None and docker.wait() != 0:
+            print("❌ Starting Qdrant Database Failed! RAG will be unavailable until Qdrant is running.")
+
+        server.wait()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping Synapse...")
+    finally:
+        for process in (background.get("watcher"), server):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                process.wait()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,58 +1,258 @@
 import sqlite3
 import json
 import os
+import re
+import threading
+from array import array
+from dotenv import load_dotenv
 
-DB_PATH = "chat_history.db"
+# Settings below come from .env too, whichever entry point (server, benchmarks, scripts) imports this first
+load_dotenv()
+
+# Shared by every server worker (WAL mode: readers never block the writer)
+DB_PATH = os.getenv("CHAT_DB_PATH", "chat_history.db")
+DEFAULT_SESSION = "default"
+BUSY_TIMEOUT_S = 10  # Another worker holding the write lock -> wait instead of "database is locked"
+
+# --- RECALL: earlier turns relevant to the current query (FTS5 + optional embeddings) ---
+HISTORY_RECALL = int(os.getenv("HISTORY_RECALL", "3"))               # Past turns recalled per query (0 = off)
+HISTORY_RECALL_CHARS = int(os.getenv("HISTORY_RECALL_CHARS", "600"))  # Each recalled message is cut to this
+HISTORY_EMBEDDINGS = os.getenv("HISTORY_EMBEDDINGS", "0") == "1"     # Also match user messages by meaning
+MAX_QUERY_TERMS = 16
+STOPWORDS = set("""a an and are as at be but by can could did do does for from had has have how i if in is it
+its me my of on or our please should so than that the their them then there these this to was we were what
+when where which who why will with would you your""".split())
+
+# --- RETENTION: keeps the table (and so recall) bounded after months of use ---
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "2000"))  # Per session, oldest dropped first (0 = no cap)
+HISTORY_MAX_AGE_DAYS = float(os.getenv("HISTORY_MAX_AGE_DAYS", "180"))  # 0 = keep forever
+PRUNE_EVERY = 100  # add_message prunes the session every N inserts
+
+HAS_FTS5 = True
+_schema_ready = set()  # DB paths whose tables exist (created on first use, not on import)
+_schema_lock = threading.Lock()
+
+def _open():
+    return sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_S)
+
+def connect():
+    """Opens the chat database. The first connection in a process creates the tables."""
+    if DB_PATH not in _schema_ready:
+        with _schema_lock:
+            if DB_PATH not in _schema_ready:
+                init_db()
+    return _open()
 
 def init_db():
     """Creates the database and table if they don't exist."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _open()
     cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS messages (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             role TEXT,
             content TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            session_id TEXT NOT NULL DEFAULT 'default'
         )
     ''')
+    # Databases created before sessions existed
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(messages)")]
+    if "session_id" not in columns:
+        cursor.execute("ALTER TABLE messages ADD COLUMN session_id TEXT NOT NULL DEFAULT 'default'")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS message_vectors (
+            message_id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_vectors_session ON message_vectors (session_id)")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_vectors_ad AFTER DELETE ON messages BEGIN
+            DELETE FROM message_vectors WHERE message_id = old.id;
+        END
+    """)
+    _init_fts(cursor)
     conn.commit()
     conn.close()
+    _schema_ready.add(DB_PATH)
+
+def _init_fts(cursor):
+    """Full-text index over message content, kept in sync by triggers. Skipped if SQLite lacks FTS5."""
+    global HAS_FTS5
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+            USING fts5(content, content='messages', content_rowid='id', tokenize='porter unicode61')
+        """)
+    except sqlite3.OperationalError as e:
+        HAS_FTS5 = False
+        print(f"⚠️ SQLite without FTS5 ({e}): chat history recall disabled.")
+        return
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    """)
+    if not exists:
+        # Databases from before the index: index the history they already hold
+        cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
 
-def add_message(role, content):
-    """Adds a new message to the history."""
-    conn = sqlite3.connect(DB_PATH)
+def add_message(role, content, session_id=DEFAULT_SESSION, vector=None):
+    """Adds a new message to the history (`vector`: its embedding, for recall by meaning)."""
+    conn = connect()
     cursor = conn.cursor()
-    cursor.execute("INSERT INTO messages (role, content) VALUES (?, ?)", (role, content))
+    cursor.execute("INSERT INTO messages (role, content, session_id) VALUES (?, ?, ?)", (role, content, session_id))
+    message_id = cursor.lastrowid
+    if vector is not None:
+        cursor.execute("INSERT INTO message_vectors (message_id, session_id, vector) VALUES (?, ?, ?)",
+                       (message_id, session_id, array("f", vector).tobytes()))
     conn.commit()
     conn.close()
+    if message_id % PRUNE_EVERY == 0:
+        prune_history(session_id)
 
-def get_recent_history(limit=5):
-    """Retrieves the last N messages formatted for the AI."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT role, content FROM messages ORDER BY id DESC LIMIT {limit}")
-    rows = cursor.fetchall()
+def count_messages(session_id=DEFAULT_SESSION):
+    conn = connect()
+    count = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+    conn.close()
+    return count
+
+def get_messages(offset=0, limit=20, session_id=DEFAULT_SESSION):
+    """(role, content) pairs in chronological order, starting at the `offset`-th message."""
+    conn = connect()
+    rows = conn.execute("SELECT role, content FROM messages WHERE session_id = ? ORDER BY id LIMIT ? OFFSET ?",
+                        (session_id, limit, offset)).fetchall()
     conn.close()
-    
-    history_str = ""
-    for role, content in reversed(rows):
-        history_str += f"{role.capitalize()}: {content}\n"
-    return history_str
+    return rows
+
+# --- RECALL ---
+def fts_query(text):
+    """FTS5 MATCH expression for free text: its distinctive words, any of which may match."""
+    terms = []
+    for word in re.findall(r"\w+", text.lower()):
+        if len(word) > 2 and word not in STOPWORDS and word not in terms:
+            terms.append(word)
+    return " OR ".join(f'"{t}"' for t in terms[:MAX_QUERY_TERMS])
+
+def _keyword_hits(conn, query, session_id, before_id, limit):
+    match = fts_query(query)
+    if not match or not HAS_FTS5:
+        return []
+    rows = conn.execute("""
+        SELECT m.id FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH ? AND m.session_id = ? AND m.id < ?
+        ORDER BY bm25(messages_fts) LIMIT ?
+    """, (match, session_id, before_id, limit)).fetchall()
+    return [r[0] for r in rows]
+
+def _vector_hits(conn, query_vector, session_id, before_id, limit):
+    import numpy as np  # Only with HISTORY_EMBEDDINGS=1: importing memory stays cheap
+    rows = conn.execute("SELECT message_id, vector FROM message_vectors WHERE session_id = ? AND message_id < ?",
+                        (session_id, before_id)).fetchall()
+    if not rows:
+        return []
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    matrix = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+    if matrix.shape[1] != query_vector.shape[0]:
+        return []  # Stored with another embedding model
+    scores = matrix @ query_vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector) + 1e-9)
+    return [rows[i][0] for i in np.argsort(-scores)[:limit]]
+
+def _turn(conn, message_id, session_id):
+    """The user message at or before `message_id` and the reply that followed it."""
+    rows = conn.execute("""
+        SELECT id, role, content FROM messages WHERE session_id = ? AND id >= COALESCE(
+            (SELECT MAX(id) FROM messages WHERE session_id = ? AND role = 'user' AND id <= ?), ?)
+        ORDER BY id LIMIT 2
+    """, (session_id, session_id, message_id, message_id)).fetchall()
+    if len(rows) == 2 and (rows[0][1] != "user" or rows[1][1] == "user"):
+        rows = rows[:1]
+    return rows
+
+def search_history(query, before_offset, session_id=DEFAULT_SESSION, query_vector=None, limit=HISTORY_RECALL):
+    """
+    Earlier turns relevant to `query`, as (role, content) pairs in chronological order. Only
+    messages before the `before_offset`-th one are searched (the rest is already in the prompt's
+    recent window). Keyword (BM25) and, with `query_vector`, embedding matches are merged by
+    reciprocal rank.
+    """
+    if limit <= 0 or before_offset <= 0:
+        return []
+    conn = connect()
+    try:
+        row = conn.execute("SELECT id FROM messages WHERE session_id = ? ORDER BY id LIMIT 1 OFFSET ?",
+                           (session_id, before_offset)).fetchone()
+        before_id = row[0] if row else conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM messages").fetchone()[0]
+        rankings = [_keyword_hits(conn, query, session_id, before_id, limit * 4)]
+        if query_vector is not None:
+            rankings.append(_vector_hits(conn, query_vector, session_id, before_id, limit * 4))
+        scores = {}
+        for ranking in rankings:
+            for rank, message_id in enumerate(ranking):
+                scores[message_id] = scores.get(message_id, 0) + 1 / (60 + rank)
+
+        turns = {}
+        for message_id in sorted(scores, key=scores.get, reverse=True):
+            rows = _turn(conn, message_id, session_id)
+            if rows and rows[-1][0] < before_id:
+                turns.setdefault(rows[0][0], rows)
+            if len(turns) >= limit:
+                break
+    finally:
+        conn.close()
+    return [(role, content[:HISTORY_RECALL_CHARS]) for start in sorted(turns) for _, role, content in turns[start]]
+
+# --- RETENTION ---
+def prune_history(session_id=None):
+    """Applies HISTORY_MAX_AGE_DAYS and HISTORY_MAX_MESSAGES to one session (or all). Returns rows deleted."""
+    conn = connect()
+    deleted = 0
+    if HISTORY_MAX_AGE_DAYS > 0:
+        age = f"-{HISTORY_MAX_AGE_DAYS} days"
+        if session_id is None:
+            deleted += conn.execute("DELETE FROM messages WHERE timestamp < datetime('now', ?)", (age,)).rowcount
+        else:
+            deleted += conn.execute("DELETE FROM messages WHERE session_id = ? AND timestamp < datetime('now', ?)",
+                                    (session_id, age)).rowcount
+    if HISTORY_MAX_MESSAGES > 0:
+        sessions = [session_id] if session_id is not None else \
+            [r[0] for r in conn.execute("SELECT DISTINCT session_id FROM messages")]
+        for sid in sessions:
+            deleted += conn.execute("""
+                DELETE FROM messages WHERE session_id = ? AND id <= (
+                    SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)
+            """, (sid, sid, HISTORY_MAX_MESSAGES)).rowcount
+    if HAS_FTS5 and deleted >= 1000:
+        # Deletes leave tombstones in the full-text index; merge them away after a big cleanup
+        conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    return deleted
 
 # --- NEW FUNCTION: CLEAR DATABASE ---
-def clear_db():
-    """Deletes all messages to start a fresh session."""
+def clear_db(session_id=None):
+    """Deletes all messages (or one session's) to start fresh."""
     try:
         if os.path.exists(DB_PATH):
-            conn = sqlite3.connect(DB_PATH)
+            conn = connect()
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM messages") # Wipes data, keeps table structure
+            if session_id is None:
+                cursor.execute("DELETE FROM messages") # Wipes data, keeps table structure
+            else:
+                cursor.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
             conn.commit()
             conn.close()
             print("🧹 SQL Chat History Cleared.")
     except Exception as e:
         print(f"⚠️ Error clearing DB: {e}")
-
-# Initialize on import
-init_db()
\ No newline at end of file
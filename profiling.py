@@ -0,0 +1,346 @@
+"""
+On-demand profiling of live requests (opt-in: PROFILING=1).
+
+- Per request: send the header `X-Profile: stack` (sampled async task stacks), `cpu` (cProfile)
+  or `all`. The response carries `X-Profile-Id`; download the result from
+  GET /profile/<id>.collapsed (flamegraph.pl / speedscope / inferno), /profile/<id>.prof
+  (snakeviz, pstats) or /profile/<id>.txt. Captures are written to PROFILE_DIR, so any
+  worker can serve the download.
+- Event loop lag: a heartbeat coroutine measures how late the loop wakes it up, and a
+  watchdog thread records what the loop thread was executing while it was blocked.
+  GET /profile/loop-lag lists recent blocks, /profile/loop-lag.collapsed aggregates them.
+
+Stack samples are prefixed with what the request was doing at that moment:
+  running   - one of the request's tasks held the event loop (CPU: regex, SQLite, prompt building)
+  loop-busy - the request was ready to go, or waiting, while another task held the loop
+  awaiting  - the request's tasks were suspended (model I/O, to_thread work, sleeps)
+"""
+import asyncio
+import collections
+import contextvars
+import cProfile
+import gc
+import inspect
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+
+from tracing import LOOP_LAG_SECONDS
+
+# --- CONFIGURATION ---
+PROFILING = os.getenv("PROFILING", "0") == "1"
+PROFILE_HEADER = "x-profile"                                       # stack | cpu | all
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))                # Captures kept on disk
+SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_MS", "5"))
+LOOP_LAG_MS = float(os.getenv("LOOP_LAG_MS", "100"))               # A block at least this long is reported
+LOOP_LAG_INTERVAL_MS = 50                                          # Heartbeat period
+LOOP_LAG_EVENTS = 100                                              # Recent blocks kept per worker
+
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{12}$")
+_capture = contextvars.ContextVar("synapse_profile", default=None)
+_cprofile_lock = threading.Lock()  # One cProfile at a time per process
+
+
+# --- STACK HELPERS ---
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def thread_stack(frame):
+    """Oldest-first frame names of a thread, starting below the event loop's callback runner."""
+    names = []
+    while frame is not None:
+        if frame.f_code.co_name == "_run" and frame.f_code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+            break  # Everything above is asyncio's own run loop
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return names[::-1]
+
+
+def task_stack(task):
+    """
+    Oldest-first frame names of a suspended task. Task.get_stack() stops at the task's own
+    coroutine, so this follows the await chain down to the innermost awaiting frame, through
+    async generators too (`async for` awaits an asend object that only gc knows the generator of).
+    """
+    names, obj = [], task.get_coro()
+    try:
+        for _ in range(200):
+            frame = getattr(obj, "cr_frame", None) or getattr(obj, "gi_frame", None) or getattr(obj, "ag_frame", None)
+            if frame is not None:
+                names.append(_frame_name(frame))
+            awaited = getattr(obj, "cr_await", None) or getattr(obj, "gi_yieldfrom", None) or getattr(obj, "ag_await", None)
+            if awaited is None and type(obj).__name__ in ("async_generator_asend", "async_generator_athrow"):
+                awaited = next((r for r in gc.get_referents(obj) if inspect.isasyncgen(r)), None)
+            if awaited is None:
+                break
+            obj = awaited
+    except Exception:
+        pass  # The task moved on while we looked
+    return names
+
+
+def _current_task(loop):
+    # Read from another thread: a slightly stale answer only misfiles one sample
+    return getattr(asyncio.tasks, "_current_tasks", {}).get(loop)
+
+
+def write_collapsed(counts):
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+# =========================================================================
+#  PER-REQUEST CAPTURE
+# =========================================================================
+
+class Capture:
+    """Profile of one request: sampled task stacks and/or a cProfile."""
+    def __init__(self, mode, path):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.path = path
+        self.tasks = []            # The request's task, then every task it creates (see _task_factory)
+        self.samples = collections.Counter()
+        self.profile = None
+        self.started_at = time.time()
+        self.duration = None
+        self._start = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self, task):
+        self.tasks.append(task)
+        self._start = time.perf_counter()
+        if self.mode in ("cpu", "all"):
+            if _cprofile_lock.acquire(blocking=False):
+                # Profiles the loop thread: other requests running at the same time show up too
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+            else:
+                print(f"[PROFILE] ⚠️ Another cProfile capture is running; {self.id} gets stack samples only")
+                self.mode = "stack"
+        if self.mode in ("stack", "all"):
+            self._sampler = threading.Thread(target=self._sample_loop,
+                                             args=(asyncio.get_running_loop(), threading.get_ident()),
+                                             name=f"profile-{self.id}", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self._start
+        if self.profile is not None:
+            self.profile.disable()
+            _cprofile_lock.release()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+
+    def _sample_loop(self, loop, loop_thread):
+        interval = SAMPLE_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            self._sample(loop, loop_thread)
+
+    def _sample(self, loop, loop_thread):
+        running = _current_task(loop)
+        if running in self.tasks:
+            frame = sys._current_frames().get(loop_thread)
+            self.samples[";".join(["running"] + thread_stack(frame))] += 1
+            return
+        pending = [t for t in list(self.tasks) if not t.done()]
+        # The outermost task only waits for its children (e.g. the streaming response) once they exist
+        leaves = pending[1:] if len(pending) > 1 else pending
+        state = "loop-busy" if running is not None else "awaiting"
+        for task in leaves:
+            self.samples[";".join([state] + task_stack(task))] += 1
+
+    def summary(self):
+        return {"id": self.id, "mode": self.mode, "path": self.path, "started_at": self.started_at,
+                "duration_ms": round((self.duration or 0) * 1000, 1), "samples": sum(self.samples.values()),
+                "sample_interval_ms": SAMPLE_INTERVAL_MS, "worker": os.getpid()}
+
+    def save(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        if self.samples:
+            with open(base + ".collapsed", "w", encoding="utf-8") as f:
+                f.write(write_collapsed(self.samples))
+        if self.profile is not None:
+            self.profile.dump_stats(base + ".prof")
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f)
+        _prune()
+
+
+def _task_factory(loop, coro, context=None, **kwargs):
+    """Adds tasks created inside a profiled request to its capture (they inherit its context)."""
+    task = asyncio.Task(coro, loop=loop, context=context, **kwargs)
+    capture = context.get(_capture) if context is not None else _capture.get()
+    if capture is not None:
+        capture.tasks.append(task)
+    return task
+
+
+def _prune():
+    metas = sorted((f for f in os.listdir(PROFILE_DIR) if f.endswith(".json")),
+                   key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f)))
+    for meta in metas[:-PROFILE_KEEP] if len(metas) > PROFILE_KEEP else []:
+        for ext in (".json", ".collapsed", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, meta[:-5] + ext))
+            except OSError:
+                pass
+
+
+def recent_profiles(limit=20):
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    metas = sorted((f for f in os.listdir(PROFILE_DIR) if f.endswith(".json")),
+                   key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f)), reverse=True)[:limit]
+    entries = []
+    for meta in metas:
+        try:
+            with open(os.path.join(PROFILE_DIR, meta), "r", encoding="utf-8") as f:
+                entries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def profile_path(profile_id, ext):
+    """Path of a stored capture file, or None (also for ids that are not ours)."""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    return path if os.path.exists(path) else None
+
+
+def pstats_text(path, limit=40):
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware, so a streamed response is profiled until its last chunk is sent."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        mode = None
+        if scope["type"] == "http":
+            mode = dict(scope["headers"]).get(PROFILE_HEADER.encode(), b"").decode().strip().lower() or None
+        if mode not in ("stack", "cpu", "all"):
+            return await self.app(scope, receive, send)
+
+        capture = Capture(mode, scope.get("path"))
+        token = _capture.set(capture)
+
+        async def finish():
+            if capture.duration is None:
+                capture.stop()
+                await asyncio.to_thread(capture.save)
+                print(f"[PROFILE] 🔬 {capture.path} profiled ({capture.mode}, {capture.duration * 1000:.0f}ms): "
+                      f"/profile/{capture.id}")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", capture.id.encode())]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                await finish()  # Saved before the client sees the end of the response
+            await send(message)
+
+        capture.start(asyncio.current_task())
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _capture.reset(token)
+            await finish()
+
+
+# =========================================================================
+#  EVENT LOOP LAG
+# =========================================================================
+
+class LoopLagMonitor:
+    """Reports calls that block the event loop for LOOP_LAG_MS or longer, with their stack."""
+    def __init__(self, threshold_ms=LOOP_LAG_MS, interval_ms=LOOP_LAG_INTERVAL_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.events = collections.deque(maxlen=LOOP_LAG_EVENTS)
+        self.blocking = collections.Counter()   # Collapsed stacks seen while the loop was blocked
+        self._block = collections.Counter()     # ...during the current block
+        self._lock = threading.Lock()
+        self._sleep_started = None
+        self._task = None
+        self._stop = threading.Event()
+        self._worker = str(os.getpid())
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._sleep_started = time.perf_counter()
+        self._task = loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, args=(threading.get_ident(),), name="loop-lag", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            self._sleep_started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - self._sleep_started - self.interval)
+            LOOP_LAG_SECONDS.observe(self._worker, lag)
+            with self._lock:
+                block, self._block = self._block, collections.Counter()
+            if lag >= self.threshold:
+                self._report(lag, block)
+
+    def _watchdog(self, loop_thread):
+        """Samples the loop thread while the heartbeat is overdue."""
+        step = self.interval / 2
+        while not self._stop.wait(step):
+            overdue = time.perf_counter() - self._sleep_started - self.interval
+            if overdue >= self.threshold / 2:
+                stack = ";".join(thread_stack(sys._current_frames().get(loop_thread))) or "(idle)"
+                with self._lock:
+                    self._block[stack] += 1
+
+    def _report(self, lag, block):
+        stack = block.most_common(1)[0][0] if block else None
+        with self._lock:
+            self.blocking.update(block)
+        self.events.append({"at": time.time(), "lag_ms": round(lag * 1000, 1), "stack": stack,
+                            "samples": sum(block.values())})
+        where = stack.rsplit(";", 1)[-1] if stack else "unknown"
+        print(f"[PROFILE] 🐢 Event loop blocked {lag * 1000:.0f}ms (in {where})")
+
+    def recent(self, limit=20):
+        return list(self.events)[-limit:][::-1]
+
+    def collapsed(self):
+        with self._lock:
+            return write_collapsed(self.blocking)
+
+
+loop_monitor = LoopLagMonitor()
+
+
+def start():
+    """Called from the server's startup (inside the running loop) when PROFILING=1."""
+    asyncio.get_running_loop().set_task_factory(_task_factory)
+    loop_monitor.start()
+    print(f"[PROFILE] 🔬 Profiling on: X-Profile header, loop lag >= {LOOP_LAG_MS:.0f}ms reported")
+
+
+def stop():
+    loop_monitor.stop()
@@ -0,0 +1,206 @@
+"""
+Prompt assembly for every model call. Messages are laid out from most to least stable:
+
+  1. static:  SYSTEM_PROMPT, identical for every call to a model (versioned below)
+  2. session: facts about the user + the chat-history window (append-only, slides in steps)
+  3. turn:    earlier turns recalled for this query, the task instructions, retrieved
+              context / search results and the question
+
+Consecutive calls then share a long prefix (system + history) and Ollama reuses its KV
+cache for it instead of prefilling the whole prompt again. Volatile content must only
+ever go into the turn part.
+"""
+import os
+import threading
+
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+# --- CONFIGURATION ---
+PROMPT_VERSION = "3"   # Bump whenever SYSTEM_PROMPT or a template changes (recorded on every trace)
+# Recent messages per prompt. Kept short: older turns come back only when relevant (memory.search_history)
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "8"))
+HISTORY_STEP = int(os.getenv("HISTORY_STEP", "4"))       # The window's start only moves in jumps of this size
+# Same context size and keep-alive for every client of a model: a different num_ctx makes
+# Ollama reload the model (and drop its cache), an expired keep-alive unloads it
+MODEL_NUM_CTX = int(os.getenv("MODEL_NUM_CTX", "8192"))
+MODEL_KEEP_ALIVE = os.getenv("MODEL_KEEP_ALIVE", "30m")
+CHARS_PER_TOKEN = 4
+
+SYSTEM_PROMPT = """You are Synapse, a private, offline study and coding companion running on the user's machine.
+You help students, developers and researchers: you explain concepts, answer questions about their notes,
+write code, run quizzes and guided courses. Be accurate and clear. If you do not know something, say so."""
+
+TEMPLATES = {
+    "router": """Analyze the latest query in the context of the conversation above. Query: {query}
+RULES:
+- If user explicitly asks for a "quiz", "test me" -> "quiz_start".
+- If user asks to "teach me", "syllabus" -> "study_start".
+- If "pdf", "file", "notes", "search docs" -> "rag".
+- If "code", "python", "debug" -> "coder".
+- Otherwise -> "tutor".
+Return ONLY JSON: {{ "tool": "coder" | "rag" | "tutor" | "quiz_start" | "study_start" }}""",
+
+    "tutor": """Act as a helpful tutor and answer the question, using the conversation so far.
+
+User Question:
+{query}""",
+
+    "rag": """Use the conversation so far and the documents below to answer.
+
+Context (Documents):
+{context}
+
+User Question:
+{query}""",
+
+    "research": """You are a Research Assistant with access to the internet.
+Answer the question using the search results below. Cite your sources if possible (e.g., [Source Name]).
+If the search results don't answer the question, admit it.
+
+Real-Time Search Results ({backend}):
+{results}
+
+User Query: {query}""",
+
+    "coder": """You are an expert Python Coder with FILE ACCESS.
+RULES:
+1. If the user asks to SAVE code to a file, you MUST output a SINGLE JSON block.
+2. Format:
+   ```json
+   {{
+     "action": "save_file",
+     "filename": "example.py",
+     "content": "print('Hello World')"
+   }}
+   ```
+3. If the user just asks a question, reply with normal text/code blocks.
+4. Do NOT include any text outside the JSON block if you are saving a file.
+
+User Request: {query}""",
+
+    "quiz_question": """You are a strict Quiz Generator.
+Context: {context}
+Task: Create exactly ONE multiple-choice question about: {topic}.
+
+CRITICAL OUTPUT RULES:
+1. Output ONLY the question and 4 options (A, B, C, D).
+2. Do NOT write "Answer:", "Explanation:", or any conversational text.
+3. Do NOT explain why the other options are wrong.
+4. Stop immediately after Option D.
+
+Format:
+Question: [Text]
+A) [Option]
+B) [Option]
+C) [Option]
+D) [Option]""",
+
+    "quiz_grade": """You are a strict Grader.
+Question: {question}
+Student Answer: {answer}
+
+Rules:
+1. Determine if the answer is CORRECT or INCORRECT.
+2. Output format MUST be exactly:
+   VERDICT: [CORRECT/INCORRECT]
+   EXPLANATION: [Reasoning]""",
+
+    "syllabus": """You are an expert curriculum designer. Create a concise 4-step study syllabus for: {topic}.
+
+RULES:
+1. Return ONLY a valid JSON list of strings.
+2. No conversational filler (no "Here is the list").
+3. Example format: ["Introduction to {topic}", "Core Concepts", "Advanced Techniques", "Real-world Applications"]""",
+
+    "lesson": """You are a teacher explaining '{module}' as part of a course on '{topic}'.
+
+INSTRUCTIONS:
+- Explain the concept clearly and concisely.
+- Provide ONE simple code example or analogy if applicable.
+- Keep it engaging but brief (under 200 words).
+- Do not say "Module X". Just teach.""",
+
+    "study_qna": """The student is taking a course on '{topic}'.
+We just finished discussing '{module}'.
+
+Student Question: "{query}"
+
+Answer the question helpfully, keeping the context of the course in mind.""",
+}
+
+
+def model_options():
+    """Keyword arguments pinning every ChatOllama client to the same loaded model context."""
+    return {"num_ctx": MODEL_NUM_CTX, "keep_alive": MODEL_KEEP_ALIVE}
+
+
+def history_window(total, limit=HISTORY_WINDOW, step=HISTORY_STEP):
+    """
+    Offset of the first history message to include. A plain "last N" window shifts by one
+    every turn, changing the start of the prompt and invalidating the whole cache; this
+    start moves only every `step` messages (the window holds limit - step + 1 .. limit).
+    """
+    if total <= limit:
+        return 0
+    step = max(1, min(step, limit))
+    return -(-(total - limit) // step) * step
+
+
+class History(list):
+    """
+    The recent history window, as (role, content) pairs, plus `recalled`: earlier turns that
+    memory.search_history found relevant to this query. Those change every turn, so build()
+    puts them in the turn part, after the cached prefix.
+    """
+    def __init__(self, window=(), recalled=()):
+        super().__init__(window)
+        self.recalled = list(recalled)
+
+
+def build(name, history=(), facts="", **turn):
+    """Messages for template `name`: static system prompt, session context, then this turn."""
+    messages = [SystemMessage(content=SYSTEM_PROMPT)]
+    if facts:
+        messages.append(SystemMessage(content=f"Facts about the user:\n{facts}"))
+    for role, content in history:
+        messages.append(AIMessage(content=content) if role == "assistant" else HumanMessage(content=content))
+    task = TEMPLATES[name].format(**turn)
+    recalled = getattr(history, "recalled", None)
+    if recalled:
+        earlier = "\n".join(f"{role.capitalize()}: {content}" for role, content in recalled)
+        task = f"Relevant earlier conversation:\n{earlier}\n\n{task}"
+    messages.append(HumanMessage(content=task))
+    return messages
+
+
+def render(prompt):
+    """Flat text of a prompt, as the model's chat template sees it (for prefix comparisons)."""
+    if isinstance(prompt, str):
+        return prompt
+    parts = []
+    for m in prompt:
+        content = m.content if isinstance(m.content, str) else " ".join(
+            p.get("text", "") for p in m.content if isinstance(p, dict))
+        parts.append(f"<{m.type}>{content}")
+    return "\n".join(parts)
+
+
+class PrefixTracker:
+    """
+    Estimates KV-cache reuse: the share of each prompt that repeats the previous prompt sent
+    to the same model. Ollama only needs to prefill the rest (exact for one parallel slot).
+    """
+    def __init__(self):
+        self.last = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model, prompt):
+        """Returns (estimated prompt tokens, estimated tokens served from the cache)."""
+        text = render(prompt)
+        with self._lock:
+            previous, self.last[model] = self.last.get(model, ""), text
+        shared = len(os.path.commonprefix([previous, text]))
+        return len(text) // CHARS_PER_TOKEN, shared // CHARS_PER_TOKEN
+
+
+prefix_tracker = PrefixTracker()
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    from linkup import LinkupClient
+except ImportError:
+    LinkupClient = None
+
+# --- CONFIGURATION ---
+RESEARCH_BACKEND = os.getenv("RESEARCH_BACKEND", "linkup")          # "linkup" | "local"
+RESEARCH_LOCAL_PATH = os.getenv("RESEARCH_LOCAL_PATH", "research_corpus.json")
+RESEARCH_LOCAL_LATENCY_MS = float(os.getenv("RESEARCH_LOCAL_LATENCY_MS", "0"))
+RESEARCH_CACHE_TTL = float(os.getenv("RESEARCH_CACHE_TTL", "3600"))  # Seconds (0 disables)
+RESEARCH_CACHE_SIZE = 256
+LINKUP_API_KEY = os.getenv("LINKUP_API_KEY")
+
+
+def normalize_query(query):
+    """Lowercase, strip punctuation and collapse whitespace so trivially different queries share a cache entry."""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class ResearchBackend:
+    """
+    Interface for research mode. `search` must be awaitable end-to-end (never block the event loop)
+    and return a list of {"name", "url", "content"} dicts.
+    """
+    name = "base"
+
+    async def search(self, query, depth="standard"):
+        raise NotImplementedError
+
+
+class LinkupBackend(ResearchBackend):
+    name = "Linkup API"
+
+    def __init__(self, api_key):
+        self.client = LinkupClient(api_key=api_key)
+
+    async def search(self, query, depth="standard"):
+        # searchResults gives raw data chunks (better for agent context than sourcedAnswer)
+        kwargs = {"query": query, "depth": depth, "output_type": "searchResults"}
+        if hasattr(self.client, "async_search"):
+            response = await self.client.async_search(**kwargs)
+        else:
+            response = await asyncio.to_thread(self.client.search, **kwargs)
+        return [{"name": r.name, "url": r.url, "content": r.content} for r in (response.results or [])]
+
+
+class LocalResearchBackend(ResearchBackend):
+    """
+    Offline stand-in for load tests and benchmarks.
+    Reads a JSON list (or JSONL file) of {"name", "url", "content"} entries and ranks them by keyword overlap.
+    `latency_ms` simulates the network round trip.
+    """
+    name = "Local Corpus"
+
+    def __init__(self, path=RESEARCH_LOCAL_PATH, latency_ms=RESEARCH_LOCAL_LATENCY_MS):
+        self.path = path
+        self.latency_ms = latency_ms
+        self.entries = None
+        self._lock = asyncio.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            print(f"[RESEARCH] ⚠️ Local corpus not found: {self.path}")
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            if self.path.endswith(".jsonl"):
+                entries = [json.loads(line) for line in f if line.strip()]
+            else:
+                entries = json.load(f)
+        # Pre-tokenize once so each search is a cheap set intersection
+        return [(set(normalize_query(e.get("name", "") + " " + e.get("content", "")).split()), e) for e in entries]
+
+    async def search(self, query, depth="standard"):
+        if self.entries is None:
+            async with self._lock:
+                if self.entries is None:
+                    self.entries = await asyncio.to_thread(self._load)
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        terms = set(normalize_query(query).split())
+        scored = [(len(terms & words), e) for words, e in self.entries]
+        scored = [s for s in scored if s[0] > 0]
+        scored.sort(key=lambda s: s[0], reverse=True)
+        limit = 10 if depth == "deep" else 5
+        return [e for _, e in scored[:limit]]
+
+
+class CachedResearch(ResearchBackend):
+    """
+    TTL + LRU cache in front of any backend, keyed by (normalized query, depth).
+    Concurrent identical queries share one in-flight backend call.
+    """
+    def __init__(self, backend, ttl=RESEARCH_CACHE_TTL, max_entries=RESEARCH_CACHE_SIZE):
+        self.backend = backend
+        self.name = backend.name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache = OrderedDict()   # key -> (expires_at, results)
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def search(self, query, depth="standard"):
+        key = (normalize_query(query), depth)
+        entry = self.cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.cache.move_to_end(key)
+            self.hits += 1
+            print(f"[RESEARCH] ♻️ Cache hit for '{key[0]}'")
+            return entry[1]
+
+        if key in self.inflight:
+            self.hits += 1
+            return await asyncio.shield(self.inflight[key])
+
+        self.misses += 1
+        task = asyncio.ensure_future(self.backend.search(query, depth))
+        self.inflight[key] = task
+        try:
+            results = await asyncio.shield(task)
+        finally:
+            self.inflight.pop(key, None)
+
+        if self.ttl > 0:
+            self.cache[key] = (time.monotonic() + self.ttl, results)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return results
+
+
+def create_research_backend():
+    """Builds the configured backend (wrapped in the cache), or None if research mode is unavailable."""
+    if RESEARCH_BACKEND == "local":
+        backend = LocalResearchBackend()
+    elif LinkupClient is None:
+        print("⚠️ Warning: 'linkup-sdk' not found. Research mode will be disabled.")
+        return None
+    elif not LINKUP_API_KEY:
+        return None
+    else:
+        backend = LinkupBackend(LINKUP_API_KEY)
+    return CachedResearch(backend)
@@ -1,8 +1,11 @@
-from qdrant_client import QdrantClient
+import time
+
+from kb_manifest import load_manifest, save_manifest
+from vectordb import get_client, VECTOR_BACKEND
 
 def reset():
-    print("Connecting to Qdrant...")
-    client = QdrantClient(url="http://localhost:6333")
+    print(f"Connecting to Qdrant ({VECTOR_BACKEND})...")
+    client = get_client()
     
     # 1. Delete the PDF Collection
     try:
@@ -18,6 +21,12 @@ def reset():
     except:
         pass
         
+    # 3. Forget the indexed files, or the next start's catch-up would find nothing to embed.
+    # The version still moves forward, so answers cached for the old contents never match.
+    manifest = load_manifest()
+    save_manifest({"version": manifest.get("version", 0) + 1, "updated": time.time()})
+    print("✅ Cleared the ingest manifest.")
+
     print("✨ Qdrant is now 100% clean.")
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+import asyncio
+import importlib.util
+import math
+import os
+import re
+from collections import Counter
+
+from chunking import estimate_tokens
+from kb_manifest import get_categories, get_indexed_files
+from tracing import span
+from vectordb import search_params
+
+# sentence-transformers (and torch behind it) is optional and only imported when the reranker is created
+HAS_CROSS_ENCODER = importlib.util.find_spec("sentence_transformers") is not None
+
+# --- CONFIGURATION ---
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "30"))   # Over-fetch from the vector store
+RERANKER = os.getenv("RERANKER", "auto")          # "auto" | "cross-encoder" | "lexical" | "none"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))   # 1.0 = pure relevance, lower = more diverse
+# Below plain top-4 (~4 x 200 tokens): reranking picks the chunks, so fewer of them are needed
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "700"))
+MAX_CONTEXT_CHUNKS = int(os.getenv("MAX_CONTEXT_CHUNKS", "3"))
+LEXICAL_WEIGHT = 0.5                              # Share of BM25 vs. vector score in the lexical reranker
+SCOPE_NOUNS = r"(?:notes?|slides?|docs?|documents?|files?|lectures?|course|folder|pdfs?|material)"
+
+
+_STOPWORDS = set("a an and are as at be by for from how in is it of on or that the this to what when where which who why with".split())
+
+
+def tokenize(text):
+    return [w for w in re.findall(r"\w+", text.lower()) if w not in _STOPWORDS]
+
+
+def _normalize(scores):
+    lo, hi = min(scores), max(scores)
+    if hi - lo < 1e-9:
+        return [1.0] * len(scores)
+    return [(s - lo) / (hi - lo) for s in scores]
+
+
+def _norm(counts):
+    return math.sqrt(sum(v * v for v in counts.values())) or 1.0
+
+
+class LexicalReranker:
+    """CPU-only fallback: BM25 over the candidate set blended with the vector score."""
+    name = "lexical"
+
+    def score(self, query, docs, vector_scores, doc_terms=None):
+        terms = set(tokenize(query))
+        doc_terms = doc_terms or [Counter(tokenize(d.page_content)) for d in docs]
+        if not terms or not docs:
+            return list(vector_scores)
+        n = len(docs)
+        avg_len = sum(sum(c.values()) for c in doc_terms) / n or 1
+        df = {t: sum(1 for c in doc_terms if t in c) for t in terms}
+        bm25 = []
+        for counts in doc_terms:
+            length = sum(counts.values())
+            s = 0.0
+            for t in terms:
+                tf = counts.get(t, 0)
+                if tf:
+                    idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                    s += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / avg_len))
+            bm25.append(s)
+        return [
+            LEXICAL_WEIGHT * b + (1 - LEXICAL_WEIGHT) * v
+            for b, v in zip(_normalize(bm25), _normalize(list(vector_scores)))
+        ]
+
+
+class CrossEncoderReranker:
+    """sentence-transformers cross-encoder (small MiniLM model, runs on CPU)."""
+    name = "cross-encoder"
+
+    def __init__(self, model_name=RERANK_MODEL):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name)
+
+    def score(self, query, docs, vector_scores, doc_terms=None):
+        return [float(s) for s in self.model.predict([(query, d.page_content) for d in docs])]
+
+
+def create_reranker(kind=RERANKER):
+    if kind == "none":
+        return None
+    if kind in ("auto", "cross-encoder") and HAS_CROSS_ENCODER:
+        try:
+            return CrossEncoderReranker()
+        except Exception as e:
+            print(f"[RAG] ⚠️ Cross-encoder unavailable ({e}), using lexical reranker.")
+    elif kind == "cross-encoder":
+        print("[RAG] ⚠️ 'sentence-transformers' not installed, using lexical reranker.")
+    return LexicalReranker()
+
+
+def mmr(docs, scores, k, lambda_=MMR_LAMBDA, doc_terms=None):
+    """Maximal marginal relevance on term vectors: relevant, but not repeating each other."""
+    vectors = doc_terms or [Counter(tokenize(d.page_content)) for d in docs]
+    norms = [_norm(v) for v in vectors]
+    relevance = _normalize(scores) if scores else []
+    redundancy = [0.0] * len(docs)
+    selected = []
+    remaining = set(range(len(docs)))
+    while remaining and len(selected) < k:
+        best = max(remaining, key=lambda i: (lambda_ * relevance[i] - (1 - lambda_) * redundancy[i], -i))
+        selected.append(best)
+        remaining.discard(best)
+        # Only similarity to the newly picked doc can raise a candidate's redundancy
+        picked = vectors[best]
+        for i in remaining:
+            dot = sum(v * picked.get(t, 0) for t, v in vectors[i].items())
+            redundancy[i] = max(redundancy[i], dot / (norms[i] * norms[best]))
+    return selected
+
+
+def _variants(category):
+    name = category.lower()
+    return {name, re.sub(r"[_\-]+", " ", name)}
+
+
+def parse_scope(value):
+    """Explicit scope from the client: a category (folder) name or a file name/path."""
+    if not value:
+        return None
+    value = value.strip()
+    for category in get_categories():
+        if value.lower() in _variants(category):
+            return {"category": category}
+    for path in get_indexed_files():
+        if value in (path, os.path.basename(path)):
+            return {"source": path}
+    return None
+
+
+def infer_scope(query):
+    """
+    Finds a scope the user asked for explicitly: a file name with its extension ("what does
+    lecture3.pdf say" -> {"source": "./data/os/lecture3.pdf"}) or an indexed folder named as
+    the user's material ("in my OS notes", "from the os folder" -> {"category": "os"}). A folder
+    name that is only the topic ("about os", "on os", "in the os kernel") or bare words like
+    "notes" never scope. None if unscoped.
+    """
+    q = query.lower()
+    for path in get_indexed_files():
+        name = os.path.basename(path).lower()
+        if re.search(rf"(?<![\w.]){re.escape(name)}(?!\.?\w)", q):
+            return {"source": path}
+    q = re.sub(r"[_\-]+", " ", q)   # "machine-learning notes" matches the machine_learning folder
+    for category in sorted(get_categories(), key=len, reverse=True):
+        for name in _variants(category):
+            name = re.escape(name)
+            if re.search(rf"\b(?:in|from|within|using)\s+(?:my|our)\s+{name}\b", q) \
+                    or re.search(rf"\b{name}\s+{SCOPE_NOUNS}\b", q):
+                return {"category": category}
+    return None
+
+
+def scope_filter(scope):
+    if not scope:
+        return None
+    from qdrant_client import models
+    if "source" in scope:
+        # Deduplicated chunks list every file they came from in `sources`
+        return models.Filter(should=[
+            models.FieldCondition(key="metadata.source", match=models.MatchValue(value=scope["source"])),
+            models.FieldCondition(key="metadata.sources", match=models.MatchValue(value=scope["source"])),
+        ])
+    return models.Filter(must=[
+        models.FieldCondition(key="metadata.category", match=models.MatchValue(value=scope["category"])),
+    ])
+
+
+def pack(docs, budget=CONTEXT_TOKEN_BUDGET):
+    """Keeps docs (in rank order) while they fit the token budget; always keeps the best one."""
+    packed, used = [], 0
+    for doc in docs:
+        tokens = estimate_tokens(doc.page_content)
+        if packed and used + tokens > budget:
+            continue
+        packed.append(doc)
+        used += tokens
+    return packed, used
+
+
+class Retriever:
+    """
+    Over-fetch -> rerank -> MMR -> token-budget packing. Each stage is a tracing span
+    (retrieval, rerank, mmr), so /metrics shows what reranking costs per request.
+    """
+    def __init__(self, vector_store, reranker="default"):
+        self.vector_store = vector_store
+        self._reranker = reranker   # "default": created on first use (model load is slow)
+
+    @property
+    def reranker(self):
+        if self._reranker == "default":
+            self._reranker = create_reranker()
+        return self._reranker
+
+    async def retrieve(self, query, scope=None, max_chunks=MAX_CONTEXT_CHUNKS, budget=CONTEXT_TOKEN_BUDGET,
+                       candidates=RETRIEVAL_CANDIDATES):
+        """`scope` ({"category": ...} or {"source": ...}) restricts the search; falls back to everything if empty."""
+        with span("retrieval"):
+            hits = []
+            if scope:
+                hits = await self.vector_store.asimilarity_search_with_score(
+                    query, k=candidates, filter=scope_filter(scope), search_params=search_params())
+                print(f"[RAG] 🔎 Scope {scope}: {len(hits)} candidates")
+            if not hits:
+                hits = await self.vector_store.asimilarity_search_with_score(
+                    query, k=candidates, search_params=search_params())
+        if not hits:
+            return []
+        docs = [d for d, _ in hits]
+        scores = [s for _, s in hits]
+        doc_terms = [Counter(tokenize(d.page_content)) for d in docs]   # Shared by rerank and MMR
+
+        reranker = self._reranker
+        if reranker == "default":
+            # First call loads the model: keep that off the event loop too
+            reranker = await asyncio.to_thread(lambda: self.reranker)
+        if reranker is not None and len(docs) > 1:
+            with span("rerank"):
+                scores = await asyncio.to_thread(reranker.score, query, docs, scores, doc_terms)
+
+        with span("mmr"):
+            order = mmr(docs, scores, max_chunks, doc_terms=doc_terms)
+            ranked = [docs[i] for i in order]
+            packed, used = pack(ranked, budget)
+        print(f"[RAG] 🎯 {len(hits)} candidates -> {len(packed)} chunks (~{used} tokens)")
+        return packed
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+
+# --- CONFIGURATION ---
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"   # Opt-in
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "500"))
+REPLAY_CHUNK_WORDS = 8
+
+
+def normalize_question(query):
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def history_digest(history):
+    """
+    Fingerprint of the conversation a prompt is built on (recent window and recalled turns).
+    Empty for a fresh session, so first questions are shared across sessions, while a
+    follow-up like "explain that again" only matches an earlier turn with the same context.
+    """
+    turns = list(history) + list(getattr(history, "recalled", ()))
+    if not turns:
+        return ""
+    digest = hashlib.sha1()
+    for role, content in turns:
+        digest.update(f"{role}\0{content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SemanticCache:
+    """
+    Answer cache for near-identical questions ("what is recursion?" vs "What's recursion").
+    - Entries are scoped by (tool, collection version, history digest), so re-ingesting documents
+      invalidates RAG answers and answers to follow-ups never reach another conversation.
+    - Lookup: exact normalized-text match first (no embedding call), then cosine similarity >= threshold.
+    - Eviction: TTL per entry plus LRU once `max_entries` is reached.
+    """
+    def __init__(self, embeddings, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL,
+                 max_entries=SEMANTIC_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()   # (tool, version, context, normalized query) -> (expires_at, unit vector, answer)
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, e in self.entries.items() if e[0] <= now]:
+            del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def lookup(self, query, tool, version, context=""):
+        """Returns (answer or None, query vector). The vector is reused by `store` on a miss.
+        `context` is the history_digest of the prompt's conversation."""
+        self._evict()
+        norm = normalize_question(query)
+        key = (tool, version, context, norm)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][2], self.entries[key][1]
+
+        import numpy as np  # Only once the cache is enabled: importing agent stays cheap
+
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(norm), dtype=np.float32)
+            vector /= (np.linalg.norm(vector) or 1.0)
+        except Exception as e:
+            print(f"[CACHE] ⚠️ Embedding failed, skipping cache: {e}")
+            self.misses += 1
+            return None, None
+
+        scoped = [(k, e) for k, e in self.entries.items() if k[:3] == (tool, version, context)]
+        if scoped:
+            sims = np.stack([e[1] for _, e in scoped]) @ vector
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                best_key = scoped[best][0]
+                self.entries.move_to_end(best_key)
+                self.hits += 1
+                print(f"[CACHE] ♻️ Semantic hit ({sims[best]:.3f}): '{best_key[3]}'")
+                return scoped[best][1][2], vector
+
+        self.misses += 1
+        return None, vector
+
+    def store(self, query, tool, version, answer, vector, context=""):
+        if vector is None or not answer.strip():
+            return
+        key = (tool, version, context, normalize_question(query))
+        self.entries[key] = (time.monotonic() + self.ttl, vector, answer)
+        self.entries.move_to_end(key)
+        self._evict()
+
+    async def replay(self, answer):
+        """Streams a cached answer in small word groups so the client renders it like a live reply."""
+        words = re.split(r"(\s+)", answer)
+        step = REPLAY_CHUNK_WORDS * 2  # Words and their separators alternate
+        for i in range(0, len(words), step):
+            yield "".join(words[i:i + step])
+            await asyncio.sleep(0)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
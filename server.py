@@ -1,8 +1,11 @@
 import os
 import sys
+import argparse
+import asyncio
 import logging
+import threading
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi.responses import StreamingResponse, HTMLResponse, PlainTextResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
@@ -11,11 +14,25 @@ from typing import Optional
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
+# Load Environment Variables before the local modules below read their settings at import
+load_dotenv()
+
 # Import the new clear function
-from memory import clear_db 
+from memory import clear_db, prune_history, DEFAULT_SESSION
+from session_store import load_session, delete_session
+from streaming import coalesce_stream, reasoning_log, REASONING_MODE
+from vision import image_cache, MAX_IMAGE_BYTES
+from tracing import render_metrics
+from kb_manifest import get_ingest_progress
+from vectordb import is_embedded
+from backend_pool import pool_stats
+import profiling
 
-# Load Environment Variables
-load_dotenv()
+# --- RUN MODE ---
+# 1 = development (auto-reload). N > 1 = N worker processes sharing sessions via SQLite.
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
 
 # --- LOGGING CONFIGURATION ---
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
@@ -23,22 +40,43 @@ logger = logging.getLogger("server")
 
 # --- GLOBAL STATE ---
 ai_agent = None
+init_task = None
+data_watcher = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global ai_agent
-    logger.info("🚀 Server starting...")
-    
-    # --- 1. RESET DB ON STARTUP ---
-    clear_db() 
-    
+    global ai_agent, init_task, data_watcher
+    logger.info(f"🚀 Server starting (worker pid {os.getpid()})...")
+    # The chat history is wiped once in __main__, before workers start: a worker that
+    # restarts later must not erase sessions other workers are serving
+
     try:
         from agent import WebAgent
         ai_agent = WebAgent()
-        logger.info("✅ AI Agent online.")
+        # Subsystems come up in the background; /chat opens as soon as the tutor path is ready
+        init_task = asyncio.create_task(ai_agent.start())
+        logger.info("✅ AI Agent starting (see /health for subsystem status).")
     except Exception as e:
         logger.critical(f"❌ Failed to load AI Agent: {e}")
+
+    # --- EMBEDDED VECTOR STORE: INDEX ./data IN THIS PROCESS ---
+    # Embedded Qdrant storage can only be opened by one process, so the watcher runs here
+    if is_embedded():
+        from watcher import DataWatcher
+        data_watcher = DataWatcher()
+        threading.Thread(target=data_watcher.run, name="data-watcher", daemon=True).start()
+        logger.info("👀 Watching ./data (embedded vector store).")
+
+    # --- ON-DEMAND PROFILING (PROFILING=1, see profiling.py) ---
+    if profiling.PROFILING:
+        profiling.start()
     yield
+    if profiling.PROFILING:
+        profiling.stop()
+    if init_task and not init_task.done():
+        init_task.cancel()
+    if data_watcher:
+        data_watcher.stop()
     logger.info("🛑 Server shutting down...")
 
 app = FastAPI(lifespan=lifespan)
@@ -53,45 +91,120 @@ app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_credentials=True, 
     allow_methods=["*"], allow_headers=["*"],
 )
+if profiling.PROFILING:
+    # `X-Profile: stack|cpu|all` on any request; results under /profile
+    app.add_middleware(profiling.ProfilingMiddleware)
 
 class ChatRequest(BaseModel):
     query: str
-    image_data: Optional[str] = None
+    image_id: Optional[str] = None     # From POST /image (preferred)
+    image_data: Optional[str] = None   # Legacy: base64 JPEG inline
+    scope: Optional[str] = None        # Restrict document search to a ./data folder or file name
+    session_id: Optional[str] = None   # Browser tab / client; quiz and study state are per session
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/health")
-async def health_check():
-    if not ai_agent:
-        return {"status": "loading", "mode": "initializing...", "quiz_score": 0, "quiz_count": 0}
+async def health_check(session_id: str = DEFAULT_SESSION):
+    if not ai_agent or not ai_agent.is_ready("tutor"):
+        return {"status": "loading", "mode": "initializing...", "quiz_score": 0, "quiz_count": 0,
+                "subsystems": ai_agent.status if ai_agent else {}, "ingest": get_ingest_progress()}
+    state = load_session(session_id)
     return {
         "status": "active",
-        "mode": ai_agent.mode,
-        "current_quiz": ai_agent.quiz_data.get("topic"),
-        "quiz_score": ai_agent.quiz_data.get("score", 0),
-        "quiz_count": ai_agent.quiz_data.get("count", 0)
+        "subsystems": ai_agent.status,
+        "ingest": get_ingest_progress(),
+        "worker": os.getpid(),
+        "backends": pool_stats(),
+        "mode": state["mode"],
+        "current_quiz": state["quiz_data"].get("topic"),
+        "quiz_score": state["quiz_data"].get("score", 0),
+        "quiz_count": state["quiz_data"].get("count", 0),
+        "answer_cache": ai_agent.answer_cache.stats() if ai_agent.answer_cache else None
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Per-stage latency histograms (Prometheus text format). Set TRACE_LOG=traces.jsonl for raw traces."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/reasoning")
+async def reasoning(limit: int = 5, trace_id: Optional[str] = None):
+    """Model reasoning that was kept out of the chat stream (only with REASONING_MODE=side)."""
+    if REASONING_MODE != "side":
+        raise HTTPException(status_code=404, detail="Reasoning is dropped. Set REASONING_MODE=side to keep it.")
+    return {"entries": reasoning_log.recent(limit, trace_id)}
+
+@app.get("/profile")
+async def list_profiles(limit: int = 20):
+    """Recent per-request captures (all workers) and this worker's event-loop blocks."""
+    if not profiling.PROFILING:
+        raise HTTPException(status_code=404, detail="Profiling is off. Set PROFILING=1.")
+    return {"profiles": profiling.recent_profiles(limit), "worker": os.getpid(),
+            "loop_lag": profiling.loop_monitor.recent(limit)}
+
+@app.get("/profile/{name}")
+async def get_profile(name: str):
+    """<id>.collapsed (flamegraph), <id>.prof (cProfile), <id>.txt (pstats summary), loop-lag[.collapsed]."""
+    if not profiling.PROFILING:
+        raise HTTPException(status_code=404, detail="Profiling is off. Set PROFILING=1.")
+    if name == "loop-lag":
+        return {"worker": os.getpid(), "events": profiling.loop_monitor.recent(profiling.LOOP_LAG_EVENTS)}
+    if name == "loop-lag.collapsed":
+        return PlainTextResponse(profiling.loop_monitor.collapsed())
+    profile_id, _, ext = name.partition(".")
+    if ext == "txt":
+        path = profiling.profile_path(profile_id, ".prof")
+        if path:
+            return PlainTextResponse(await asyncio.to_thread(profiling.pstats_text, path))
+    elif ext in ("collapsed", "prof", "json"):
+        path = profiling.profile_path(profile_id, "." + ext)
+        if path:
+            return FileResponse(path, filename=name, media_type="application/json" if ext == "json"
+                                else "text/plain" if ext == "collapsed" else "application/octet-stream")
+    raise HTTPException(status_code=404, detail=f"No profile '{name}'.")
+
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
-    if not ai_agent:
+    if not ai_agent or not ai_agent.is_ready("tutor"):
         raise HTTPException(status_code=503, detail="System is initializing. Please wait.")
     
+    # Merge single-token chunks into fewer writes (see STREAM_FLUSH_BYTES / STREAM_FLUSH_MS)
     return StreamingResponse(
-        ai_agent.get_response(request.query, request.image_data),
+        coalesce_stream(ai_agent.get_response(request.query, request.image_data, request.image_id, request.scope,
+                                              request.session_id or DEFAULT_SESSION)),
         media_type="text/plain"
     )
 
+@app.post("/image")
+async def upload_image(request: Request):
+    """Raw binary upload (body = image bytes). Returns a content-hash id to reference in /chat."""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large.")
+    # Read in pieces: a body without (or with a false) Content-Length stops at the limit too
+    raw = bytearray()
+    async for piece in request.stream():
+        raw += piece
+        if len(raw) > MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large.")
+    if not raw:
+        raise HTTPException(status_code=400, detail="Empty image upload.")
+    try:
+        # Decode / resize / re-encode is CPU work: keep it off the event loop
+        image_id = await asyncio.to_thread(image_cache.add, bytes(raw))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"image_id": image_id}
+
 @app.post("/reset")
-async def reset_mode():
+async def reset_mode(session_id: str = DEFAULT_SESSION):
     if ai_agent:
-        # --- 2. RESET DB ON BUTTON CLICK ---
-        clear_db() 
-        
-        ai_agent.mode = "chat"
-        ai_agent.quiz_data = {"topic": None, "question": None, "score": 0, "count": 0}
+        # --- RESET THIS SESSION ON BUTTON CLICK (history + quiz/study state) ---
+        clear_db(session_id)
+        delete_session(session_id)
         
         # Also clear Mem0 short-term memory if needed
         # ai_agent.user_memory.reset() (Depends on Mem0 version)
@@ -101,4 +214,25 @@ async def reset_mode():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Synapse web server.")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="Worker processes (1 = development mode with auto-reload)")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    # --- ON STARTUP (once, before any worker starts): history is kept, only trimmed to the retention limits ---
+    pruned = prune_history()
+    if pruned:
+        print(f"🧹 Pruned {pruned} old chat messages.")
+    delete_session()
+
+    if args.workers > 1 and is_embedded():
+        # Embedded Qdrant storage can only be opened by one process
+        print("⚠️ VECTOR_BACKEND=embedded supports a single worker; starting 1.")
+        args.workers = 1
+    if args.workers > 1:
+        print(f"🚀 Starting {args.workers} workers on port {args.port}")
+        uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("server:app", host=args.host, port=args.port, reload=True)
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Per-session state (mode, quiz, study plan) and uploaded images, stored next to the chat
+history in SQLite so every server worker sees the same sessions. Workers keep nothing
+between requests: a turn loads its session, runs, and saves it back. Any worker can serve
+any request, and a worker can be restarted at any time.
+"""
+import json
+import threading
+
+import memory
+from memory import connect, DEFAULT_SESSION
+
+_store_ready = set()  # DB paths whose session/image tables exist (created on first use)
+_store_lock = threading.Lock()
+
+
+def new_state():
+    return {
+        "mode": "chat",
+        "quiz_data": {"topic": None, "question": None, "score": 0, "count": 0, "scope": None},
+        "study_data": {"syllabus": [], "index": 0},
+    }
+
+
+def init_store():
+    conn = connect()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            image_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    _store_ready.add(memory.DB_PATH)
+
+
+def _connect():
+    if memory.DB_PATH not in _store_ready:
+        with _store_lock:
+            if memory.DB_PATH not in _store_ready:
+                init_store()
+    return connect()
+
+
+def load_session(session_id=DEFAULT_SESSION):
+    conn = _connect()
+    row = conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    conn.close()
+    return {**new_state(), **json.loads(row[0])} if row else new_state()
+
+
+def save_session(session_id, state):
+    conn = _connect()
+    conn.execute(
+        "INSERT INTO sessions (session_id, state) VALUES (?, ?) "
+        "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = CURRENT_TIMESTAMP",
+        (session_id, json.dumps(state)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def delete_session(session_id=None):
+    """Forgets one session's state (or all of them)."""
+    conn = _connect()
+    if session_id is None:
+        conn.execute("DELETE FROM sessions")
+    else:
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    conn.commit()
+    conn.close()
+
+
+# --- IMAGES (an upload and the /chat that uses it may hit different workers) ---
+def save_image(image_id, b64_image, keep=32):
+    conn = _connect()
+    conn.execute("INSERT OR IGNORE INTO images (image_id, data) VALUES (?, ?)", (image_id, b64_image))
+    conn.execute("DELETE FROM images WHERE image_id NOT IN "
+                 "(SELECT image_id FROM images ORDER BY created_at DESC, rowid DESC LIMIT ?)", (keep,))
+    conn.commit()
+    conn.close()
+
+
+def load_image(image_id):
+    conn = _connect()
+    row = conn.execute("SELECT data FROM images WHERE image_id = ?", (image_id,)).fetchone()
+    conn.close()
+    return row[0] if row else None
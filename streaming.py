@@ -0,0 +1,198 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+
+# --- CONFIGURATION ---
+# Chunks from the agent are merged until either limit is hit (0 disables coalescing)
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", "512"))
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "30"))
+
+
+async def coalesce_stream(source, flush_bytes=STREAM_FLUSH_BYTES, flush_ms=STREAM_FLUSH_MS):
+    """
+    Wraps an async generator of text chunks and yields fewer, larger chunks.
+    - A chunk that arrives after a quiet spell (nothing sent for `flush_ms`) is passed
+      through immediately: the first chunk, and the first model token after the mode
+      header or a slow retrieval step, so time-to-first-token is unchanged.
+    - Chunks arriving in quick succession are buffered and flushed once `flush_bytes` is
+      reached or `flush_ms` has passed since the first buffered chunk, even if the model stalls.
+    """
+    if flush_bytes <= 0 or flush_ms <= 0:
+        async for chunk in source:
+            yield chunk
+        return
+
+    window = flush_ms / 1000
+    # Every step of `source` runs in one shared context, so context variables it sets
+    # (e.g. the request trace) survive from one chunk to the next
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    buffer = []
+    size = 0
+    deadline = None
+    last_sent = None   # When the last chunk went out
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = loop.create_task(source.__anext__(), context=context)
+
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            # Window elapsed while waiting for the model -> flush what we have
+            if not done:
+                yield "".join(buffer)
+                buffer, size, deadline, last_sent = [], 0, None, time.monotonic()
+                continue
+
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            if not chunk:
+                continue
+
+            now = time.monotonic()
+            if not buffer and (last_sent is None or now - last_sent >= window):
+                last_sent = now
+                yield chunk
+                continue
+
+            buffer.append(chunk)
+            size += len(chunk.encode("utf-8"))
+            if deadline is None:
+                deadline = now + window
+            if size >= flush_bytes or now >= deadline:
+                yield "".join(buffer)
+                buffer, size, deadline, last_sent = [], 0, None, now
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # Client disconnected (or we finished): stop the upstream generator too
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await source.aclose()
+
+
+# =========================================================================
+#  REASONING TRACES (deepseek-r1 <think>...</think>)
+# =========================================================================
+
+# "drop": reasoning never leaves the process. "side": kept per request for GET /reasoning.
+# Either way it is not streamed to the client, stored in history or re-fed into prompts.
+REASONING_MODE = os.getenv("REASONING_MODE", "drop")
+THINK_BUDGET_TOKENS = int(os.getenv("THINK_BUDGET_TOKENS", "512"))   # 0 = let the model think as long as it likes
+REASONING_LOG_SIZE = int(os.getenv("REASONING_LOG_SIZE", "20"))       # Requests kept in "side" mode
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+CHARS_PER_TOKEN = 4
+
+
+def _partial_tag(text):
+    """Length of the longest suffix of `text` that could be the start of a think tag."""
+    for size in range(min(len(text), len(THINK_CLOSE) - 1), 0, -1):
+        tail = text[-size:]
+        if THINK_OPEN.startswith(tail) or THINK_CLOSE.startswith(tail):
+            return size
+    return 0
+
+
+class ReasoningFilter:
+    """
+    Splits streamed model text into answer and reasoning. Tags may arrive split across
+    chunks, so a possible partial tag at the end of a chunk is held back until the next one.
+    """
+    def __init__(self):
+        self.thinking = False
+        self.pending = ""
+        self.reasoning = []
+        self.reasoning_chars = 0
+        self._strip = False   # Drop the blank lines the model puts after </think>
+
+    def _answer(self, text):
+        if self._strip:
+            text = text.lstrip()
+            self._strip = not text
+        return text
+
+    def feed(self, chunk):
+        """Returns the visible part of `chunk` (possibly empty)."""
+        text, self.pending = self.pending + (chunk or ""), ""
+        out = []
+        while text:
+            if self.thinking:
+                end = text.find(THINK_CLOSE)
+                if end == -1:
+                    keep = _partial_tag(text)
+                    thought, self.pending = text[:len(text) - keep], text[len(text) - keep:]
+                    self.reasoning.append(thought)
+                    self.reasoning_chars += len(thought)
+                    break
+                self.reasoning.append(text[:end])
+                self.reasoning_chars += end
+                self.thinking, self._strip = False, True
+                text = text[end + len(THINK_CLOSE):]
+                continue
+
+            start, close = text.find(THINK_OPEN), text.find(THINK_CLOSE)
+            if start == -1 and close == -1:
+                keep = _partial_tag(text)
+                out.append(self._answer(text[:len(text) - keep]))
+                self.pending = text[len(text) - keep:]
+                break
+            if close != -1 and (start == -1 or close < start):
+                # Stray closing tag (the template opened the thought in the prompt)
+                out.append(self._answer(text[:close]))
+                self._strip = True
+                text = text[close + len(THINK_CLOSE):]
+                continue
+            out.append(self._answer(text[:start]))
+            self.thinking = True
+            text = text[start + len(THINK_OPEN):]
+        return "".join(out)
+
+    def flush(self):
+        """End of stream: releases a held-back fragment that turned out not to be a tag."""
+        text, self.pending = self.pending, ""
+        if self.thinking:
+            self.reasoning.append(text)
+            self.reasoning_chars += len(text)
+            return ""
+        return self._answer(text)
+
+    @property
+    def reasoning_tokens(self):
+        return self.reasoning_chars // CHARS_PER_TOKEN
+
+    def over_budget(self, budget=THINK_BUDGET_TOKENS):
+        return self.thinking and budget > 0 and self.reasoning_tokens >= budget
+
+    def text(self):
+        return "".join(self.reasoning).strip()
+
+
+class ReasoningLog:
+    """Side channel for REASONING_MODE=side: the last few requests' reasoning, newest first."""
+    def __init__(self, size=REASONING_LOG_SIZE):
+        self.entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, trace_id, tool, text, truncated=False):
+        with self._lock:
+            self.entries.appendleft({"trace_id": trace_id, "tool": tool, "timestamp": time.time(),
+                                     "truncated": truncated, "reasoning": text})
+
+    def recent(self, limit=5, trace_id=None):
+        with self._lock:
+            entries = [e for e in self.entries if trace_id is None or e["trace_id"] == trace_id]
+        return entries[:limit]
+
+
+reasoning_log = ReasoningLog()
@@ -0,0 +1,198 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+TRACE_LOG = os.getenv("TRACE_LOG")  # Optional JSONL file, one line per finished request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+TOKEN_BUCKETS = (0, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RATIO_BUCKETS = (0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1)
+
+_current = contextvars.ContextVar("synapse_trace", default=None)
+_log_lock = threading.Lock()
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label value."""
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self.series = {}   # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            row = self.series.setdefault(label_value, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[len(self.buckets)] += 1
+            row[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, row in sorted(self.series.items()):
+                lbl = f'{self.label}="{label_value}"'
+                for i, bound in enumerate(self.buckets):
+                    lines.append(f'{self.name}_bucket{{{lbl},le="{bound}"}} {row[i]}')
+                lines.append(f'{self.name}_bucket{{{lbl},le="+Inf"}} {row[len(self.buckets)]}')
+                lines.append(f"{self.name}_sum{{{lbl}}} {row[-1]:.6f}")
+                lines.append(f"{self.name}_count{{{lbl}}} {row[len(self.buckets)]}")
+        return "\n".join(lines)
+
+
+SPAN_SECONDS = Histogram("synapse_span_seconds", "Time spent per pipeline stage.", "span")
+REQUEST_SECONDS = Histogram("synapse_request_seconds", "End-to-end /chat latency.", "tool")
+TTFT_SECONDS = Histogram("synapse_ttft_seconds", "Request start to first model token.", "tool")
+TOKENS_PER_SECOND = Histogram("synapse_tokens_per_second", "Model generation speed.", "model", RATE_BUCKETS)
+REASONING_TOKENS = Histogram("synapse_reasoning_tokens", "Hidden <think> tokens per model call.", "model", TOKEN_BUCKETS)
+PREFILL_TOKENS = Histogram("synapse_prefill_tokens", "Prompt tokens the model had to evaluate (not served from its KV cache).", "model", TOKEN_BUCKETS)
+PREFIX_HIT_RATIO = Histogram("synapse_prefix_hit_ratio", "Share of the prompt repeating the previous prompt to the same model.", "model", RATIO_BUCKETS)
+LOOP_LAG_SECONDS = Histogram("synapse_event_loop_lag_seconds", "How late the event loop ran a 50ms heartbeat (PROFILING=1).", "worker")
+ALL_METRICS = [REQUEST_SECONDS, TTFT_SECONDS, SPAN_SECONDS, TOKENS_PER_SECOND, REASONING_TOKENS,
+               PREFILL_TOKENS, PREFIX_HIT_RATIO, LOOP_LAG_SECONDS]
+
+
+class Trace:
+    """Timeline of one /chat request. Spans are recorded into the histograms as they close."""
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.tool = "unknown"
+        self.spans = []
+        self.ttft = None
+        self.generations = []
+        self.finished = False
+
+    def add_span(self, name, start, end):
+        SPAN_SECONDS.observe(name, end - start)
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.start) * 1000, 2),
+            "duration_ms": round((end - start) * 1000, 2),
+        })
+
+    def mark_first_output(self, at):
+        """Time-to-first-token: the first time model output reached the user."""
+        if self.ttft is None:
+            self.ttft = at - self.start
+            TTFT_SECONDS.observe(self.tool, self.ttft)
+
+    def record_generation(self, model, started, first_token, ended, chunks, metadata, visible=True,
+                          reasoning_tokens=0, first_visible=None, prompt_stats=None):
+        """
+        Called once per model call. `metadata` is Ollama's final-chunk info (durations in ns).
+        Queue wait = time to first token minus model load and prompt prefill.
+        TTFT is taken from the first call whose output reaches the user (`visible`), at
+        `first_visible` (the first token after filtered-out <think> reasoning) if given.
+        `prompt_stats` (prompt version, estimated total / cached prompt tokens) is stored as is.
+        Ollama's prompt_eval_count only counts tokens it prefilled, i.e. cache misses.
+        """
+        metadata = metadata or {}
+        shown = first_visible if first_visible is not None else first_token
+        if visible and shown is not None:
+            self.mark_first_output(shown)
+
+        load_s = metadata.get("load_duration", 0) / 1e9
+        prefill_s = metadata.get("prompt_eval_duration", 0) / 1e9
+        if first_token is not None:
+            queue_wait = max(0.0, (first_token - started) - load_s - prefill_s)
+            self.add_span("model_queue_wait", started, started + queue_wait)
+
+        eval_count = metadata.get("eval_count") or chunks
+        eval_s = metadata.get("eval_duration", 0) / 1e9 or (ended - (first_token or ended))
+        tps = eval_count / eval_s if eval_s > 0 else None
+        if tps:
+            TOKENS_PER_SECOND.observe(model, tps)
+        REASONING_TOKENS.observe(model, reasoning_tokens)
+        prompt_stats = prompt_stats or {}
+        if metadata.get("prompt_eval_count") is not None:
+            PREFILL_TOKENS.observe(model, metadata["prompt_eval_count"])
+        if prompt_stats.get("prompt_tokens_est"):
+            prompt_stats["prefix_hit"] = round(prompt_stats["cached_tokens_est"] / prompt_stats["prompt_tokens_est"], 3)
+            PREFIX_HIT_RATIO.observe(model, prompt_stats["prefix_hit"])
+
+        self.generations.append({
+            "model": model,
+            "ttft_ms": round((first_token - started) * 1000, 2) if first_token else None,
+            "duration_ms": round((ended - started) * 1000, 2),
+            "prompt_tokens": metadata.get("prompt_eval_count"),
+            "output_tokens": eval_count,
+            "tokens_per_sec": round(tps, 2) if tps else None,
+            "reasoning_tokens": reasoning_tokens,
+            **prompt_stats,
+            "load_ms": round(load_s * 1000, 2),
+            "prefill_ms": round(prefill_s * 1000, 2),
+        })
+
+    def prompt_totals(self):
+        """Per-request prefill tokens (Ollama) and prefix-hit ratio over all model calls."""
+        total = sum(g.get("prompt_tokens_est", 0) for g in self.generations)
+        cached = sum(g.get("cached_tokens_est", 0) for g in self.generations)
+        return {
+            "prefill_tokens": sum(g["prompt_tokens"] or 0 for g in self.generations),
+            "prefix_hit": round(cached / total, 3) if total else None,
+        }
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        total = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe(self.tool, total)
+        if TRACE_LOG:
+            record = {
+                "trace_id": self.id,
+                "timestamp": self.started_at,
+                "tool": self.tool,
+                "total_ms": round(total * 1000, 2),
+                "ttft_ms": round(self.ttft * 1000, 2) if self.ttft is not None else None,
+                "spans": self.spans,
+                **self.prompt_totals(),
+                "generations": self.generations,
+            }
+            try:
+                with _log_lock, open(TRACE_LOG, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"[TRACE] ⚠️ Could not write trace log: {e}")
+
+
+def start_trace():
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """Times a block on the current request's trace (no-op outside a request)."""
+    trace = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if trace is not None:
+            trace.add_span(name, start, end)
+        else:
+            SPAN_SECONDS.observe(name, end - start)
+
+
+def render_metrics():
+    """Prometheus text exposition format for GET /metrics."""
+    return "\n\n".join(m.render() for m in ALL_METRICS) + "\n"
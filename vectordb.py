@@ -0,0 +1,124 @@
+import os
+import atexit
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+# qdrant_client takes about a second to import, so it is imported on first use: /health,
+# the launcher and tools that only read settings from here don't pay for it.
+# (benchmarks/fakes.py may set QdrantClient to a stand-in before that.)
+QdrantClient = None
+
+# --- CONFIGURATION ---
+# "server": Qdrant in Docker over HTTP. "embedded": Qdrant local mode inside this process,
+# persisted under QDRANT_PATH: no Docker, no HTTP round trip, exact (brute-force) search.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "server")
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_PATH = os.getenv("QDRANT_PATH", "./qdrant_local")
+
+# Storage/index layout of the knowledge-base collection (see benchmarks/bench_vectors.py for trade-offs)
+KB_QUANTIZATION = os.getenv("KB_QUANTIZATION", "none")         # "none" | "scalar" (int8, 4x smaller) | "binary" (32x)
+KB_ON_DISK = os.getenv("KB_ON_DISK", "0") == "1"               # Original vectors + HNSW graph memory-mapped from disk
+KB_ON_DISK_PAYLOAD = os.getenv("KB_ON_DISK_PAYLOAD", "1") == "1"
+KB_HNSW_M = int(os.getenv("KB_HNSW_M", "16"))                  # Graph degree: higher = better recall, more RAM
+KB_HNSW_EF_CONSTRUCT = int(os.getenv("KB_HNSW_EF_CONSTRUCT", "100"))
+KB_SEARCH_EF = int(os.getenv("KB_SEARCH_EF", "128"))           # Search-time beam width
+KB_RESCORE = os.getenv("KB_RESCORE", "1") == "1"               # Re-rank quantized hits with original vectors
+KB_OVERSAMPLING = float(os.getenv("KB_OVERSAMPLING", "2.0"))   # Quantized candidates fetched per requested hit
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def is_embedded():
+    return VECTOR_BACKEND == "embedded"
+
+
+def get_client():
+    """
+    Process-wide Qdrant client for the configured backend. Embedded storage can only be
+    opened once per process (it holds a file lock), so everyone shares this instance.
+    """
+    global _client, QdrantClient
+    with _client_lock:
+        if _client is None:
+            if QdrantClient is None:
+                from qdrant_client import QdrantClient
+            if is_embedded():
+                os.makedirs(QDRANT_PATH, exist_ok=True)
+                _client = QdrantClient(path=QDRANT_PATH)
+            elif VECTOR_BACKEND == "server":
+                _client = QdrantClient(url=QDRANT_URL)
+            else:
+                raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}' (expected server or embedded)")
+        return _client
+
+
+@atexit.register
+def close_client():
+    """Releases the embedded storage lock (and flushes it) before the interpreter tears down."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def mem0_vector_store(collection_name):
+    """Mem0 `vector_store` config pointing at the same backend (embedded mode shares our client)."""
+    if is_embedded():
+        return {"provider": "qdrant", "config": {"client": get_client(), "collection_name": collection_name}}
+    return {"provider": "qdrant", "config": {"url": QDRANT_URL, "collection_name": collection_name}}
+
+
+def quantization_config(kind=None):
+    from qdrant_client import models
+    kind = kind or KB_QUANTIZATION
+    if kind == "scalar":
+        # Quantized vectors stay in RAM even when the originals are on disk
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=True))
+    if kind == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown KB_QUANTIZATION '{kind}' (expected none, scalar or binary)")
+
+
+def collection_params(dim, quantization=None, on_disk=None, on_disk_payload=None, m=None, ef_construct=None):
+    """Keyword arguments for `create_collection`; defaults come from the KB_* settings."""
+    from qdrant_client import models
+    on_disk = KB_ON_DISK if on_disk is None else on_disk
+    return {
+        "vectors_config": models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=on_disk),
+        "hnsw_config": models.HnswConfigDiff(
+            m=m or KB_HNSW_M, ef_construct=ef_construct or KB_HNSW_EF_CONSTRUCT, on_disk=on_disk),
+        "quantization_config": quantization_config(quantization),
+        "on_disk_payload": KB_ON_DISK_PAYLOAD if on_disk_payload is None else on_disk_payload,
+    }
+
+
+def update_params(quantization=None, on_disk=None, m=None, ef_construct=None):
+    """Keyword arguments for `update_collection`: applies the KB_* settings to an existing collection."""
+    from qdrant_client import models
+    on_disk = KB_ON_DISK if on_disk is None else on_disk
+    return {
+        "vectors_config": {"": models.VectorParamsDiff(on_disk=on_disk)},
+        "hnsw_config": models.HnswConfigDiff(
+            m=m or KB_HNSW_M, ef_construct=ef_construct or KB_HNSW_EF_CONSTRUCT, on_disk=on_disk),
+        "quantization_config": quantization_config(quantization) or models.Disabled.DISABLED,
+    }
+
+
+def search_params(quantization=None, ef=None, rescore=None, oversampling=None):
+    """Per-query parameters matching the collection layout."""
+    from qdrant_client import models
+    quantized = (quantization or KB_QUANTIZATION) != "none"
+    return models.SearchParams(
+        hnsw_ef=ef or KB_SEARCH_EF,
+        quantization=models.QuantizationSearchParams(
+            rescore=KB_RESCORE if rescore is None else rescore,
+            oversampling=oversampling or KB_OVERSAMPLING,
+        ) if quantized else None,
+    )
@@ -0,0 +1,128 @@
+import base64
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from session_store import save_image, load_image
+
+# Pillow is a declared dependency; without it (bare installs) images are forwarded to the model unchanged
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    print("⚠️ Warning: 'pillow' not found. Vision images will not be downscaled.")
+
+# --- CONFIGURATION ---
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "672"))  # llava's native tile grid (2 x 336px)
+VISION_JPEG_QUALITY = 85
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+IMAGE_CACHE_SIZE = 32
+ANALYSIS_CACHE_SIZE = 256
+
+
+def downscale_image(raw_bytes, max_side=VISION_MAX_SIDE):
+    """
+    Shrinks an image so its longest side is at most `max_side` and re-encodes it as JPEG.
+    Images that are already small JPEGs are returned untouched (no re-encode).
+    Raises ValueError if the bytes are not an image Pillow can read.
+    """
+    if Image is None:
+        return raw_bytes
+    try:
+        img = Image.open(io.BytesIO(raw_bytes))
+    except Exception as e:
+        raise ValueError("Not a readable image.") from e
+    try:
+        if img.format == "JPEG" and max(img.size) <= max_side:
+            return raw_bytes
+
+        img = ImageOps.exif_transpose(img)  # Phone photos store rotation in EXIF
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+    except Exception as e:
+        print(f"[VISION] ⚠️ Downscale failed, using original: {e}")
+        return raw_bytes
+
+
+class ImageCache:
+    """
+    Content-addressed store for uploaded images and the answers given about them.
+    - Images are keyed by the SHA-256 of the uploaded bytes, so re-uploads are free.
+    - Analyses are keyed by (image id, normalized question), so repeated questions skip llava.
+    - Images are also written to the shared session store, so any server worker can use them.
+    """
+    def __init__(self, max_images=IMAGE_CACHE_SIZE, max_analyses=ANALYSIS_CACHE_SIZE):
+        self.max_images = max_images
+        self.max_analyses = max_analyses
+        self.images = OrderedDict()
+        self.analyses = OrderedDict()
+        self._lock = threading.Lock()   # Guards both dicts: add() runs in worker threads (Pillow work is off the event loop)
+
+    def add(self, raw_bytes):
+        """
+        Stores an image (downscaled, base64-encoded) and returns its id. Blocking (Pillow,
+        SQLite): call it from a worker thread. Raises ValueError for data that isn't an image.
+        """
+        image_id = hashlib.sha256(raw_bytes).hexdigest()
+        with self._lock:
+            if image_id in self.images:
+                self.images.move_to_end(image_id)
+                return image_id
+
+        small = downscale_image(raw_bytes)
+        print(f"[VISION] 🖼️ Cached image {image_id[:12]} ({len(raw_bytes)//1024} KB -> {len(small)//1024} KB)")
+        b64_image = base64.b64encode(small).decode("ascii")
+        save_image(image_id, b64_image, self.max_images)
+        self._remember(image_id, b64_image)
+        return image_id
+
+    def _remember(self, image_id, b64_image):
+        with self._lock:
+            self.images[image_id] = b64_image
+            while len(self.images) > self.max_images:
+                self.images.popitem(last=False)
+
+    def add_base64(self, b64_image):
+        """Legacy path: accepts the base64 payload sent inside ChatRequest.image_data."""
+        return self.add(base64.b64decode(b64_image, validate=True))  # binascii.Error is a ValueError
+
+    def get(self, image_id):
+        with self._lock:
+            b64_image = self.images.get(image_id)
+            if b64_image is not None:
+                self.images.move_to_end(image_id)
+                return b64_image
+        # Uploaded through another worker
+        b64_image = load_image(image_id)
+        if b64_image is not None:
+            self._remember(image_id, b64_image)
+        return b64_image
+
+    @staticmethod
+    def _analysis_key(image_id, query):
+        return image_id, re.sub(r"\s+", " ", query.strip().lower())
+
+    def get_analysis(self, image_id, query):
+        key = self._analysis_key(image_id, query)
+        with self._lock:
+            answer = self.analyses.get(key)
+            if answer is not None:
+                self.analyses.move_to_end(key)
+            return answer
+
+    def put_analysis(self, image_id, query, answer):
+        with self._lock:
+            self.analyses[self._analysis_key(image_id, query)] = answer
+            while len(self.analyses) > self.max_analyses:
+                self.analyses.popitem(last=False)
+
+
+# Shared by the upload endpoint and the agent
+image_cache = ImageCache()
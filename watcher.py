@@ -0,0 +1,219 @@
+"""
+Keeps the knowledge base in sync with ./data.
+
+    python watcher.py          # catch up on changes made while stopped, then watch
+    python watcher.py --once   # catch up and exit
+
+Uses watchdog (inotify on Linux) when installed, otherwise polls the folder.
+"""
+import argparse
+import os
+import threading
+import time
+
+import ingest
+from kb_manifest import get_indexed_files, reset_files, set_ingest_progress
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# --- CONFIGURATION ---
+WATCH_DEBOUNCE_S = float(os.getenv("WATCH_DEBOUNCE_S", "1.5"))   # Quiet time before a burst is indexed
+WATCH_POLL_S = float(os.getenv("WATCH_POLL_S", "2"))             # Scan interval without watchdog
+IGNORED_SUFFIXES = (".tmp", ".part", ".crdownload", ".swp", "~")
+
+
+def is_ignored(path):
+    name = os.path.basename(path)
+    return name.startswith((".", "~$")) or name.endswith(IGNORED_SUFFIXES)
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Turns watchdog events into pending upserts/deletes on the watcher."""
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        self._upsert(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._upsert(event.src_path, False)
+
+    def on_deleted(self, event):
+        self._delete(event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        self._delete(event.src_path, event.is_directory)
+        self._upsert(event.dest_path, event.is_directory)
+
+    def _upsert(self, path, is_directory):
+        paths = ingest.list_data_files(path) if is_directory else [path]
+        self.watcher.queue(upserts=paths)
+
+    def _delete(self, path, is_directory):
+        if is_directory:
+            prefix = self.watcher.source_path(path) + os.sep
+            paths = [p for p in get_indexed_files() if p.startswith(prefix)]
+        else:
+            paths = [path]
+        self.watcher.queue(deletes=paths)
+
+
+class DataWatcher:
+    """
+    Collects file changes under `folder` and applies them to the collection in batches.
+    A batch is flushed once no new change has arrived for `debounce` seconds, so copying
+    fifty files in results in one incremental update and one version bump.
+    """
+    def __init__(self, folder=None, debounce=WATCH_DEBOUNCE_S, poll_interval=WATCH_POLL_S):
+        self.folder = folder or ingest.DOCS_FOLDER
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.pending = {}          # source path -> "upsert" | "delete"
+        self.last_event = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshot = {}
+        self.vector_store = None
+
+    def source_path(self, path):
+        """Maps whatever path the OS reported to the form stored in metadata.source."""
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(self.folder))
+        return os.path.join(self.folder, relative)
+
+    def queue(self, upserts=(), deletes=()):
+        with self._lock:
+            for path in deletes:
+                if not is_ignored(path):
+                    self.pending[self.source_path(path)] = "delete"
+            for path in upserts:
+                if not is_ignored(path):
+                    self.pending[self.source_path(path)] = "upsert"
+            self.last_event = time.monotonic()
+
+    def flush(self):
+        """Applies pending changes if the folder has been quiet long enough."""
+        with self._lock:
+            if not self.pending or time.monotonic() - self.last_event < self.debounce:
+                return False
+            batch, self.pending = self.pending, {}
+
+        indexed = get_indexed_files()
+        # Skips files already indexed in their current state (e.g. by the catch-up that ran meanwhile)
+        changed = [p for p, action in batch.items() if action == "upsert" and not self._is_current(p, indexed)]
+        removed = [p for p, action in batch.items() if action == "delete" and p in indexed]
+        try:
+            if self.vector_store is None:
+                self.vector_store = ingest.get_vector_store(ingest.PooledOllamaEmbeddings(model=ingest.EMBED_MODEL))
+            ingest.sync_files(changed, removed, self.vector_store)
+        except Exception as e:
+            # Qdrant/Ollama hiccup: keep the batch and try again after the next debounce window
+            print(f"[WATCH] ⚠️ Update failed, will retry: {e}")
+            self.vector_store = None
+            self.queue(upserts=changed, deletes=removed)
+        return True
+
+    @staticmethod
+    def _is_current(path, indexed):
+        signature = ingest.file_signature(path)
+        info = indexed.get(path)
+        return (signature is not None and info is not None
+                and info.get("mtime") == signature["mtime"] and info.get("size") == signature["size"])
+
+    def catch_up(self):
+        """Indexes whatever changed while the watcher wasn't running."""
+        if any(info.get("chunks") for info in get_indexed_files().values()) and not self._collection_has_points():
+            # Collection dropped or emptied behind our back (reset_db, new Qdrant volume): start over
+            print("[WATCH] ⚠️ Knowledge base collection is missing or empty; re-indexing every file.")
+            reset_files({})
+        changed, removed = ingest.find_changes(self.folder)
+        if not changed and not removed:
+            print("[WATCH] ✅ Knowledge base is up to date.")
+            set_ingest_progress(state="done")
+            return
+        print(f"[WATCH] 📥 Catching up: {len(changed)} new/modified, {len(removed)} deleted files...")
+        set_ingest_progress(state="embedding", files_done=len(removed), files_total=len(changed) + len(removed),
+                            chunks_done=0, chunks_total=0)
+        self.vector_store = ingest.get_vector_store(ingest.PooledOllamaEmbeddings(model=ingest.EMBED_MODEL))
+        # Deletions are applied first; the files being embedded are streamed, like a full ingest
+        ingest.sync_files(changed, removed, self.vector_store,
+                          on_file=lambda i, path, info: set_ingest_progress(files_done=len(removed) + i),
+                          on_batch=lambda n: set_ingest_progress(chunks_done=n))
+        set_ingest_progress(state="done", files_done=len(changed) + len(removed))
+
+    def _collection_has_points(self):
+        client = ingest.get_client()
+        return (client.collection_exists(ingest.COLLECTION_NAME)
+                and (client.get_collection(ingest.COLLECTION_NAME).points_count or 0) > 0)
+
+    def _scan(self):
+        return {path: ingest.file_signature(path) for path in ingest.list_data_files(self.folder)}
+
+    def _poll(self):
+        current = self._scan()
+        changed = [p for p, sig in current.items() if sig and self._snapshot.get(p) != sig]
+        removed = [p for p in self._snapshot if p not in current]
+        self._snapshot = current
+        if changed or removed:
+            self.queue(upserts=changed, deletes=removed)
+
+    def run(self):
+        os.makedirs(self.folder, exist_ok=True)
+        # Watch before catching up: changes made during a long catch-up are queued, not lost
+        observer = None
+        if Observer is not None:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), self.folder, recursive=True)
+            observer.start()
+            print(f"[WATCH] 👀 Watching {self.folder} (watchdog)")
+        else:
+            self._snapshot = self._scan()
+            print(f"[WATCH] 👀 Watching {self.folder} (polling every {self.poll_interval}s; "
+                  f"install 'watchdog' for instant updates)")
+
+        try:
+            self.catch_up()
+        except Exception as e:
+            set_ingest_progress(state="failed")
+            print(f"[WATCH] ❌ Catch-up failed ({e}); still watching for new changes.")
+
+        next_poll = time.monotonic() + self.poll_interval
+        try:
+            while not self._stop.is_set():
+                if observer is None and time.monotonic() >= next_poll:
+                    self._poll()
+                    next_poll = time.monotonic() + self.poll_interval
+                self.flush()
+                self._stop.wait(0.25)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index ./data as files change.")
+    parser.add_argument("--once", action="store_true", help="Catch up on changes and exit")
+    args = parser.parse_args()
+
+    watcher = DataWatcher()
+    if args.once:
+        os.makedirs(watcher.folder, exist_ok=True)
+        watcher.catch_up()
+        return
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()